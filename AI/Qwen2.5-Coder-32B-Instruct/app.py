@@ -5,14 +5,30 @@ from datetime import datetime
 import uuid
 import re
 import json
-from functools import partial
-import markdown
-from threading import Lock
-from llama_cpp import Llama
+from functools import partial, lru_cache
+from types import SimpleNamespace
 import tiktoken
 import redis
 import os
 import gc
+import time
+import traceback
+from threading import Lock, Thread
+from werkzeug.serving import make_server
+from lazy import LazyResource
+from scheduler import GenerationScheduler, QueueFull
+from response_cache import ResponseCache
+from conversation_store import ConversationStore
+from markdown_stream import IncrementalMarkdownRenderer, render_markdown
+
+PROCESS_STARTED = time.monotonic()
+# Startup milestones, in seconds since PROCESS_STARTED
+startup_timings = {
+    'time_to_listen_secs': None,
+    'time_to_first_token_secs': None,
+    'warmup_ttft_secs': None,
+    'last_request_ttft_secs': None
+}
 
 app = Flask(__name__)
 # Generate random secret key for session management
@@ -33,146 +49,268 @@ redis_client = redis.Redis(
     socket_timeout=5  # 5 second timeout
 )
 
-# Check Redis connection at startup
-try:
-    redis_client.ping()
-    print("✅ Redis connection successful")
-    info = redis_client.info()
-    print(f"Redis Version: {info['redis_version']}")
-    print(f"Memory Used: {info['used_memory_human']}")
-except redis.ConnectionError as e:
-    print("❌ Redis connection failed! Make sure Redis server is running:")
-    print("   1. Install Redis: sudo apt-get install redis-server")
-    print("   2. Start Redis: sudo service redis start")
-    print("   3. Check status: sudo service redis status")
-    print(f"Error: {str(e)}")
-    # Don't exit, let the app run with degraded functionality
-    pass
-
-# Global lock for model inference
-model_lock = Lock()
-
-# Initialize tokenizer
-tokenizer = tiktoken.get_encoding("cl100k_base")  # GPT-4 encoding
-MAX_CONTEXT_TOKENS = 32768  # Maximum context window
-MAX_RESPONSE_TOKENS = 4096  # Maximum response length
+def check_redis():
+    """Check the Redis connection at startup (not on import)."""
+    try:
+        redis_client.ping()
+        print("✅ Redis connection successful")
+        info = redis_client.info()
+        print(f"Redis Version: {info['redis_version']}")
+        print(f"Memory Used: {info['used_memory_human']}")
+    except redis.ConnectionError as e:
+        print("❌ Redis connection failed! Make sure Redis server is running:")
+        print("   1. Install Redis: sudo apt-get install redis-server")
+        print("   2. Start Redis: sudo service redis start")
+        print("   3. Check status: sudo service redis status")
+        print(f"Error: {str(e)}")
+        # Don't exit, let the app run with degraded functionality
+        pass
+
+# Concurrent generations sharing decode steps; 1 keeps the plain single-sequence Llama path
+BATCH_SEQUENCES = int(os.getenv('BATCH_SEQUENCES', '1'))
+
+# Optional small Qwen GGUF (same tokenizer) that drafts tokens for the 32B model to verify
+DRAFT_MODEL_PATH = os.getenv('DRAFT_MODEL_PATH', '')
+DRAFT_TOKENS = int(os.getenv('DRAFT_TOKENS', '6'))
+SPECULATIVE = bool(DRAFT_MODEL_PATH) and BATCH_SEQUENCES == 1 and os.path.exists(DRAFT_MODEL_PATH)
+# Speculative decoding keeps logits for every context position: n_ctx x n_vocab float32,
+# about 0.6 MB per token for Qwen2.5 (20 GB at 32768), so it gets a smaller context
+DRAFT_CONTEXT_TOKENS = int(os.getenv('DRAFT_CONTEXT_TOKENS', '8192'))
+
+# BATCH_SEQUENCES generations at a time on the model; bounded, per-user fair queue in front of it
+scheduler = GenerationScheduler(
+    max_queue=int(os.getenv('MAX_QUEUED_REQUESTS', '16')),
+    max_per_user=int(os.getenv('MAX_REQUESTS_PER_USER', '2')),
+    max_active=BATCH_SEQUENCES
+)
+QUEUE_KEEPALIVE_SECS = 5  # SSE comment interval while queued, so disconnects are noticed
+
+# Tokenizer for prompt budgeting, built on first use
+tokenizer = LazyResource('tokenizer', lambda: tiktoken.get_encoding("cl100k_base"))  # GPT-4 encoding
+MAX_CONTEXT_TOKENS = DRAFT_CONTEXT_TOKENS if SPECULATIVE else 32768  # Maximum context window
+MAX_RESPONSE_TOKENS = min(4096, MAX_CONTEXT_TOKENS // 2)  # Maximum response length
 CONVERSATION_TTL = 86400  # 24 hours in seconds
+MAX_STORED_MESSAGES = int(os.getenv('MAX_STORED_MESSAGES', '200'))  # Older messages are trimmed from Redis
+
+conversation_store = ConversationStore(redis_client, CONVERSATION_TTL, max_messages=MAX_STORED_MESSAGES)
+
+# Opt-in: replay stored answers to repeated prompts instead of generating them again
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+response_cache = (
+    ResponseCache(redis_client, RESPONSE_CACHE_TTL)
+    if os.getenv('RESPONSE_CACHE', '').lower() in ('1', 'true', 'yes') else None
+)
+
+SYSTEM_PROMPT = """You are a helpful coding assistant. You excel at:
+- Writing clean, efficient code
+- Explaining complex concepts clearly
+- Debugging and problem-solving
+- Following best practices and conventions
+Please provide clear, concise responses."""
 
 def count_tokens(text: str) -> int:
     """Count the number of tokens in a text string."""
-    return len(tokenizer.encode(text))
+    return len(tokenizer.get().encode(text))
 
-def trim_conversation_to_fit(conversation_history: str, system_prompt: str, current_message: str) -> str:
-    """Trim conversation history to fit within token limits."""
-    system_tokens = count_tokens(system_prompt)
-    message_tokens = count_tokens(current_message)
-    max_history_tokens = MAX_CONTEXT_TOKENS - system_tokens - message_tokens - MAX_RESPONSE_TOKENS
-    
-    if max_history_tokens <= 0:
-        return ""
-    
-    # Split history into pairs and count tokens
-    pairs = conversation_history.split("<|im_start|>")
-    pairs = [p for p in pairs if p.strip()]  # Remove empty strings
+def format_message(role: str, content: str) -> str:
+    """Render one message in ChatML."""
+    return f"<|im_start|>{role}\n{content}<|im_end|>\n"
+
+# Fixed parts of every prompt, counted once on first use
+SYSTEM_SEGMENT = format_message("system", SYSTEM_PROMPT)
+ASSISTANT_HEADER = "<|im_start|>assistant\n"
+
+@lru_cache(maxsize=None)
+def fixed_tokens(segment: str) -> int:
+    """Token count of a constant prompt segment."""
+    return count_tokens(segment)
+
+def new_message(role: str, content: str) -> dict:
+    """Build a stored message with its token count cached alongside it."""
+    return {
+        'role': role,
+        'content': content,
+        'timestamp': datetime.now().isoformat(),
+        'tokens': count_tokens(format_message(role, content.strip()))
+    }
+
+def message_tokens(msg: dict) -> int:
+    """Cached token count of a stored message (computed once for old records)."""
+    tokens = msg.get('tokens')
+    if tokens is None:
+        content = msg['content'].strip()
+        tokens = count_tokens(format_message(msg['role'], content)) if content else 0
+        msg['tokens'] = tokens
+    return tokens
+
+def trim_conversation_to_fit(messages: list, current_message_tokens: int) -> tuple:
+    """Keep the newest messages that fit the context budget.
+
+    Walks the cached per-message counts from newest to oldest, so nothing is
+    re-encoded. Returns (kept_messages, kept_tokens).
+    """
+    budget = (MAX_CONTEXT_TOKENS - MAX_RESPONSE_TOKENS - fixed_tokens(SYSTEM_SEGMENT)
+              - current_message_tokens - fixed_tokens(ASSISTANT_HEADER))
+    if budget <= 0:
+        return [], 0
     
-    # Count tokens for each pair from newest to oldest
     total_tokens = 0
-    included_pairs = []
-    
-    for pair in reversed(pairs):
-        pair_tokens = count_tokens(f"<|im_start|>{pair}")
-        if total_tokens + pair_tokens <= max_history_tokens:
-            total_tokens += pair_tokens
-            included_pairs.insert(0, pair)
-        else:
+    start = len(messages)
+    while start > 0:
+        tokens = message_tokens(messages[start - 1])
+        if total_tokens + tokens > budget:
             break
+        total_tokens += tokens
+        start -= 1
     
-    return "<|im_start|>".join(included_pairs) if included_pairs else ""
+    return messages[start:], total_tokens
 
-# Initialize the Qwen model
+def build_prompt(messages: list, message: str) -> tuple:
+    """Build the prompt from history and the new message; returns (prompt, prompt_tokens)."""
+    current_segment = format_message("user", message)
+    current_tokens = count_tokens(current_segment)
+    history, history_tokens = trim_conversation_to_fit(messages, current_tokens)
+    
+    conversation_history = "".join(
+        format_message(msg['role'], msg['content'].strip())
+        for msg in history if msg['content'].strip()  # Only add non-empty messages
+    )
+    prompt = f"{SYSTEM_SEGMENT}{conversation_history}{current_segment}{ASSISTANT_HEADER}"
+    total_tokens = (fixed_tokens(SYSTEM_SEGMENT) + history_tokens + current_tokens
+                    + fixed_tokens(ASSISTANT_HEADER))
+    return prompt, total_tokens
+
+# Qwen model files
 model_path = "./models/Qwen2.5-Coder-32B-Instruct-Q5_K_S.gguf"
-if not os.path.exists(model_path):
-    raise FileNotFoundError(f"Model not found at {model_path}")
-
-llm = Llama(
-    model_path=model_path,
-    n_ctx=32768,  # Context window
-    n_threads=os.cpu_count(),  # Adjust based on your CPU
-    n_gpu_layers=-1,  # Use all GPU layers
-    n_batch=512,     # Increase batch size for GPU performance
-    use_mmap=True,
-    use_mlock=False,
-    offload_kqv=False,
-    main_gpu=0,
-    verbose=True
-)
 
-def process_code_blocks(text):
-    """Process code blocks with language detection"""
-    result = []
-    in_code_block = False
-    code_content = []
-    current_language = ''
+def load_models() -> SimpleNamespace:
+    """Construct the model(s); runs once, on first use or from the background preload."""
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model not found at {model_path}")
     
-    lines = text.split('\n')
-    i = 0
-    while i < len(lines):
-        line = lines[i].rstrip()
-        
-        # Check for code block start
-        if not in_code_block and line.startswith('```'):
-            # Extract language if specified
-            current_language = line[3:].strip()
-            # If no language specified, use 'plaintext'
-            if not current_language:
-                current_language = 'plaintext'
-            in_code_block = True
-            code_content = []
-            i += 1  # Skip the opening ``` line
-            continue
-            
-        # Check for code block end
-        elif in_code_block and line.strip() == '```':
-            in_code_block = False
-            code = '\n'.join(code_content)
-            # Only wrap in pre/code tags if not already wrapped
-            if not code.startswith('<pre><code'):
-                result.append(f'<pre><code class="language-{current_language} hljs" data-highlighted="yes">{code}</code></pre>')
-            else:
-                result.append(code)
-        # Handle content inside code block
-        elif in_code_block:
-            code_content.append(line)
-        # Handle regular text
-        else:
-            result.append(line)
-        i += 1
+    # Imported here so importing the app (health checks, tests) doesn't load llama.cpp
+    from llama_cpp import Llama
+    from batch_engine import BatchEngine
+    from speculative import DraftModel
     
-    # Handle unclosed code block
-    if in_code_block:
-        code = '\n'.join(code_content)
-        if not code.startswith('<pre><code'):
-            result.append(f'<pre><code class="language-{current_language} hljs" data-highlighted="yes">{code}</code></pre>')
-        else:
-            result.append(code)
+    llm = None
+    engine = None
+    draft_model = None
+    if DRAFT_MODEL_PATH and BATCH_SEQUENCES > 1:
+        print("⚠️ DRAFT_MODEL_PATH is ignored with BATCH_SEQUENCES > 1; speculative decoding needs the single-sequence path")
+    elif DRAFT_MODEL_PATH and not os.path.exists(DRAFT_MODEL_PATH):
+        print(f"⚠️ Draft model not found at {DRAFT_MODEL_PATH}, decoding without it")
+    elif DRAFT_MODEL_PATH:
+        draft_model = DraftModel(
+            DRAFT_MODEL_PATH,
+            num_pred_tokens=DRAFT_TOKENS,
+            n_ctx=MAX_CONTEXT_TOKENS,
+            n_threads=os.cpu_count(),
+            n_gpu_layers=-1
+        )
+        print(f"✅ Speculative decoding with {DRAFT_MODEL_PATH} ({DRAFT_TOKENS} tokens per draft)")
+    
+    if BATCH_SEQUENCES > 1:
+        # The sequences share one pool of KV cells, so size it for the worst case
+        engine = BatchEngine(
+            model_path,
+            n_ctx=int(os.getenv('BATCH_CONTEXT_TOKENS', str(MAX_CONTEXT_TOKENS))),
+            n_parallel=BATCH_SEQUENCES,
+            n_batch=512,
+            n_threads=os.cpu_count(),
+            n_gpu_layers=-1,
+            verbose=True
+        )
+    else:
+        llm = Llama(
+            model_path=model_path,
+            n_ctx=MAX_CONTEXT_TOKENS,  # Context window
+            n_threads=os.cpu_count(),  # Adjust based on your CPU
+            n_gpu_layers=-1,  # Use all GPU layers
+            n_batch=512,     # Increase batch size for GPU performance
+            use_mmap=True,
+            use_mlock=False,
+            offload_kqv=False,
+            main_gpu=0,
+            # Verifying a draft samples at several positions, which needs their logits kept
+            draft_model=draft_model,
+            logits_all=draft_model is not None,
+            verbose=True
+        )
+        if draft_model is not None:
+            scores_gb = MAX_CONTEXT_TOKENS * llm.n_vocab() * 4 / 2**30
+            print(f"ℹ️ Speculative decoding keeps {scores_gb:.1f} GB of logits for a {MAX_CONTEXT_TOKENS}-token context")
+    return SimpleNamespace(llm=llm, engine=engine, draft_model=draft_model)
+
+models = LazyResource('Qwen model', load_models)
+
+STOP_SEQUENCES = ["<|im_end|>", "<|im_start|>"]
+TEMPERATURE = 0.7
+
+def sampling_params(total_tokens: int) -> dict:
+    """Sampling settings for a prompt of total_tokens (also part of the response cache key)."""
+    return {
+        'max_tokens': min(MAX_RESPONSE_TOKENS, MAX_CONTEXT_TOKENS - total_tokens),
+        'temperature': TEMPERATURE,
+        'stop': STOP_SEQUENCES
+    }
+
+def is_cached_reply(user_id: str, message: str) -> bool:
+    """Whether the reply to a message about to be stored would come from the response cache."""
+    if response_cache is None:
+        return False
+    # The same prompt the stream will build once the message is in the history
+    messages = get_conversation(user_id) + [new_message('user', message)]
+    prompt, total_tokens = build_prompt(messages, message)
+    return response_cache.contains(prompt, sampling_params(total_tokens))
+
+def record_first_token(started: float):
+    """Note time to first token, since process start (once) and since this request started."""
+    now = time.monotonic()
+    if startup_timings['time_to_first_token_secs'] is None:
+        startup_timings['time_to_first_token_secs'] = now - PROCESS_STARTED
+    startup_timings['last_request_ttft_secs'] = now - started
+
+def stream_completion(prompt: str, max_tokens: int, temperature: float = TEMPERATURE):
+    """Yield generated text pieces from the batch engine or the single-sequence model."""
+    started = time.monotonic()
+    loaded = models.get()
+    engine, llm, draft_model = loaded.engine, loaded.llm, loaded.draft_model
+    if engine is not None:
+        stream = engine.submit(prompt, max_tokens=max_tokens, temperature=temperature, stop=STOP_SEQUENCES)
+        try:
+            for i, piece in enumerate(stream):
+                if not i:
+                    record_first_token(started)
+                yield piece
+        finally:
+            stream.close()
+        return
     
-    return '\n'.join(result)
+    if draft_model is not None:
+        draft_model.start_request()
+    stream = llm(
+        prompt,
+        max_tokens=max_tokens,
+        stop=STOP_SEQUENCES,
+        stream=True,
+        temperature=temperature,
+    )
+    try:
+        for i, output in enumerate(stream):
+            if not i:
+                record_first_token(started)
+            yield output['choices'][0]['text']
+    finally:
+        stream.close()
+        if draft_model is not None:
+            stats = draft_model.finish_request()
+            print(f"Speculative decoding: {stats['accepted']}/{stats['proposed']} draft tokens accepted "
+                  f"({stats['acceptance_rate']:.0%}) over {stats['drafts']} drafts, {stats['draft_secs']}s drafting")
 
 def process_markdown(text):
     """Process markdown including code blocks"""
-    # First handle code blocks
-    text = process_code_blocks(text)
-    # Then process remaining markdown, excluding already processed code blocks
-    html = markdown.markdown(
-        text,
-        extensions=['fenced_code', 'tables'],
-        extension_configs={
-            'fenced_code': {
-                'preserve_html': True  # Preserve existing HTML code blocks
-            }
-        }
-    )
-    return html
+    return render_markdown(text)
 
 def cleanup_memory():
     """Force garbage collection and CUDA memory cleanup"""
@@ -181,40 +319,18 @@ def cleanup_memory():
 def get_conversation(user_id: str) -> list:
     """Get conversation history from Redis."""
     try:
-        data = redis_client.get(f"chat:{user_id}")
-        if data:
-            parsed_data = json.loads(data)
-            print(f"\n🔍 Redis GET: chat:{user_id}")
-            print("├── Status: Found")
-            print(f"├── Messages: {len(parsed_data)}")
-            for i, msg in enumerate(parsed_data, 1):
-                preview = msg['content'][:100] + '...' if len(msg['content']) > 100 else msg['content']
-                print(f"├── [{i}] {msg['role']}: {preview}")
-            print("└── End of conversation")
-            return parsed_data
-        else:
-            print(f"\n🔍 Redis GET: chat:{user_id} -> Not Found (New Conversation)")
-            return []
+        messages = conversation_store.load(user_id)
+        print(f"\n🔍 Redis LRANGE: chat:{user_id} -> {len(messages)} messages")
+        return messages
     except (redis.RedisError, json.JSONDecodeError) as e:
         print(f"\n⚠️ Redis error, using empty conversation: {e}")
         return []
 
-def save_conversation(user_id: str, messages: list) -> bool:
-    """Save conversation history to Redis with TTL."""
+def append_messages(user_id: str, *messages: dict) -> bool:
+    """Append messages to the stored conversation and refresh its TTL."""
     try:
-        redis_client.setex(
-            f"chat:{user_id}",
-            CONVERSATION_TTL,
-            json.dumps(messages)
-        )
-        print(f"\n💾 Redis SETEX: chat:{user_id}")
-        print("├── Status: Saved")
-        print(f"├── Messages: {len(messages)}")
-        print(f"├── TTL: {CONVERSATION_TTL}s")
-        for i, msg in enumerate(messages, 1):
-            preview = msg['content'][:100] + '...' if len(msg['content']) > 100 else msg['content']
-            print(f"├── [{i}] {msg['role']}: {preview}")
-        print("└── End of save")
+        length = conversation_store.append(user_id, *messages)
+        print(f"\n💾 Redis RPUSH: chat:{user_id} +{len(messages)} -> {length} messages (TTL {CONVERSATION_TTL}s)")
         return True
     except redis.RedisError as e:
         print(f"\n⚠️ Failed to save conversation: {e}")
@@ -226,15 +342,10 @@ def save_conversation(user_id: str, messages: list) -> bool:
 def clear_conversation(user_id: str):
     """Clear conversation history from Redis."""
     try:
-        result = redis_client.delete(f"chat:{user_id}")
-        if result:
-            print(f"\n🗑️  Redis DEL: chat:{user_id}")
-            print("├── Status: Deleted")
-            print("└── Success")
+        if conversation_store.clear(user_id):
+            print(f"\n🗑️  Redis DEL: chat:{user_id} -> Deleted")
         else:
-            print(f"\n🗑️  Redis DEL: chat:{user_id}")
-            print("├── Status: Not Found")
-            print("└── Nothing to delete")
+            print(f"\n🗑️  Redis DEL: chat:{user_id} -> Nothing to delete")
         return True
     except redis.RedisError as e:
         print(f"\n⚠️ Failed to clear conversation: {e}")
@@ -264,18 +375,16 @@ def chat():
                 if not message:
                     return jsonify({'error': 'No message provided'}), 400
                 
-                # Get existing messages or initialize new conversation
-                messages = get_conversation(user_id)
+                # Turn the request away before storing it if it could not be queued;
+                # an answer that will be replayed from the cache needs no queue slot
+                if not is_cached_reply(user_id, message):
+                    try:
+                        scheduler.check(user_id)
+                    except QueueFull as e:
+                        return busy_response(e)
                 
                 # Add user message to history
-                messages.append({
-                    'role': 'user',
-                    'content': message,
-                    'timestamp': datetime.now().isoformat()
-                })
-                
-                # Save updated conversation
-                if not save_conversation(user_id, messages):
+                if not append_messages(user_id, new_message('user', message)):
                     return jsonify({'error': 'Failed to save message'}), 500
                 
                 return jsonify({'status': 'message_received'})
@@ -291,9 +400,31 @@ def chat():
         if not message:
             return jsonify({'error': 'No message provided'}), 400
         
+        # A cached answer is replayed without the model, so look it up before queueing
+        prompt = params = cached = total_tokens = None
+        if response_cache is not None:
+            prompt, total_tokens = build_prompt(get_conversation(user_id), message)
+            params = sampling_params(total_tokens)
+            cached = response_cache.get(prompt, params)
+        
+        # Admit into the generation queue (or reject) before opening the stream
+        ticket = None
+        if cached is None:
+            try:
+                ticket = scheduler.submit(user_id)
+            except QueueFull as e:
+                return busy_response(e)
+        
+        def release_ticket():
+            if ticket is not None:
+                scheduler.release(ticket)
+        
         def generate():
+            nonlocal prompt, params, total_tokens
             full_response = ""
             response_sent = False
+            stream = None
+            renderer = IncrementalMarkdownRenderer()
             
             try:
                 # Send an immediate acknowledgment
@@ -315,107 +446,83 @@ def chat():
                     yield f"data: {json.dumps({'error': 'Session store unavailable'})}\n\n"
                     return
                 
-                # Get conversation history
-                messages = get_conversation(user_id)
-                conversation_history = ""
-                
-                # Process messages in user-assistant pairs
-                for msg in messages:
-                    role = msg['role']
-                    content = msg['content'].strip()
-                    if content:  # Only add non-empty messages
-                        conversation_history += f"<|im_start|>{role}\n{content}<|im_end|>\n"
-                
-                # Build prompt
-                system_prompt = """You are a helpful coding assistant. You excel at:
-- Writing clean, efficient code
-- Explaining complex concepts clearly
-- Debugging and problem-solving
-- Following best practices and conventions
-Please provide clear, concise responses."""
-                
-                prompt = f"""<|im_start|>system
-{system_prompt}<|im_end|>
-{conversation_history}<|im_start|>user
-{message}<|im_end|>
-<|im_start|>assistant
-"""
-                
-                # Check token count
-                total_tokens = count_tokens(prompt)
-                if total_tokens > MAX_CONTEXT_TOKENS - MAX_RESPONSE_TOKENS:
-                    conversation_history = trim_conversation_to_fit(conversation_history, system_prompt, message)
-                    prompt = f"""<|im_start|>system
-{system_prompt}<|im_end|>
-{conversation_history}<|im_start|>user
-{message}<|im_end|>
-<|im_start|>assistant
-"""
-                    total_tokens = count_tokens(prompt)
-                
+                # Get conversation history and build a prompt that fits the context
+                if prompt is None:
+                    prompt, total_tokens = build_prompt(get_conversation(user_id), message)
+                    params = sampling_params(total_tokens)
                 print(f"Prompt tokens: {total_tokens}, Max allowed: {MAX_CONTEXT_TOKENS}")
                 
-                # Generate response with streaming
-                with model_lock:
-                    if response_sent:
-                        return
+                if cached is not None:
+                    # Replay the stored answer; it never took a queue slot
+                    stream = response_cache.replay(cached)
+                else:
+                    # Wait for our turn; writing keepalives raises GeneratorExit if the client left
+                    while not scheduler.wait(ticket, timeout=QUEUE_KEEPALIVE_SECS):
+                        yield f"data: {json.dumps({'token': '', 'queue_position': scheduler.position(ticket)})}\n\n"
                     
-                    stream = llm(
-                        prompt,
-                        max_tokens=min(MAX_RESPONSE_TOKENS, MAX_CONTEXT_TOKENS - total_tokens),
-                        stop=["<|im_end|>", "<|im_start|>"],
-                        stream=True,
-                        temperature=0.7,
-                    )
+                    # The model loads in the background on first use; keep the stream alive meanwhile
+                    models.start()
+                    while not models.wait(timeout=QUEUE_KEEPALIVE_SECS):
+                        yield f"data: {json.dumps({'token': '', 'loading': models.status()})}\n\n"
                     
-                    # Stream each token
-                    for output in stream:
-                        if response_sent:
-                            break
+                    # Generate response with streaming
+                    stream = stream_completion(prompt, params['max_tokens'], params['temperature'])
+                    
+                # Stream each token
+                for token in stream:
+                    if response_sent:
+                        break
                             
-                        token = output['choices'][0]['text']
-                        if token:  # Only process non-empty tokens
-                            full_response += token
-                            yield f"data: {json.dumps({'token': token})}\n\n"
+                    if token:  # Only process non-empty tokens
+                        full_response += token
+                        yield sse_event(token, renderer.feed(token), renderer)
                             
-                            if "<|im_end|>" in token:
-                                response_sent = True
-                                break
+                        if "<|im_end|>" in token:
+                            response_sent = True
+                            break
                     
-                    # Save complete response if we have content
-                    if full_response.strip() and not response_sent:
-                        try:
-                            # Verify Redis connection again before saving
-                            if not redis_client.ping():
-                                yield f"data: {json.dumps({'error': 'Failed to save response - Redis connection lost'})}\n\n"
-                                return
+                if response_cache is not None and cached is None and full_response.strip():
+                    response_cache.put(prompt, params, full_response)
+                    
+                # Render whatever block was still open
+                fragments = renderer.finish()
+                if fragments:
+                    yield sse_event('', fragments, renderer)
+                    
+                # Save complete response if we have content
+                if full_response.strip() and not response_sent:
+                    try:
+                        # Verify Redis connection again before saving
+                        if not redis_client.ping():
+                            yield f"data: {json.dumps({'error': 'Failed to save response - Redis connection lost'})}\n\n"
+                            return
                                 
-                            messages = get_conversation(user_id)
-                            messages.append({
-                                'role': 'assistant',
-                                'content': full_response.strip(),
-                                'timestamp': datetime.now().isoformat()
-                            })
-                            
-                            if save_conversation(user_id, messages):
-                                response_sent = True
-                            else:
-                                yield f"data: {json.dumps({'error': 'Failed to save response'})}\n\n"
-                        except Exception as e:
-                            print(f"Error saving response: {str(e)}")
+                        if append_messages(user_id, new_message('assistant', full_response.strip())):
+                            response_sent = True
+                        else:
                             yield f"data: {json.dumps({'error': 'Failed to save response'})}\n\n"
+                    except Exception as e:
+                        print(f"Error saving response: {str(e)}")
+                        yield f"data: {json.dumps({'error': 'Failed to save response'})}\n\n"
                     
-                    # Send end marker
-                    if not response_sent:
-                        yield f"data: {json.dumps({'token': '<|im_end|>'})}\n\n"
+                # Send end marker
+                if not response_sent:
+                    yield f"data: {json.dumps({'token': '<|im_end|>'})}\n\n"
             
+            except GeneratorExit:
+                # Client disconnected: stop generating and give up our slot
+                print(f"Client disconnected, cancelling generation for {user_id}")
+                raise
             except Exception as e:
                 print(f"Error in generate: {str(e)}")
                 yield f"data: {json.dumps({'error': str(e)})}\n\n"
             finally:
+                if stream is not None:
+                    stream.close()
+                release_ticket()
                 cleanup_memory()
         
-        return Response(
+        response = Response(
             generate(),
             mimetype='text/event-stream',
             headers={
@@ -426,11 +533,106 @@ Please provide clear, concise responses."""
                 'X-Accel-Buffering': 'no'
             }
         )
+        # Covers clients that disconnect before the generator ever starts
+        response.call_on_close(release_ticket)
+        return response
         
     except Exception as e:
         print(f"Unexpected error in chat endpoint: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+def sse_event(token: str, fragments: list, renderer: IncrementalMarkdownRenderer) -> str:
+    """One stream event; finished blocks ride along as HTML with how much text they cover."""
+    payload = {'token': token}
+    if fragments:
+        payload['html'] = fragments
+        payload['consumed'] = renderer.consumed
+    return f"data: {json.dumps(payload)}\n\n"
+
+def busy_response(error: QueueFull):
+    """429 with a Retry-After estimate from the scheduler."""
+    response = jsonify({'error': error.reason, 'retry_after': error.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Generation queue metrics: queue wait vs generation time, rejections, cancellations."""
+    stats = {'scheduler': scheduler.metrics(), 'startup': startup_status()}
+    if models.ready:
+        loaded = models.get()
+        if loaded.engine is not None:
+            stats['batch_engine'] = loaded.engine.metrics()
+        if loaded.draft_model is not None:
+            stats['speculative'] = loaded.draft_model.metrics()
+    return jsonify(stats)
+
+def startup_status() -> dict:
+    """Load state of each lazy resource plus the startup timings."""
+    resources = [tokenizer, models]
+    return {
+        'ready': all(resource.ready for resource in resources),
+        'progress': round(sum(resource.ready for resource in resources) / len(resources), 2),
+        'resources': {resource.name: resource.status() for resource in resources},
+        'timings': {key: round(value, 2) if value is not None else None for key, value in startup_timings.items()}
+    }
+
+WARMUP_USER = '__warmup__'  # scheduler identity of the warm-up generation
+warmup_lock = Lock()
+warmup_thread = None
+
+def warm_up():
+    """Load everything and run a one-token generation so the first real request starts warm."""
+    try:
+        tokenizer.get()
+        fixed_tokens(SYSTEM_SEGMENT)
+        models.get()
+        # The generation takes a queue slot like any request, so it never runs beside a /chat
+        try:
+            ticket = scheduler.submit(WARMUP_USER)
+        except QueueFull:
+            print("⚠️ Skipping warm-up generation, the generation queue is full")
+            return
+        try:
+            scheduler.wait(ticket)
+            started = time.monotonic()
+            for _ in stream_completion(f"{SYSTEM_SEGMENT}{format_message('user', 'hi')}{ASSISTANT_HEADER}", 1):
+                break
+            startup_timings['warmup_ttft_secs'] = time.monotonic() - started
+        finally:
+            scheduler.release(ticket)
+    except Exception as e:
+        print(f"⚠️ Warm-up failed: {str(e)}")
+        print(traceback.format_exc())
+
+def start_warm_up() -> bool:
+    """Run warm_up() on a background thread unless one is already running."""
+    global warmup_thread
+    with warmup_lock:
+        if warmup_thread is not None and warmup_thread.is_alive():
+            return False
+        warmup_thread = Thread(target=warm_up, name='warmup', daemon=True)
+        warmup_thread.start()
+        return True
+
+@app.route('/warmup', methods=['POST'])
+def warmup():
+    """Start loading the tokenizer and model in the background; poll /ready for progress."""
+    if not models.ready or startup_timings['warmup_ttft_secs'] is None:
+        start_warm_up()
+    return jsonify(startup_status()), 202
+
+@app.route('/ready')
+def ready():
+    """Readiness probe: 200 once the model can serve, 503 with loading progress until then."""
+    status = startup_status()
+    try:
+        status['redis'] = bool(redis_client.ping())
+    except redis.RedisError:
+        status['redis'] = False
+    return jsonify(status), 200 if status['ready'] and status['redis'] else 503
+
 @app.route('/history')
 def get_history():
     user_id = session.get('user_id')
@@ -477,7 +679,8 @@ def redis_health():
                 'connected_clients': info['connected_clients'],
                 'used_memory_human': info['used_memory_human'],
                 'total_connections_received': info['total_connections_received'],
-                'total_commands_processed': info['total_commands_processed']
+                'total_commands_processed': info['total_commands_processed'],
+                'response_cache': response_cache.stats() if response_cache is not None else {'enabled': False}
             }
             return jsonify(stats)
     except redis.RedisError as e:
@@ -486,51 +689,36 @@ def redis_health():
             'error': str(e)
         }), 500
 
-def generate_streaming_response(conversation_history: str, message: str):
+def generate_streaming_response(messages: list, message: str):
     """Generate streaming response from the model."""
-    system_prompt = """You are a helpful coding assistant. You excel at:
-- Writing clean, efficient code
-- Explaining complex concepts clearly
-- Debugging and problem-solving
-- Following best practices and conventions
-Please provide clear, concise responses."""
-    
-    # Build the full prompt with conversation history
-    prompt = f"""<|im_start|>system
-{system_prompt}<|im_end|>
-{conversation_history}<|im_start|>user
-{message}<|im_end|>
-<|im_start|>assistant
-"""
-    
-    # Trim conversation history if needed
-    if count_tokens(prompt) > MAX_CONTEXT_TOKENS - MAX_RESPONSE_TOKENS:
-        conversation_history = trim_conversation_to_fit(conversation_history, system_prompt, message)
-        prompt = f"""<|im_start|>system
-{system_prompt}<|im_end|>
-{conversation_history}<|im_start|>user
-{message}<|im_end|>
-<|im_start|>assistant
-"""
+    # Build the full prompt with conversation history, trimmed to fit
+    prompt, total_tokens = build_prompt(messages, message)
     
     # Log token usage
-    total_tokens = count_tokens(prompt)
     print(f"Prompt tokens: {total_tokens}, Max allowed: {MAX_CONTEXT_TOKENS}")
     
-    # Generate response with streaming
-    stream = llm(
-        prompt,
-        max_tokens=min(MAX_RESPONSE_TOKENS, MAX_CONTEXT_TOKENS - total_tokens),
-        stop=["<|im_end|>", "<|im_start|>"],
-        stream=True,
-        temperature=0.7,
-    )
+    params = sampling_params(total_tokens)
+    cached = response_cache.get(prompt, params) if response_cache is not None else None
+    if cached is not None:
+        yield from response_cache.replay(cached)
+        return
     
     # Stream each token from the model
-    for output in stream:
-        token = output['choices'][0]['text']
+    full_response = ""
+    for token in stream_completion(prompt, params['max_tokens'], params['temperature']):
         if token:  # Only yield non-empty tokens
+            full_response += token
             yield token
+    
+    if response_cache is not None and full_response.strip():
+        response_cache.put(prompt, params, full_response)
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=False) 
+    check_redis()
+    server = make_server('0.0.0.0', 5000, app, threaded=True)
+    startup_timings['time_to_listen_secs'] = time.monotonic() - PROCESS_STARTED
+    print(f"Listening on port 5000 after {startup_timings['time_to_listen_secs']:.2f}s")
+    # Preload in the background unless LAZY_MODEL_LOAD=1 defers it to the first request or /warmup
+    if os.getenv('LAZY_MODEL_LOAD', '').lower() not in ('1', 'true', 'yes'):
+        start_warm_up()
+    server.serve_forever()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+
+"""Continuous batching: several chat generations share each llama.cpp decode step."""
+
+from collections import deque
+from threading import Condition, Thread
+import codecs
+import ctypes
+import os
+import queue
+import time
+import traceback
+
+import llama_cpp
+from llama_cpp import _internals as internals
+
+class BatchSequence:
+    """One generation in the engine; iterate it for text pieces, close() to cancel."""
+
+    def __init__(self, engine, tokens: list, max_tokens: int, temperature: float,
+                 top_p: float, stop: list, seed: int):
+        self.engine = engine
+        self.tokens = tokens
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.stop = stop
+        self.seed = seed
+        self.seq_id = None
+        self.n_past = 0           # tokens of this sequence already in the KV cache
+        self.n_generated = 0
+        self.last_token = None    # sampled but not yet decoded
+        self.sampler = None
+        self.cancelled = False
+        self.submitted_at = time.monotonic()
+        self.first_token_at = None
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._held = ''           # text that might be the start of a stop string
+        self._out = queue.Queue()
+
+    @property
+    def reserved(self) -> int:
+        """KV cells this sequence may use: its prompt plus every token it may generate."""
+        return len(self.tokens) + self.max_tokens
+
+    def __iter__(self):
+        while True:
+            piece = self._out.get()
+            if piece is None:
+                return
+            if isinstance(piece, Exception):
+                raise piece
+            yield piece
+
+    def close(self):
+        """Stop generating; the engine drops the sequence before its next step."""
+        self.cancelled = True
+        self.engine.wake()
+
+    def _emit(self, text: str) -> bool:
+        """Queue generated text, holding back a possible stop-string prefix; True if a stop was hit."""
+        text = self._held + text
+        for stop in self.stop:
+            index = text.find(stop)
+            if index != -1:
+                if index:
+                    self._out.put(text[:index])
+                self._held = ''
+                return True
+        hold = 0
+        for stop in self.stop:
+            for size in range(min(len(stop) - 1, len(text)), hold, -1):
+                if text.endswith(stop[:size]):
+                    hold = size
+                    break
+        if len(text) > hold:
+            self._out.put(text[:len(text) - hold])
+        self._held = text[len(text) - hold:] if hold else ''
+        return False
+
+    def _finish(self, error: Exception = None):
+        if error is not None:
+            self._out.put(error)
+        elif self._held:
+            self._out.put(self._held)
+        self._held = ''
+        self._out.put(None)
+
+class BatchEngine:
+    """Runs up to n_parallel generations at once on one model and one KV cache.
+
+    A single worker thread loops over decode steps. Each step carries one
+    new token for every generating sequence, and spends the rest of the
+    n_batch budget on prompt chunks of newly admitted ones, so long prompts
+    don't stall the others. Sequences are admitted into free slots and
+    retired (KV cells freed) between steps. The context's n_ctx cells are
+    shared; a sequence is admitted only once its prompt plus max_tokens
+    fit, so a step never runs out of KV space.
+    """
+
+    def __init__(self, model_path: str, n_ctx: int = 32768, n_parallel: int = 4, n_batch: int = 512,
+                 n_threads: int = None, n_gpu_layers: int = -1, verbose: bool = False):
+        self.n_ctx = n_ctx
+        self.n_parallel = n_parallel
+        self.n_batch = n_batch
+
+        llama_cpp.llama_backend_init()
+        model_params = llama_cpp.llama_model_default_params()
+        model_params.n_gpu_layers = 0x7FFFFFFF if n_gpu_layers == -1 else n_gpu_layers
+        self._model = internals.LlamaModel(path_model=model_path, params=model_params, verbose=verbose)
+
+        ctx_params = llama_cpp.llama_context_default_params()
+        # ctypes silently accepts unknown attributes, so check the struct really has the field
+        if 'kv_unified' not in dict(type(ctx_params)._fields_) or not hasattr(llama_cpp, 'llama_memory_seq_rm'):
+            raise RuntimeError(
+                f"BatchEngine needs llama-cpp-python >= 0.3.15 (unified KV cache and llama_memory_* API), "
+                f"found {getattr(llama_cpp, '__version__', 'unknown')}; upgrade it or set BATCH_SEQUENCES=1"
+            )
+        ctx_params.n_ctx = n_ctx
+        ctx_params.n_batch = n_batch
+        ctx_params.n_ubatch = n_batch
+        ctx_params.n_seq_max = n_parallel
+        ctx_params.kv_unified = True  # one pool of n_ctx cells shared by all sequences
+        ctx_params.n_threads = n_threads or os.cpu_count()
+        ctx_params.n_threads_batch = n_threads or os.cpu_count()
+        self._ctx = internals.LlamaContext(model=self._model, params=ctx_params, verbose=verbose)
+        self._batch = internals.LlamaBatch(n_tokens=n_batch, embd=0, n_seq_max=n_parallel, verbose=verbose)
+        self._piece = ctypes.create_string_buffer(256)
+
+        self._cond = Condition()
+        self._pending = deque()
+        self._active = {}            # seq_id -> BatchSequence
+        self._free_slots = list(range(n_parallel))
+        self._reserved = 0
+        self._running = True
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'cancelled': 0,
+            'steps': 0,
+            'prompt_tokens': 0,
+            'generated_tokens': 0,
+            'decode_secs': 0.0,
+            'max_batch_sequences': 0
+        }
+
+        self._thread = Thread(target=self._loop, name='batch-engine', daemon=True)
+        self._thread.start()
+
+    def tokenize(self, text: str) -> list:
+        return self._model.tokenize(text.encode('utf-8'), add_bos=True, special=True)
+
+    def submit(self, prompt: str, max_tokens: int = 512, temperature: float = 0.7, top_p: float = 0.95,
+               stop: list = None, seed: int = None) -> BatchSequence:
+        """Queue a prompt; the returned sequence yields text as it is generated."""
+        tokens = self.tokenize(prompt)
+        if len(tokens) >= self.n_ctx:
+            raise ValueError(f"Prompt is {len(tokens)} tokens, context is {self.n_ctx}")
+        max_tokens = max(1, min(max_tokens, self.n_ctx - len(tokens)))
+        sequence = BatchSequence(
+            self, tokens, max_tokens, temperature, top_p, stop or [],
+            seed if seed is not None else llama_cpp.LLAMA_DEFAULT_SEED
+        )
+        with self._cond:
+            self._pending.append(sequence)
+            self._stats['submitted'] += 1
+            self._cond.notify_all()
+        return sequence
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join()
+        self._batch.close()
+        self._ctx.close()
+        self._model.close()
+
+    def _sampler(self, sequence: BatchSequence):
+        sampler = internals.LlamaSampler()
+        if sequence.temperature <= 0:
+            sampler.add_greedy()
+        else:
+            sampler.add_top_k(40)
+            sampler.add_top_p(sequence.top_p, 1)
+            sampler.add_temp(sequence.temperature)
+            sampler.add_dist(sequence.seed)
+        return sampler
+
+    def _admit(self):
+        """Move pending sequences into free slots while their KV reservation fits; caller holds the lock."""
+        while self._pending and self._free_slots:
+            sequence = self._pending[0]
+            if sequence.cancelled:
+                self._pending.popleft()
+                self._stats['cancelled'] += 1
+                sequence._finish()
+                continue
+            if self._active and self._reserved + sequence.reserved > self.n_ctx:
+                break
+            self._pending.popleft()
+            sequence.seq_id = self._free_slots.pop()
+            sequence.sampler = self._sampler(sequence)
+            self._active[sequence.seq_id] = sequence
+            self._reserved += sequence.reserved
+
+    def _retire(self, sequence: BatchSequence, error: Exception = None):
+        """Free a sequence's slot and KV cells; caller holds the lock."""
+        llama_cpp.llama_memory_seq_rm(self._ctx.memory, sequence.seq_id, -1, -1)
+        del self._active[sequence.seq_id]
+        self._free_slots.append(sequence.seq_id)
+        self._reserved -= sequence.reserved
+        sequence.sampler.close()
+        sequence.sampler = None
+        if sequence.cancelled:
+            self._stats['cancelled'] += 1
+        else:
+            self._stats['completed'] += 1
+        sequence._finish(error)
+
+    def _add(self, token: int, pos: int, seq_id: int, logits: bool):
+        batch = self._batch.batch
+        i = batch.n_tokens
+        batch.token[i] = token
+        batch.pos[i] = pos
+        batch.seq_id[i][0] = seq_id
+        batch.n_seq_id[i] = 1
+        batch.logits[i] = logits
+        batch.n_tokens += 1
+        return i
+
+    def _fill_batch(self) -> dict:
+        """Build one step: a token per generating sequence, then prompt chunks; returns {batch index: sequence}."""
+        self._batch.reset()
+        sample_at = {}
+        prefilling = []
+        for sequence in self._active.values():
+            if sequence.last_token is None:
+                prefilling.append(sequence)
+                continue
+            i = self._add(sequence.last_token, sequence.n_past, sequence.seq_id, True)
+            sequence.n_past += 1
+            sample_at[i] = sequence
+
+        budget = self.n_batch - self._batch.n_tokens()
+        for sequence in prefilling:
+            if budget <= 0:
+                break
+            chunk = sequence.tokens[sequence.n_past:sequence.n_past + budget]
+            for offset, token in enumerate(chunk):
+                last = sequence.n_past + offset == len(sequence.tokens) - 1
+                i = self._add(token, sequence.n_past + offset, sequence.seq_id, last)
+                if last:
+                    sample_at[i] = sequence
+            sequence.n_past += len(chunk)
+            self._stats['prompt_tokens'] += len(chunk)
+            budget -= len(chunk)
+        return sample_at
+
+    def _piece_text(self, sequence: BatchSequence, token: int) -> str:
+        n = llama_cpp.llama_token_to_piece(self._model.vocab, token, self._piece, len(self._piece), 0, False)
+        return sequence._decoder.decode(self._piece.raw[:max(n, 0)])
+
+    def _step(self):
+        with self._cond:
+            for sequence in [s for s in self._active.values() if s.cancelled]:
+                self._retire(sequence)
+            self._admit()
+            sample_at = self._fill_batch()
+            if not self._batch.n_tokens():
+                return
+            self._stats['max_batch_sequences'] = max(self._stats['max_batch_sequences'], len(self._active))
+
+        started = time.perf_counter()
+        self._ctx.decode(self._batch)
+        elapsed = time.perf_counter() - started
+
+        with self._cond:
+            self._stats['decode_secs'] += elapsed
+            self._stats['steps'] += 1
+            for i, sequence in sample_at.items():
+                token = sequence.sampler.sample(self._ctx, i)
+                sequence.n_generated += 1
+                self._stats['generated_tokens'] += 1
+                if sequence.first_token_at is None:
+                    sequence.first_token_at = time.monotonic()
+                if llama_cpp.llama_vocab_is_eog(self._model.vocab, token):
+                    self._retire(sequence)
+                    continue
+                stopped = sequence._emit(self._piece_text(sequence, token))
+                if stopped or sequence.n_generated >= sequence.max_tokens:
+                    self._retire(sequence)
+                else:
+                    sequence.last_token = token
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: not self._running or self._pending or self._active)
+                if not self._running:
+                    for sequence in list(self._active.values()):
+                        self._retire(sequence)
+                    while self._pending:
+                        self._pending.popleft()._finish()
+                    return
+            try:
+                self._step()
+            except Exception as e:
+                print(f"⚠️ Batch decode failed: {str(e)}")
+                print(traceback.format_exc())
+                with self._cond:
+                    for sequence in list(self._active.values()):
+                        self._retire(sequence, e)
+
+    def metrics(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats['active'] = len(self._active)
+            stats['pending'] = len(self._pending)
+            stats['reserved_kv_cells'] = self._reserved
+        stats['n_parallel'] = self.n_parallel
+        stats['n_ctx'] = self.n_ctx
+        stats['decode_tokens_per_sec'] = (
+            round(stats['generated_tokens'] / stats['decode_secs'], 1) if stats['decode_secs'] else 0.0
+        )
+        stats['decode_secs'] = round(stats['decode_secs'], 3)
+        return stats
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Aggregate generation throughput of the batch engine for 1, 4 and 8 concurrent users
+
+Each simulated user submits one chat prompt at the same time and reads its
+stream to the end on its own thread. Reports aggregate generated tokens/sec,
+mean time to first token and per-user tokens/sec for every concurrency level.
+
+Usage:
+    python benchmarks/batch_benchmark.py --model models/Qwen2.5-Coder-32B-Instruct-Q5_K_S.gguf --users 1 4 8
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from threading import Thread
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batch_engine import BatchEngine
+
+QUESTIONS = [
+    "Write a Python function that merges two sorted lists.",
+    "Explain the difference between a process and a thread.",
+    "How do I reverse a linked list in C?",
+    "Write a SQL query for the top 5 customers by revenue.",
+    "What does the Rust borrow checker prevent?",
+    "Write a bash one-liner that counts lines in all .py files.",
+    "Explain big-O of binary search with an example.",
+    "Write a JavaScript debounce function.",
+]
+STOP = ["<|im_end|>", "<|im_start|>"]
+
+def chat_prompt(question: str) -> str:
+    return (f"<|im_start|>system\nYou are a helpful coding assistant.<|im_end|>\n"
+            f"<|im_start|>user\n{question}<|im_end|>\n<|im_start|>assistant\n")
+
+def run_level(engine: BatchEngine, users: int, max_tokens: int) -> dict:
+    results = [None] * users
+
+    def user(index: int):
+        started = time.perf_counter()
+        sequence = engine.submit(chat_prompt(QUESTIONS[index % len(QUESTIONS)]), max_tokens=max_tokens,
+                                 temperature=0.0, stop=STOP)
+        first = None
+        for _ in sequence:
+            if first is None:
+                first = time.perf_counter() - started
+        results[index] = {
+            "tokens": sequence.n_generated,
+            "ttft_secs": first or 0.0,
+            "secs": time.perf_counter() - started
+        }
+
+    threads = [Thread(target=user, args=(i,)) for i in range(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    tokens = sum(r["tokens"] for r in results)
+    return {
+        "users": users,
+        "generated_tokens": tokens,
+        "wall_secs": round(wall, 2),
+        "aggregate_tokens_per_sec": round(tokens / wall, 2),
+        "per_user_tokens_per_sec": round(statistics.mean(r["tokens"] / r["secs"] for r in results), 2),
+        "mean_ttft_secs": round(statistics.mean(r["ttft_secs"] for r in results), 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", required=True, help="Path to a GGUF model")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--n-ctx", type=int, default=8192)
+    parser.add_argument("--n-batch", type=int, default=512)
+    parser.add_argument("--n-gpu-layers", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    engine = BatchEngine(args.model, n_ctx=args.n_ctx, n_parallel=max(args.users), n_batch=args.n_batch,
+                         n_gpu_layers=args.n_gpu_layers)
+    try:
+        run_level(engine, 1, 8)  # warm up
+        levels = [run_level(engine, users, args.max_tokens) for users in args.users]
+    finally:
+        engine.close()
+
+    print(f"{'users':>6} {'agg tok/s':>10} {'user tok/s':>11} {'ttft s':>8} {'wall s':>8}")
+    for row in levels:
+        print(f"{row['users']:>6} {row['aggregate_tokens_per_sec']:>10} {row['per_user_tokens_per_sec']:>11}"
+              f" {row['mean_ttft_secs']:>8} {row['wall_secs']:>8}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "model": Path(args.model).name,
+            "max_tokens": args.max_tokens,
+            "levels": levels
+        }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Decode tokens/sec of the Qwen coder model with and without a draft model
+
+Loads the main model once with logits_all=True, as speculative decoding
+requires, and runs the same greedy completions with the draft model
+detached and then attached, so both runs pay the same logits bookkeeping.
+With greedy sampling, both runs should produce the same text.
+
+Usage:
+    python benchmarks/speculative_benchmark.py \\
+        --model models/Qwen2.5-Coder-32B-Instruct-Q5_K_S.gguf \\
+        --draft-model models/Qwen2.5-Coder-0.5B-Instruct-Q8_0.gguf
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from llama_cpp import Llama
+from speculative import DraftModel
+
+PROMPTS = [
+    "Write a Python function that parses an ISO 8601 date string without using datetime.",
+    "Implement a thread-safe LRU cache class in Python with get and put methods.",
+    "Write a C function that reverses a singly linked list, with a short explanation.",
+    "Convert this loop to a list comprehension: result = []\nfor x in range(10):\n    if x % 2:\n        result.append(x * x)",
+]
+
+def chat_prompt(question: str) -> str:
+    return (f"<|im_start|>system\nYou are a helpful coding assistant.<|im_end|>\n"
+            f"<|im_start|>user\n{question}<|im_end|>\n<|im_start|>assistant\n")
+
+def run(llm: Llama, max_tokens: int, draft: DraftModel = None) -> dict:
+    llm.draft_model = draft
+    tokens = 0
+    seconds = 0.0
+    texts = []
+    rates = []
+    for question in PROMPTS:
+        llm.reset()
+        if draft is not None:
+            draft.start_request()
+        started = time.perf_counter()
+        result = llm.create_completion(chat_prompt(question), max_tokens=max_tokens, temperature=0.0,
+                                       stop=["<|im_end|>", "<|im_start|>"])
+        seconds += time.perf_counter() - started
+        tokens += result["usage"]["completion_tokens"]
+        texts.append(result["choices"][0]["text"])
+        if draft is not None:
+            rates.append(draft.finish_request()["acceptance_rate"])
+    report = {
+        "draft_model": draft is not None,
+        "completion_tokens": tokens,
+        "seconds": round(seconds, 2),
+        "tokens_per_sec": round(tokens / seconds, 2) if seconds else 0.0
+    }
+    if rates:
+        report["mean_acceptance_rate"] = round(sum(rates) / len(rates), 3)
+    return report, texts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", required=True, help="Main GGUF model")
+    parser.add_argument("--draft-model", required=True, help="Small GGUF model with the same tokenizer")
+    parser.add_argument("--draft-tokens", type=int, default=6)
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--n-ctx", type=int, default=4096)
+    parser.add_argument("--n-gpu-layers", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    llm = Llama(model_path=args.model, n_ctx=args.n_ctx, n_gpu_layers=args.n_gpu_layers,
+                logits_all=True, verbose=False)
+    draft = DraftModel(args.draft_model, num_pred_tokens=args.draft_tokens, n_ctx=args.n_ctx,
+                       n_gpu_layers=args.n_gpu_layers)
+
+    baseline, baseline_texts = run(llm, args.max_tokens)
+    speculative, speculative_texts = run(llm, args.max_tokens, draft)
+    speedup = round(speculative["tokens_per_sec"] / baseline["tokens_per_sec"], 2) if baseline["tokens_per_sec"] else 0.0
+
+    print(f"Without draft model: {baseline['tokens_per_sec']} tokens/s")
+    print(f"With draft model:    {speculative['tokens_per_sec']} tokens/s "
+          f"(acceptance {speculative['mean_acceptance_rate']:.0%})")
+    print(f"Speedup: {speedup}x")
+    if baseline_texts != speculative_texts:
+        print("Note: outputs differ between runs")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "model": Path(args.model).name,
+            "draft_model": Path(args.draft_model).name,
+            "draft_tokens": args.draft_tokens,
+            "baseline": baseline,
+            "speculative": speculative,
+            "speedup": speedup,
+            "identical_output": baseline_texts == speculative_texts
+        }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+"""Append-only conversation storage on Redis lists."""
+
+import json
+import redis
+
+class ConversationStore:
+    """Stores each conversation as a Redis list with one compact JSON message per item.
+
+    A turn is a single RPUSH plus LTRIM/EXPIRE in one pipeline, so write cost
+    no longer grows with conversation length. Reads are one pipelined LRANGE.
+    Conversations saved by older versions as a single JSON string under the
+    same key are converted to a list the first time they are read.
+
+    Works with any redis-py compatible client (e.g. fakeredis.FakeRedis) that
+    was created with decode_responses=True.
+    """
+
+    def __init__(self, client, ttl: int, max_messages: int = 200, prefix: str = 'chat:'):
+        self.client = client
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.prefix = prefix
+
+    def key(self, user_id: str) -> str:
+        return f"{self.prefix}{user_id}"
+
+    @staticmethod
+    def encode(message: dict) -> str:
+        return json.dumps(message, separators=(',', ':'), ensure_ascii=False)
+
+    def load(self, user_id: str, last: int = None) -> list:
+        """All stored messages (or only the last N), oldest first."""
+        key = self.key(user_id)
+        start = -last if last else 0
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.lrange(key, start, -1)
+            pipe.expire(key, self.ttl)
+            items, _ = pipe.execute()
+        except redis.ResponseError:
+            # WRONGTYPE: a whole-conversation blob from before list storage
+            items = self._migrate(key)
+            if last:
+                items = items[-last:]
+        return [json.loads(item) for item in items]
+
+    def _migrate(self, key: str) -> list:
+        """Rewrite a legacy JSON-string conversation as a list; returns the encoded items."""
+        data = self.client.get(key)
+        messages = json.loads(data) if data else []
+        items = [self.encode(msg) for msg in messages[-self.max_messages:]]
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        if items:
+            pipe.rpush(key, *items)
+            pipe.expire(key, self.ttl)
+        pipe.execute()
+        print(f"🔁 Migrated {key} to list storage ({len(items)} messages)")
+        return items
+
+    def append(self, user_id: str, *messages: dict) -> int:
+        """Append messages, cap the list and refresh the TTL; returns the new length."""
+        key = self.key(user_id)
+        try:
+            return self._append(key, messages)
+        except redis.ResponseError:
+            self._migrate(key)
+            return self._append(key, messages)
+
+    def _append(self, key: str, messages) -> int:
+        pipe = self.client.pipeline()
+        pipe.rpush(key, *[self.encode(msg) for msg in messages])
+        pipe.ltrim(key, -self.max_messages, -1)
+        pipe.expire(key, self.ttl)
+        length, _, _ = pipe.execute()
+        return min(length, self.max_messages)
+
+    def clear(self, user_id: str) -> bool:
+        """Delete a conversation; True if one existed."""
+        return bool(self.client.delete(self.key(user_id)))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+"""Thread-safe lazy initialization of expensive resources (models, tokenizers)."""
+
+from threading import Event, Lock, Thread
+import time
+import traceback
+
+class LazyResource:
+    """Builds a value with factory() once, on first get() or in the background after start().
+
+    Concurrent callers block on the same load instead of starting their own.
+    A failed load is reported through status() and retried on the next get().
+    """
+
+    def __init__(self, name: str, factory):
+        self.name = name
+        self._factory = factory
+        self._lock = Lock()          # held for the whole load
+        self._state_lock = Lock()    # guards start() against itself
+        self._loaded = Event()
+        self._value = None
+        self.state = 'not_loaded'
+        self.error = None
+        self.started_at = None
+        self.load_secs = None
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded.is_set()
+
+    def get(self):
+        if self._loaded.is_set():
+            return self._value
+        with self._lock:
+            if self._loaded.is_set():
+                return self._value
+            self.state = 'loading'
+            self.error = None
+            self.started_at = time.monotonic()
+            print(f"⏳ Loading {self.name}...")
+            try:
+                value = self._factory()
+            except Exception as e:
+                self.state = 'failed'
+                self.error = str(e)
+                print(f"❌ Failed to load {self.name}: {str(e)}")
+                raise
+            self._value = value
+            self.load_secs = time.monotonic() - self.started_at
+            self.state = 'ready'
+            self._loaded.set()
+            print(f"✅ Loaded {self.name} in {self.load_secs:.1f}s")
+            return value
+
+    def start(self):
+        """Begin loading on a background thread; no-op if loading or loaded."""
+        with self._state_lock:
+            if self.state in ('loading', 'ready'):
+                return
+            # Mark it now, so a wait() right after a failed load waits for this retry
+            self.state = 'loading'
+            self.error = None
+            self.started_at = time.monotonic()
+        Thread(target=self._load_in_background, name=f"load-{self.name}", daemon=True).start()
+
+    def _load_in_background(self):
+        try:
+            self.get()
+        except Exception:
+            print(traceback.format_exc())
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until loaded; False on timeout. Raises if the load has failed."""
+        if self.state == 'failed':
+            raise RuntimeError(f"{self.name} failed to load: {self.error}")
+        return self._loaded.wait(timeout)
+
+    def status(self) -> dict:
+        status = {'state': self.state}
+        if self.state == 'loading':
+            status['elapsed_secs'] = round(time.monotonic() - self.started_at, 1)
+        if self.load_secs is not None:
+            status['load_secs'] = round(self.load_secs, 2)
+        if self.error:
+            status['error'] = self.error
+        return status
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""Incremental markdown rendering for streamed model output."""
+
+import html
+import re
+import markdown
+
+LIST_ITEM = re.compile(r'\s*(?:[-*+]|\d+[.)])\s')
+
+def js_length(text: str) -> int:
+    """Length in UTF-16 code units, i.e. JavaScript's String.length."""
+    return len(text.encode('utf-16-le')) // 2
+
+class IncrementalMarkdownRenderer:
+    """Turns a token stream into HTML fragments, one per finished block.
+
+    Tokens are buffered until a line completes; lines are grouped into blocks
+    (a fenced code block, or prose up to a blank line). A block is rendered
+    exactly once, when it is known to be complete, so the cost per token is
+    amortized O(1) instead of re-parsing the whole response every token.
+
+    consumed is how much of the input the emitted fragments cover, in UTF-16
+    code units so the browser can slice its copy of the text and render
+    only the unfinished tail itself.
+    """
+
+    def __init__(self):
+        self._md = markdown.Markdown(extensions=['tables'])
+        self._partial = []      # pieces of the current, unfinished line
+        self._block = []        # finished lines of the current block
+        self._language = None   # set while inside a fenced code block
+        self._blank = False     # the prose block has been followed by a blank line
+        self._pending = 0       # length of the finished lines not yet emitted
+        self.consumed = 0
+
+    def feed(self, text: str) -> list:
+        """Add streamed text; returns HTML for any blocks it completed."""
+        if '\n' not in text:
+            self._partial.append(text)
+            return []
+
+        fragments = []
+        first, *rest = text.split('\n')
+        self._partial.append(first)
+        for piece in rest:
+            line = ''.join(self._partial)
+            self._partial = [piece]
+            fragments.extend(self._line(line))
+        return fragments
+
+    def finish(self) -> list:
+        """Flush whatever is left at the end of the stream."""
+        fragments = []
+        line = ''.join(self._partial)
+        self._partial = []
+        if line:
+            fragments.extend(self._line(line, newline=False))
+        if self._language is not None:
+            fragments.extend(self._flush_code())
+        else:
+            fragments.extend(self._flush())
+        return fragments
+
+    def _line(self, line: str, newline: bool = True) -> list:
+        length = js_length(line) + newline
+        stripped = line.strip()
+        fragments = []
+
+        if self._language is not None:
+            if stripped.startswith('```') and not stripped.strip('`'):
+                self._pending += length
+                return self._flush_code()
+            self._block.append(line)
+        elif stripped.startswith('```'):
+            fragments = self._flush()
+            self._language = stripped[3:].strip() or 'plaintext'
+        elif not stripped:
+            self._blank = bool(self._block)
+        else:
+            if self._blank:
+                if self._continues_list(line):
+                    # Keep the blank line: it makes the list loose, which changes its HTML
+                    self._block.append('')
+                else:
+                    fragments = self._flush()
+            self._blank = False
+            self._block.append(line)
+
+        self._pending += length
+        return fragments
+
+    def _continues_list(self, line: str) -> bool:
+        """Blank lines inside a list don't end it (loose lists, indented item text)."""
+        return bool(LIST_ITEM.match(self._block[0])) and (
+            bool(LIST_ITEM.match(line)) or line[:1] in (' ', '\t')
+        )
+
+    def _emit(self, fragment: str) -> list:
+        self.consumed += self._pending
+        self._pending = 0
+        self._block = []
+        self._blank = False
+        return [fragment] if fragment else []
+
+    def _flush(self) -> list:
+        if not self._block:
+            return self._emit('')
+        return self._emit(self._md.reset().convert('\n'.join(self._block)))
+
+    def _flush_code(self) -> list:
+        code = html.escape('\n'.join(self._block), quote=False)
+        language = html.escape(self._language)
+        self._language = None
+        return self._emit(f'<pre><code class="language-{language}">{code}</code></pre>')
+
+def render_markdown(text: str) -> str:
+    """Render a complete text with the same rules as the streaming renderer."""
+    renderer = IncrementalMarkdownRenderer()
+    return '\n'.join(renderer.feed(text) + renderer.finish())
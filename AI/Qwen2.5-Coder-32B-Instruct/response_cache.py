@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+"""Opt-in Redis cache of complete model responses for repeated prompts."""
+
+import hashlib
+import json
+import re
+import redis
+
+CHUNK = re.compile(r'\s*\S+|\s+')
+
+class ResponseCache:
+    """Maps a normalized (prompt, sampling params) hash to a finished response.
+
+    The prompt already holds the system prompt, the trimmed history and the
+    new message, so hashing it covers all three. Only line endings and
+    leading/trailing whitespace are normalized: indentation and blank lines
+    inside code change its meaning, so they stay part of the key.
+    Hit/miss counters live in a Redis hash so every worker process shares them.
+    """
+
+    def __init__(self, client, ttl: int, prefix: str = 'respcache:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.stats_key = f"{prefix}stats"
+
+    def key(self, prompt: str, params: dict) -> str:
+        normalized = {
+            'prompt': prompt.replace('\r\n', '\n').replace('\r', '\n').strip(),
+            'params': params
+        }
+        digest = hashlib.sha256(json.dumps(normalized, sort_keys=True).encode('utf-8')).hexdigest()
+        return f"{self.prefix}{digest}"
+
+    def get(self, prompt: str, params: dict):
+        """Cached response text, or None; counts the lookup as a hit or miss."""
+        key = self.key(prompt, params)
+        try:
+            response = self.client.get(key)
+            self.client.hincrby(self.stats_key, 'hits' if response is not None else 'misses', 1)
+            return response
+        except redis.RedisError as e:
+            print(f"⚠️ Response cache lookup failed: {e}")
+            return None
+
+    def contains(self, prompt: str, params: dict) -> bool:
+        """Whether a response is cached, without counting a hit or miss."""
+        try:
+            return bool(self.client.exists(self.key(prompt, params)))
+        except redis.RedisError as e:
+            print(f"⚠️ Response cache lookup failed: {e}")
+            return False
+
+    def put(self, prompt: str, params: dict, response: str):
+        try:
+            self.client.setex(self.key(prompt, params), self.ttl, response)
+        except redis.RedisError as e:
+            print(f"⚠️ Response cache store failed: {e}")
+
+    @staticmethod
+    def replay(response: str):
+        """Yield a cached response in word-sized pieces, like a model stream."""
+        for match in CHUNK.finditer(response):
+            yield match.group(0)
+
+    def stats(self) -> dict:
+        counts = self.client.hgetall(self.stats_key)
+        hits = int(counts.get('hits', 0))
+        misses = int(counts.get('misses', 0))
+        lookups = hits + misses
+        return {
+            'enabled': True,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / lookups, 3) if lookups else 0.0,
+            'ttl': self.ttl
+        }
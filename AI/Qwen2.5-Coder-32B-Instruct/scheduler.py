@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+"""Bounded, per-user fair admission in front of the single Llama instance."""
+
+from collections import OrderedDict, deque
+from threading import Condition
+import math
+import time
+
+class QueueFull(Exception):
+    """Raised when a request cannot be admitted; retry_after is in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class Ticket:
+    """One admitted request, from queueing through generation."""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.finished = False
+        self.cancelled = False
+
+    @property
+    def granted(self) -> bool:
+        return self.started_at is not None
+
+class GenerationScheduler:
+    """Admits generation requests into a bounded queue and runs up to max_active at once.
+
+    Waiting requests are served round-robin across users, so one user with
+    several queued requests cannot starve the others. Requests beyond
+    max_queue (or max_per_user for one user) are rejected with an estimated
+    Retry-After. A ticket released before it was granted (client went away)
+    is simply dropped from the queue.
+    """
+
+    def __init__(self, max_queue: int = 16, max_per_user: int = 2, max_active: int = 1):
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.max_active = max_active
+        self._cond = Condition()
+        self._waiting = OrderedDict()  # user_id -> deque of tickets, in round-robin order
+        self._queued = 0
+        self._active = 0
+        self._per_user = {}
+        self._last_served = None
+        self._stats = {
+            'admitted': 0,
+            'rejected': 0,
+            'cancelled': 0,
+            'completed': 0,
+            'total_wait_secs': 0.0,
+            'max_wait_secs': 0.0,
+            'total_generation_secs': 0.0,
+            'max_generation_secs': 0.0
+        }
+
+    def _retry_after(self) -> int:
+        """Rough seconds until a slot frees up, from the average generation time."""
+        completed = self._stats['completed']
+        avg = self._stats['total_generation_secs'] / completed if completed else 10.0
+        return max(1, math.ceil(avg * (self._queued + 1) / self.max_active))
+
+    def check(self, user_id: str):
+        """Raise QueueFull if a request from user_id would be rejected right now."""
+        with self._cond:
+            if self._queued >= self.max_queue:
+                raise QueueFull('Server is busy, too many queued requests', self._retry_after())
+            if self._per_user.get(user_id, 0) >= self.max_per_user:
+                raise QueueFull('Too many requests in progress for this session', self._retry_after())
+
+    def submit(self, user_id: str) -> Ticket:
+        """Queue a request or raise QueueFull."""
+        with self._cond:
+            try:
+                self.check(user_id)
+            except QueueFull:
+                self._stats['rejected'] += 1
+                raise
+            ticket = Ticket(user_id)
+            self._waiting.setdefault(user_id, deque()).append(ticket)
+            self._queued += 1
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+            self._stats['admitted'] += 1
+            self._dispatch()
+            return ticket
+
+    def _dispatch(self):
+        """Grant free slots to the next user in rotation; caller holds the lock."""
+        while self._active < self.max_active and self._waiting:
+            # Whoever was served last goes after everyone else who is waiting
+            user_id = next(
+                (uid for uid in self._waiting if uid != self._last_served),
+                self._last_served
+            )
+            tickets = self._waiting[user_id]
+            ticket = tickets.popleft()
+            self._last_served = user_id
+            # Move this user to the back of the rotation
+            del self._waiting[user_id]
+            if tickets:
+                self._waiting[user_id] = tickets
+            self._queued -= 1
+            self._active += 1
+            ticket.started_at = time.monotonic()
+            waited = ticket.started_at - ticket.enqueued_at
+            self._stats['total_wait_secs'] += waited
+            self._stats['max_wait_secs'] = max(self._stats['max_wait_secs'], waited)
+        self._cond.notify_all()
+
+    def position(self, ticket: Ticket) -> int:
+        """Approximate number of requests ahead of this ticket (0 once granted)."""
+        with self._cond:
+            if ticket.granted:
+                return 0
+            ahead = 0
+            for tickets in self._waiting.values():
+                ahead += sum(1 for other in tickets if other.enqueued_at < ticket.enqueued_at)
+            return ahead + 1
+
+    def wait(self, ticket: Ticket, timeout: float = None) -> bool:
+        """Block until the ticket is granted; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: ticket.granted, timeout)
+
+    def release(self, ticket: Ticket):
+        """Finish a granted ticket, or withdraw a waiting one. Safe to call twice."""
+        with self._cond:
+            if ticket.finished:
+                return
+            ticket.finished = True
+            self._per_user[ticket.user_id] -= 1
+            if not self._per_user[ticket.user_id]:
+                del self._per_user[ticket.user_id]
+
+            if ticket.granted:
+                self._active -= 1
+                elapsed = time.monotonic() - ticket.started_at
+                self._stats['completed'] += 1
+                self._stats['total_generation_secs'] += elapsed
+                self._stats['max_generation_secs'] = max(self._stats['max_generation_secs'], elapsed)
+            else:
+                ticket.cancelled = True
+                self._stats['cancelled'] += 1
+                tickets = self._waiting.get(ticket.user_id)
+                if tickets is not None:
+                    tickets.remove(ticket)
+                    if not tickets:
+                        del self._waiting[ticket.user_id]
+                self._queued -= 1
+            self._dispatch()
+
+    def metrics(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats['queued'] = self._queued
+            stats['active'] = self._active
+            stats['waiting_users'] = len(self._waiting)
+            stats['retry_after_estimate'] = self._retry_after()
+        started = stats['admitted'] - stats['cancelled'] - stats['queued']
+        stats['avg_wait_secs'] = round(stats['total_wait_secs'] / started, 3) if started > 0 else 0.0
+        stats['avg_generation_secs'] = (
+            round(stats['total_generation_secs'] / stats['completed'], 3) if stats['completed'] else 0.0
+        )
+        for key in ('total_wait_secs', 'max_wait_secs', 'total_generation_secs', 'max_generation_secs'):
+            stats[key] = round(stats[key], 3)
+        return stats
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""Speculative decoding: a small Qwen model drafts tokens for the 32B model to verify."""
+
+from threading import Lock
+import time
+
+import numpy as np
+from llama_cpp import Llama
+from llama_cpp.llama_speculative import LlamaDraftModel
+
+class DraftModel(LlamaDraftModel):
+    """Proposes the next num_pred_tokens tokens greedily with a small Llama.
+
+    Plugs into Llama(draft_model=...): the main model evaluates the proposal
+    in one batch and keeps the prefix it agrees with. The draft must share
+    the main model's tokenizer (any Qwen2.5 GGUF does). Its own KV cache is
+    reused across calls through Llama.generate()'s prefix matching, so each
+    call only evaluates what the main model accepted since the last one.
+
+    Acceptance is worked out on the next call: the accepted tokens are the
+    ones at the start of the previous proposal that now appear in input_ids.
+    """
+
+    def __init__(self, model_path: str, num_pred_tokens: int = 6, n_ctx: int = 32768,
+                 n_threads: int = None, n_gpu_layers: int = -1, verbose: bool = False):
+        self.num_pred_tokens = num_pred_tokens
+        self.llm = Llama(
+            model_path=model_path,
+            n_ctx=n_ctx,
+            n_threads=n_threads,
+            n_gpu_layers=n_gpu_layers,
+            n_batch=512,
+            verbose=verbose
+        )
+        self._lock = Lock()
+        self._proposal = []
+        self._proposed_at = 0
+        self._request = self._new_counts()
+        self._totals = self._new_counts()
+        self._totals['requests'] = 0
+
+    @staticmethod
+    def _new_counts() -> dict:
+        return {'drafts': 0, 'proposed': 0, 'accepted': 0, 'draft_secs': 0.0}
+
+    def _count(self, key: str, value):
+        self._request[key] += value
+        self._totals[key] += value
+
+    def _settle(self, input_ids: np.ndarray):
+        """Credit the previous proposal with the tokens the main model kept."""
+        if not self._proposal:
+            return
+        start = self._proposed_at
+        if len(input_ids) > start:
+            kept = input_ids[start:start + len(self._proposal)]
+            accepted = 0
+            for drafted, actual in zip(self._proposal, kept):
+                if drafted != actual:
+                    break
+                accepted += 1
+            self._count('accepted', accepted)
+        self._proposal = []
+
+    def __call__(self, input_ids: np.ndarray, /, **kwargs) -> np.ndarray:
+        with self._lock:
+            self._settle(input_ids)
+            started = time.perf_counter()
+            draft = []
+            generator = self.llm.generate(input_ids.tolist(), top_k=1, temp=0.0, repeat_penalty=1.0)
+            try:
+                for token in generator:
+                    if token == self.llm.token_eos():
+                        break
+                    draft.append(token)
+                    if len(draft) >= self.num_pred_tokens:
+                        break
+            finally:
+                generator.close()
+            self._count('draft_secs', time.perf_counter() - started)
+            self._count('drafts', 1)
+            self._count('proposed', len(draft))
+            self._proposal = draft
+            self._proposed_at = len(input_ids)
+            return np.array(draft, dtype=np.intc)
+
+    def start_request(self):
+        """Reset the per-request counters before a generation."""
+        with self._lock:
+            self._proposal = []
+            self._request = self._new_counts()
+
+    def finish_request(self) -> dict:
+        """Per-request acceptance stats; the last, unverified proposal is not counted."""
+        with self._lock:
+            unverified = len(self._proposal)
+            self._request['proposed'] -= unverified
+            self._totals['proposed'] -= unverified
+            self._proposal = []
+            self._totals['requests'] += 1
+            return self._summary(self._request)
+
+    @staticmethod
+    def _summary(counts: dict) -> dict:
+        stats = dict(counts)
+        stats['acceptance_rate'] = round(stats['accepted'] / stats['proposed'], 3) if stats['proposed'] else 0.0
+        stats['draft_secs'] = round(stats['draft_secs'], 3)
+        return stats
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = self._summary(self._totals)
+        stats['num_pred_tokens'] = self.num_pred_tokens
+        return stats
@@ -174,6 +174,12 @@ document.addEventListener('DOMContentLoaded', function() {
                 body: JSON.stringify({ message })
             });
 
+            if (postResponse.status === 429) {
+                const busy = await postResponse.json().catch(() => ({}));
+                const retryAfter = postResponse.headers.get('Retry-After');
+                throw new Error(`${busy.error || 'Server is busy'}. Try again in ${retryAfter || 'a few'} seconds.`);
+            }
+
             if (!postResponse.ok) {
                 throw new Error('Failed to save message');
             }
@@ -189,6 +195,33 @@ document.addEventListener('DOMContentLoaded', function() {
             let messageContent = '';
             let hasReceivedMessage = false;
 
+            // Finished blocks arrive as server-rendered HTML; only the unfinished tail is parsed here
+            const finishedDiv = document.createElement('div');
+            const tailDiv = document.createElement('div');
+            let consumed = 0;
+
+            function appendFragments(fragments) {
+                for (const fragment of fragments) {
+                    const template = document.createElement('template');
+                    template.innerHTML = fragment;
+                    template.content.querySelectorAll('pre code').forEach(block => {
+                        hljs.highlightElement(block);
+                    });
+                    finishedDiv.appendChild(template.content);
+                }
+            }
+
+            function renderTail() {
+                if (finishedDiv.parentNode !== assistantMessageDiv) {
+                    assistantMessageDiv.replaceChildren(finishedDiv, tailDiv);
+                }
+                const tail = messageContent.slice(consumed);
+                tailDiv.innerHTML = tail.trim() ? marked.parse(tail) : '';
+                tailDiv.querySelectorAll('pre code').forEach(block => {
+                    hljs.highlightElement(block);
+                });
+            }
+
             cleanup.addEventSource(eventSource);
 
             eventSource.onopen = function() {
@@ -200,6 +233,17 @@ document.addEventListener('DOMContentLoaded', function() {
                 try {
                     const data = JSON.parse(event.data);
                     hasReceivedMessage = true;
+
+                    // Keepalive while waiting for the model
+                    if ((data.queue_position !== undefined || data.loading) && !data.token) {
+                        const loadingElement = assistantMessageDiv.querySelector('.loading-dots');
+                        if (loadingElement) {
+                            loadingElement.textContent = data.loading
+                                ? 'Loading model'
+                                : `Queued (position ${data.queue_position})`;
+                        }
+                        return;
+                    }
                     
                     // Remove loading indicator on first message
                     const loadingElement = assistantMessageDiv.querySelector('.loading-dots');
@@ -214,26 +258,23 @@ document.addEventListener('DOMContentLoaded', function() {
                         return;
                     }
 
-                    if (!data.token) return;
-                    messageContent += data.token;
+                    if (!data.token && !data.html) return;
+                    const finished = (data.token || '').includes("<|im_end|>");
+                    messageContent += (data.token || '').replace("<|im_end|>", "");
+
+                    if (data.html) {
+                        appendFragments(data.html);
+                        consumed = data.consumed;
+                    }
+                    renderTail();
 
                     // Handle completion
-                    if (data.token.includes("<|im_end|>")) {
-                        messageContent = messageContent.replace("<|im_end|>", "");
-                        assistantMessageDiv.innerHTML = marked.parse(messageContent);
-                        assistantMessageDiv.querySelectorAll('pre code').forEach(block => {
-                            hljs.highlightElement(block);
-                        });
+                    if (finished) {
                         cleanup.eventSources.delete(eventSource);
                         eventSource.close();
                         return;
                     }
 
-                    // Regular update
-                    assistantMessageDiv.innerHTML = marked.parse(messageContent);
-                    assistantMessageDiv.querySelectorAll('pre code').forEach(block => {
-                        hljs.highlightElement(block);
-                    });
                     elements.messagesContainer.scrollTop = elements.messagesContainer.scrollHeight;
                 } catch (error) {
                     console.error('Error processing message:', error);
@@ -0,0 +1,96 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from conversation_store import ConversationStore
+
+def message(i):
+    return {'role': 'user' if i % 2 == 0 else 'assistant', 'content': f"message {i}", 'tokens': i}
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+@pytest.fixture
+def store(client):
+    return ConversationStore(client, ttl=3600, max_messages=5)
+
+def test_load_missing_conversation_is_empty(store):
+    assert store.load('nobody') == []
+
+def test_append_then_load_round_trips_in_order(store):
+    assert store.append('alice', message(0), message(1)) == 2
+    assert store.append('alice', message(2)) == 3
+    assert store.load('alice') == [message(0), message(1), message(2)]
+
+def test_load_last_returns_newest_messages(store):
+    store.append('alice', *[message(i) for i in range(4)])
+    assert store.load('alice', last=2) == [message(2), message(3)]
+
+def test_append_trims_to_max_messages(store, client):
+    for i in range(8):
+        length = store.append('alice', message(i))
+    assert length == 5
+    assert client.llen(store.key('alice')) == 5
+    assert store.load('alice') == [message(i) for i in range(3, 8)]
+
+def test_users_are_isolated(store):
+    store.append('alice', message(0))
+    store.append('bob', message(1))
+    assert store.load('alice') == [message(0)]
+    assert store.load('bob') == [message(1)]
+
+def test_append_and_load_refresh_ttl(store, client):
+    key = store.key('alice')
+    store.append('alice', message(0))
+    assert 0 < client.ttl(key) <= 3600
+
+    client.expire(key, 10)
+    store.load('alice')
+    assert client.ttl(key) > 10
+
+    client.expire(key, 10)
+    store.append('alice', message(1))
+    assert client.ttl(key) > 10
+
+def test_clear(store):
+    store.append('alice', message(0))
+    assert store.clear('alice') is True
+    assert store.clear('alice') is False
+    assert store.load('alice') == []
+
+def test_messages_are_stored_as_compact_json(store, client):
+    store.append('alice', {'role': 'user', 'content': 'héllo'})
+    assert client.lrange(store.key('alice'), 0, -1) == ['{"role":"user","content":"héllo"}']
+
+def test_load_migrates_legacy_string_key(store, client):
+    legacy = [message(i) for i in range(7)]
+    client.set(store.key('alice'), json.dumps(legacy))
+
+    assert store.load('alice') == legacy[-5:]
+    assert client.type(store.key('alice')) == 'list'
+    assert client.ttl(store.key('alice')) > 0
+    assert store.load('alice', last=2) == legacy[-2:]
+
+def test_load_last_on_legacy_key(store, client):
+    legacy = [message(i) for i in range(3)]
+    client.set(store.key('alice'), json.dumps(legacy))
+    assert store.load('alice', last=1) == [legacy[-1]]
+
+def test_append_migrates_legacy_string_key(store, client):
+    legacy = [message(0), message(1)]
+    client.set(store.key('alice'), json.dumps(legacy))
+
+    assert store.append('alice', message(2)) == 3
+    assert store.load('alice') == legacy + [message(2)]
+
+def test_migrating_empty_legacy_value(store, client):
+    client.set(store.key('alice'), '')
+    assert store.load('alice') == []
+    assert client.exists(store.key('alice')) == 0
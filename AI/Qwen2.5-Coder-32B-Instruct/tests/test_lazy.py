@@ -0,0 +1,60 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lazy import LazyResource
+
+class FlakyFactory:
+    """Fails the first load, then succeeds once allowed to"""
+
+    def __init__(self):
+        self.calls = 0
+        self.allow = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError('boom')
+        assert self.allow.wait(5)
+        return 'model'
+
+def test_get_loads_once():
+    calls = []
+    resource = LazyResource('thing', lambda: calls.append(1) or 'value')
+    assert resource.get() == resource.get() == 'value'
+    assert calls == [1] and resource.ready
+
+def test_wait_raises_after_a_failed_load():
+    resource = LazyResource('thing', FlakyFactory())
+    with pytest.raises(RuntimeError):
+        resource.get()
+    assert resource.state == 'failed'
+    with pytest.raises(RuntimeError):
+        resource.wait(0)
+
+def test_start_after_failure_makes_wait_wait_for_the_retry():
+    factory = FlakyFactory()
+    resource = LazyResource('thing', factory)
+    with pytest.raises(RuntimeError):
+        resource.get()
+
+    resource.start()
+    assert resource.state == 'loading' and resource.error is None
+    assert resource.wait(0.05) is False  # still loading, no error
+    factory.allow.set()
+    assert resource.wait(5)
+    assert resource.get() == 'model' and factory.calls == 2
+
+def test_start_is_a_no_op_while_loading():
+    factory = FlakyFactory()
+    factory.calls = 1  # skip the failing attempt
+    resource = LazyResource('thing', factory)
+    resource.start()
+    resource.start()
+    factory.allow.set()
+    assert resource.wait(5)
+    assert factory.calls == 2
@@ -1,5 +1,12 @@
 from flask import Flask, render_template, request, Response, jsonify, send_from_directory
-from chat.chat_manager import ChatManager
+from chat.chat_manager import ChatManager, SYSTEM_HEADER
+from chat.llm_scheduler import ScheduledLLM
+from chat.prefix_cache import PrefixCachedLLM
+from chat.registry import ChatManagerRegistry
+from memory.sqlite_store import SQLiteStore
+from memory.async_store import AsyncSQLiteStore
+from memory.compaction import MemoryCompactor
+from models.llm import ChatLLM
 import json
 import traceback
 import asyncio
@@ -7,9 +14,53 @@ import signal
 import sys
 import psutil
 import os
+import threading
 
 app = Flask(__name__)
-chat_managers = {}
+
+# Registry limits (per-user chat managers)
+MAX_ACTIVE_USERS = int(os.getenv("MAX_ACTIVE_USERS", "64"))
+USER_IDLE_TIMEOUT = float(os.getenv("USER_IDLE_TIMEOUT", "1800"))
+
+# Reuse the KV state of the static chat system header across turns
+PREFIX_CACHE = os.getenv("PREFIX_CACHE", "1") != "0"
+
+# Memory compaction schedule (seconds); 0 disables the background job
+COMPACTION_INTERVAL = float(os.getenv("MEMORY_COMPACTION_INTERVAL", "3600"))
+VACUUM_INTERVAL = float(os.getenv("MEMORY_VACUUM_INTERVAL", "86400"))
+
+# One model and one store shared by every user
+shared_llm = None
+shared_llm_lock = threading.Lock()
+shared_store = SQLiteStore()
+# Reads on a thread pool, writes on one writer thread, so the event loop never blocks on SQLite
+shared_async_store = AsyncSQLiteStore(shared_store)
+compactor = MemoryCompactor(
+    shared_store,
+    interval_secs=COMPACTION_INTERVAL,
+    vacuum_interval_secs=VACUUM_INTERVAL
+)
+
+def get_shared_llm() -> ScheduledLLM:
+    """Load the model once, on first use"""
+    global shared_llm
+    if shared_llm is None:
+        with shared_llm_lock:
+            if shared_llm is None:
+                shared_llm = ScheduledLLM(
+                    PrefixCachedLLM(ChatLLM(), prefix=SYSTEM_HEADER, enabled=PREFIX_CACHE)
+                )
+    return shared_llm
+
+def create_chat_manager(user_id: str) -> ChatManager:
+    return ChatManager(user_id, llm=get_shared_llm(), store=shared_store, async_store=shared_async_store)
+
+chat_managers = ChatManagerRegistry(
+    create_chat_manager,
+    max_size=MAX_ACTIVE_USERS,
+    idle_timeout=USER_IDLE_TIMEOUT,
+    on_evict=lambda manager: manager.close()
+)
 
 def cleanup_port(port):
     """Kill any process using the specified port"""
@@ -34,12 +85,19 @@ async def cleanup():
     try:
         # Cleanup chat managers
         for manager in chat_managers.values():
-            if hasattr(manager, 'llm') and manager.llm:
-                if hasattr(manager.llm, 'close'):
-                    if asyncio.iscoroutinefunction(manager.llm.close):
-                        await manager.llm.close()
-                    else:
-                        manager.llm.close()
+            manager.close()
+        chat_managers.shutdown()
+            
+        compactor.stop(timeout=5)
+            
+        # Cleanup the shared model and store
+        if shared_llm is not None and hasattr(shared_llm.llm.llm, 'close'):
+            if asyncio.iscoroutinefunction(shared_llm.llm.llm.close):
+                await shared_llm.llm.llm.close()
+            else:
+                shared_llm.llm.llm.close()
+        await shared_async_store.close()
+        shared_store.close()
     except Exception as e:
         print(f"Error during cleanup: {str(e)}")
         print(traceback.format_exc())
@@ -73,22 +131,20 @@ def handle_message():
 
         async def async_generator():
             try:
-                # Initialize chat manager if needed
-                if user_id not in chat_managers:
-                    chat_managers[user_id] = ChatManager(user_id)
-                
-                # Send start event
-                yield 'data: {"type": "start"}\n\n'
-                
-                # Stream the chat response
-                async for token in chat_managers[user_id].chat(message):
-                    if token:
-                        # Format as SSE event
-                        event_data = json.dumps({
-                            "type": "token",
-                            "token": token
-                        })
-                        yield f'data: {event_data}\n\n'
+                # Get or create this user's chat manager, held until the turn is handed off
+                with chat_managers.checkout(user_id) as manager:
+                    # Send start event
+                    yield 'data: {"type": "start"}\n\n'
+                    
+                    # Stream the chat response
+                    async for token in manager.chat(message):
+                        if token:
+                            # Format as SSE event
+                            event_data = json.dumps({
+                                "type": "token",
+                                "token": token
+                            })
+                            yield f'data: {event_data}\n\n'
                 
                 # Send completion event
                 yield 'data: {"type": "done"}\n\n'
@@ -134,6 +190,20 @@ def handle_message():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/metrics')
+def metrics():
+    """Registry, LLM scheduler, prefix cache, memory extraction and compaction metrics"""
+    return jsonify({
+        'registry': chat_managers.metrics(),
+        'llm_scheduler': shared_llm.metrics() if shared_llm is not None else {},
+        'prefix_cache': shared_llm.llm.metrics() if shared_llm is not None else {},
+        'memory_extraction': {
+            user_id: manager.memory_worker.metrics()
+            for user_id, manager in chat_managers.items()
+        },
+        'memory_compaction': compactor.metrics()
+    })
+
 @app.route('/static/<path:path>')
 def send_static(path):
     return send_from_directory('static', path)
@@ -146,6 +216,9 @@ if __name__ == '__main__':
     port = 5000
     retries = 3
     
+    if COMPACTION_INTERVAL > 0:
+        compactor.start()
+    
     while retries > 0:
         try:
             # Try to clean up the port first
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Compare LIKE-scan and FTS5 latency for SQLiteStore.search_memories
+
+Usage:
+    python benchmarks/fts_search_benchmark.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import json
+import logging
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from memory.sqlite_store import SQLiteStore
+
+NAMES = ["jeff", "rosemary", "tahiri", "chloe", "marcus", "ingrid", "tomas", "priya", "wen", "olga"]
+TOPICS = ["yoga", "coding", "space", "computers", "furniture", "hiking", "chess", "baking",
+          "guitar", "gardening", "astronomy", "python", "rust", "painting", "cycling"]
+VERBS = ["likes", "enjoys", "is learning", "talked about", "wants to try", "dislikes"]
+
+def populate(store: SQLiteStore, user_id: str, count: int, batch_size: int = 10000):
+    """Bulk-load synthetic memories straight into the schema (triggers keep FTS in sync)"""
+    rng = random.Random(count)
+    now = "2026-01-01T00:00:00"
+    with store._connect() as conn:
+        for start in range(0, count, batch_size):
+            rows = []
+            for i in range(start, min(start + batch_size, count)):
+                name = rng.choice(NAMES)
+                info = f"{name.title()} {rng.choice(VERBS)} {rng.choice(TOPICS)} (note {i})"
+                rows.append((
+                    f"mem-{i}", user_id, "semantic", name,
+                    json.dumps({"information": info, "confidence": "High", "source": "Direct"}),
+                    1.0, rng.random(), "direct", now, now
+                ))
+            conn.executemany("""
+                INSERT INTO memories
+                (id, user_id, memory_type, entity_id, content, confidence,
+                importance_score, source, created_at, last_accessed)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+
+def time_queries(store: SQLiteStore, user_id: str, queries, max_results: int):
+    timings = []
+    for terms in queries:
+        start = time.perf_counter()
+        store.search_memories(user_id, entity_ids=terms, max_results=max_results)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+        "mean_ms": round(statistics.mean(timings), 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=50, help="Queries per size and mode")
+    parser.add_argument("--max-results", type=int, default=10)
+    parser.add_argument("--output", help="Optional path to write results as JSON")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    rng = random.Random(0)
+    queries = [[rng.choice(NAMES), rng.choice(TOPICS)] for _ in range(args.queries)]
+    results = []
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SQLiteStore(Path(tmp) / "bench.db")
+            load_start = time.perf_counter()
+            populate(store, "bench-user", size)
+            load_secs = time.perf_counter() - load_start
+
+            store._fts_enabled = False
+            like = time_queries(store, "bench-user", queries, args.max_results)
+            store._fts_enabled = True
+            fts = time_queries(store, "bench-user", queries, args.max_results)
+            store.close()
+
+        row = {"memories": size, "load_s": round(load_secs, 2), "like": like, "fts": fts,
+               "speedup_p50": round(like["p50_ms"] / max(fts["p50_ms"], 1e-6), 1)}
+        results.append(row)
+        print(f"{size:>9,} memories | LIKE p50 {like['p50_ms']:>9.2f} ms p95 {like['p95_ms']:>9.2f} ms"
+              f" | FTS5 p50 {fts['p50_ms']:>8.2f} ms p95 {fts['p95_ms']:>8.2f} ms"
+              f" | {row['speedup_p50']}x")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""Latency and throughput benchmark for the memory stack (no model file needed)
+
+Generates synthetic users, entities, relationships, memories and memory
+associations, then drives MemoryManager and SQLiteStore with a stub LLM and
+reports p50/p95/p99 latency and throughput per operation.
+
+Usage:
+    python benchmarks/memory_benchmark.py --users 4 --memories 20000 --output run.json
+    python benchmarks/memory_benchmark.py --output new.json --compare run.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import random
+import re
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from memory.memory_manager import MemoryManager
+from memory.sqlite_store import SQLiteStore
+
+NAMES = ["jeff", "rosemary", "tahiri", "chloe", "marcus", "ingrid", "tomas", "priya", "wen", "olga",
+         "noah", "amara", "felix", "yuki", "diego", "lena", "omar", "sana", "ivan", "maya"]
+TOPICS = ["yoga", "coding", "space", "computers", "furniture", "hiking", "chess", "baking",
+          "guitar", "gardening", "astronomy", "python", "rust", "painting", "cycling"]
+VERBS = ["likes", "enjoys", "is learning", "talked about", "wants to try", "dislikes"]
+RELATIONS = ["friend", "sibling", "coworker", "partner", "neighbor"]
+MEMORY_TYPES = ["semantic", "episodic", "procedural"]
+
+class StubLLM:
+    """Stands in for ChatLLM: answers entity extraction with the known names in the prompt"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self._names = re.compile(r"\b(" + "|".join(NAMES + TOPICS) + r")\b", re.IGNORECASE)
+
+    def invoke(self, messages: List[Dict]) -> str:
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        text = messages[-1]["content"].rsplit("Text:", 1)[-1].split("<|im_end|>", 1)[0]
+        return ", ".join(sorted({m.lower() for m in self._names.findall(text)}))
+
+    async def stream_chat(self, messages: List[Dict]):
+        for token in self.invoke(messages).split(" "):
+            yield token + " "
+
+def entity_id(user_id: str, name: str) -> str:
+    return f"{user_id}:{name}"
+
+def populate(store: SQLiteStore, user_id: str, args, rng: random.Random) -> List[str]:
+    """Bulk-load one user's synthetic graph; returns the memory ids"""
+    base = datetime(2026, 1, 1)
+    names = rng.sample(NAMES, min(args.entities, len(NAMES)))
+
+    with store._connect() as conn:
+        conn.executemany("""
+            INSERT INTO entities (id, user_id, name, type, attributes, first_seen, last_seen)
+            VALUES (?, ?, ?, 'person', ?, ?, ?)
+        """, [
+            (entity_id(user_id, name), user_id, name, json.dumps({"interest": rng.choice(TOPICS)}),
+             base.isoformat(), base.isoformat())
+            for name in names
+        ])
+        conn.executemany("""
+            INSERT OR IGNORE INTO entity_relationships (entity_id, related_entity_id, relationship_type)
+            VALUES (?, ?, ?)
+        """, [
+            (entity_id(user_id, name), entity_id(user_id, rng.choice(names)), rng.choice(RELATIONS))
+            for name in names for _ in range(args.relationships)
+        ])
+
+    memory_ids = []
+    for start in range(0, args.memories, args.load_batch):
+        entries = []
+        for i in range(start, min(start + args.load_batch, args.memories)):
+            name = rng.choice(names)
+            ts = (base + timedelta(minutes=i)).isoformat()
+            memory_id = f"{user_id}-mem-{i}"
+            entries.append({
+                "id": memory_id,
+                "memory_type": rng.choice(MEMORY_TYPES),
+                "entity_id": name,
+                "content": {"information": f"{name.title()} {rng.choice(VERBS)} {rng.choice(TOPICS)}",
+                            "confidence": "High", "source": "Direct"},
+                "confidence": 1.0,
+                "importance_score": round(rng.random(), 3),
+                "source": "direct",
+                "created_at": ts,
+                "last_accessed": ts,
+                "access_count": rng.randint(0, 20),
+                "associations": rng.sample(memory_ids, min(len(memory_ids), args.associations))
+            })
+        memory_ids.extend(store.add_memories(user_id, entries))
+    return memory_ids
+
+def measure(name: str, ops: int, fn: Callable[[int], None]) -> Dict:
+    timings = []
+    started = time.perf_counter()
+    for i in range(ops):
+        op_start = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - op_start) * 1000)
+    wall = time.perf_counter() - started
+
+    cuts = statistics.quantiles(timings, n=100, method="inclusive") if len(timings) > 1 else timings * 99
+    return {
+        "op": name,
+        "count": ops,
+        "p50_ms": round(cuts[49], 3),
+        "p95_ms": round(cuts[94], 3),
+        "p99_ms": round(cuts[98], 3),
+        "mean_ms": round(statistics.mean(timings), 3),
+        "max_ms": round(max(timings), 3),
+        "ops_per_sec": round(ops / wall, 1) if wall else 0.0
+    }
+
+def run(args) -> Dict:
+    rng = random.Random(args.seed)
+    llm = StubLLM(latency_ms=args.llm_latency_ms)
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStore(Path(tmp) / "bench.db")
+        users = [f"bench-user-{u}" for u in range(args.users)]
+
+        load_start = time.perf_counter()
+        memory_ids = {user_id: populate(store, user_id, args, rng) for user_id in users}
+        load_secs = time.perf_counter() - load_start
+        total = sum(len(ids) for ids in memory_ids.values())
+
+        managers = {user_id: MemoryManager(user_id, llm=llm, store=store) for user_id in users}
+        pick_user = lambda i: users[i % len(users)]
+        sentence = lambda: f"Did {rng.choice(NAMES).title()} say anything about {rng.choice(TOPICS)}?"
+
+        results.append(measure("manager.get_relevant_memories", args.ops, lambda i: (
+            managers[pick_user(i)].get_relevant_memories(sentence(), k=args.k)
+        )))
+        results.append(measure("store.search_memories", args.ops, lambda i: (
+            store.search_memories(pick_user(i), entity_ids=[rng.choice(NAMES), rng.choice(TOPICS)],
+                                  max_results=args.k)
+        )))
+        results.append(measure("manager.add_memory", args.ops, lambda i: (
+            managers[pick_user(i)].add_memory({"memory_items": [{
+                "type": "semantic",
+                "entity": rng.choice(NAMES),
+                "information": f"{rng.choice(NAMES).title()} {rng.choice(VERBS)} {rng.choice(TOPICS)}",
+                "confidence": "High",
+                "source": "Direct"
+            }]})
+        )))
+        results.append(measure("store.update_memory", args.ops, lambda i: (
+            store.update_memory(pick_user(i), rng.choice(memory_ids[pick_user(i)]),
+                                {"importance_score": round(rng.random(), 3)})
+        )))
+        results.append(measure("store.get_entity", args.ops, lambda i: (
+            store.get_entity(pick_user(i), entity_id(pick_user(i), rng.choice(NAMES)))
+        )))
+        results.append(measure("store.load_all_entities", max(1, args.ops // 10), lambda i: (
+            store.load_all_entities(pick_user(i))
+        )))
+        store.close()
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform()
+        },
+        "params": vars(args),
+        "load": {
+            "memories": total,
+            "seconds": round(load_secs, 3),
+            "memories_per_sec": round(total / load_secs, 1) if load_secs else 0.0
+        },
+        "llm_calls": llm.calls,
+        "results": results
+    }
+
+def compare(current: Dict, baseline_path: str):
+    """Print per-operation change against a previous run"""
+    baseline = {r["op"]: r for r in json.loads(Path(baseline_path).read_text())["results"]}
+    print(f"\nvs {baseline_path}:")
+    for row in current["results"]:
+        old = baseline.get(row["op"])
+        if not old:
+            continue
+        deltas = [
+            f"{key} {(row[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else f"{key} n/a"
+            for key in ("p50_ms", "p95_ms", "p99_ms")
+        ]
+        print(f"  {row['op']:<32} " + "  ".join(deltas))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--memories", type=int, default=5000, help="Memories per user")
+    parser.add_argument("--entities", type=int, default=10, help=f"Entities per user (max {len(NAMES)})")
+    parser.add_argument("--relationships", type=int, default=3, help="Relationships per entity")
+    parser.add_argument("--associations", type=int, default=2, help="Associations per memory")
+    parser.add_argument("--load-batch", type=int, default=1000)
+    parser.add_argument("--ops", type=int, default=500, help="Timed calls per operation")
+    parser.add_argument("--k", type=int, default=5, help="Results per retrieval")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated stub LLM latency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--compare", help="Previous --output file to diff against")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    report = run(args)
+
+    load = report["load"]
+    print(f"Loaded {load['memories']:,} memories in {load['seconds']}s ({load['memories_per_sec']:,.0f}/s)")
+    print(f"{'operation':<32} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10}")
+    for row in report["results"]:
+        print(f"{row['op']:<32} {row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f} {row['p99_ms']:>9.3f}"
+              f" {row['ops_per_sec']:>10.1f}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.compare:
+        compare(report, args.compare)
+
+if __name__ == "__main__":
+    main()
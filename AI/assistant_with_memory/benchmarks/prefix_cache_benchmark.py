@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Time-to-first-token with and without system-header KV state reuse
+
+Runs the same chat prompts (static system header + varying memories and
+user turn) through PrefixCachedLLM with the prefix cache disabled, then
+enabled. By default an unrelated prompt runs between turns, as memory
+extraction does in the app, so the header is not simply still resident.
+
+Usage:
+    python benchmarks/prefix_cache_benchmark.py --model models/your-model.gguf --turns 10
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from llama_cpp import Llama
+from chat.chat_manager import SYSTEM_HEADER
+from chat.prefix_cache import PrefixCachedLLM
+
+FACTS = ["likes hiking", "is learning rust", "has a cat named Tahiri", "works night shifts",
+         "prefers short answers", "is planning a trip to Norway", "plays chess on weekends"]
+QUESTIONS = ["What should I do this weekend?", "Can you suggest a book?",
+             "Help me plan my week.", "What did I tell you about my pet?"]
+EXTRACTION_PROMPT = ("<|im_start|>system\nExtract facts about the user as JSON.<|im_end|>\n"
+                     "<|im_start|>user\nI just got back from a long walk.<|im_end|>\n<|im_start|>assistant")
+
+def chat_messages(rng: random.Random):
+    memories = "\n".join(f"- **semantic**: User {fact}" for fact in rng.sample(FACTS, 4))
+    system = SYSTEM_HEADER + memories + "\n<|im_end|>"
+    user = f"<|im_start|>user\n{rng.choice(QUESTIONS)}<|im_end|>\n<|im_start|>assistant"
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+class RawChatLLM:
+    """Stand-in for models.llm.ChatLLM: ChatML messages joined into one completion prompt"""
+
+    def __init__(self, model: Llama, max_tokens: int):
+        self.model = model
+        self.max_tokens = max_tokens
+
+    def _chunks(self, messages):
+        prompt = "\n".join(message["content"] for message in messages)
+        for chunk in self.model.create_completion(prompt, max_tokens=self.max_tokens, temperature=0.0,
+                                                  stop=["<|im_end|>"], stream=True):
+            yield chunk["choices"][0]["text"]
+
+    def invoke(self, messages):
+        return "".join(self._chunks(messages))
+
+    async def stream_chat(self, messages):
+        for token in self._chunks(messages):
+            yield token
+
+async def first_token(llm: PrefixCachedLLM, messages):
+    async for _ in llm.stream_chat(messages):
+        break
+
+def time_to_first_token(llm: PrefixCachedLLM, messages) -> float:
+    started = time.perf_counter()
+    asyncio.run(first_token(llm, messages))
+    return (time.perf_counter() - started) * 1000
+
+def run_mode(llm: PrefixCachedLLM, enabled: bool, turns: int, interleave: bool, seed: int):
+    llm.enabled = enabled
+    rng = random.Random(seed)
+    timings = []
+    for _ in range(turns):
+        if interleave:
+            llm.invoke([{"role": "user", "content": EXTRACTION_PROMPT}])
+        timings.append(time_to_first_token(llm, chat_messages(rng)))
+    return {
+        "prefix_cache": enabled,
+        "p50_ms": round(statistics.median(timings), 1),
+        "mean_ms": round(statistics.mean(timings), 1),
+        "min_ms": round(min(timings), 1),
+        "max_ms": round(max(timings), 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", required=True, help="Path to a GGUF model")
+    parser.add_argument("--n-ctx", type=int, default=4096)
+    parser.add_argument("--n-gpu-layers", type=int, default=0)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--no-interleave", action="store_true",
+                        help="Don't run an unrelated prompt between turns")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    model = Llama(model_path=args.model, n_ctx=args.n_ctx, n_gpu_layers=args.n_gpu_layers, verbose=False)
+    llm = PrefixCachedLLM(RawChatLLM(model, max_tokens=16), prefix=SYSTEM_HEADER)
+
+    interleave = not args.no_interleave
+    before = run_mode(llm, False, args.turns, interleave, args.seed)
+    after = run_mode(llm, True, args.turns, interleave, args.seed)
+    report = {
+        "model": Path(args.model).name,
+        "turns": args.turns,
+        "interleaved": interleave,
+        "before": before,
+        "after": after,
+        "speedup_p50": round(before["p50_ms"] / max(after["p50_ms"], 1e-6), 2),
+        "cache": llm.metrics()
+    }
+
+    print(f"TTFT without prefix cache: p50 {before['p50_ms']} ms (mean {before['mean_ms']} ms)")
+    print(f"TTFT with prefix cache:    p50 {after['p50_ms']} ms (mean {after['mean_ms']} ms)")
+    print(f"Speedup: {report['speedup_p50']}x over {report['cache']['prefix_tokens']} prefix tokens")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
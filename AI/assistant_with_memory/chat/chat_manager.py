@@ -1,18 +1,49 @@
 from typing import AsyncIterator, Iterator, List, Dict
 from models.llm import ChatLLM
 from memory.memory_manager import MemoryManager
-import json
+from chat.memory_worker import MemoryExtractionWorker
 import logging
 import traceback
 import asyncio
 
+# Identical on every turn so its KV state can be reused (see PrefixCachedLLM);
+# anything per-request must come after it
+SYSTEM_HEADER = """<|im_start|>system
+You are a helpful AI assistant with access to conversation memory.
+Format your responses using markdown for better readability:
+
+- Use **bold** for emphasis and important points
+- Use *italics* for names and terms
+- Use `code blocks` for technical terms
+- Use bullet points and numbered lists for organization
+- Use ### for section headers
+- Use > for quotes or highlighting key information
+- Use --- for separating sections
+- Use color formatting like this: <span style='color: blue'>text</span>
+- Use tables for structured information
+- Use proper spacing and line breaks for readability
+
+Previous context:
+"""
+
 class ChatManager:
-    def __init__(self, user_id: str):
-        self.llm = ChatLLM()
-        self.memory = MemoryManager(user_id, self.llm)
+    def __init__(self, user_id: str, llm=None, store=None, async_store=None):
+        # The app passes one shared, scheduled LLM and store for every user
+        self.llm = llm or ChatLLM()
+        # Access bookkeeping is flushed in the background so it never delays a reply
+        self.memory = MemoryManager(
+            user_id, self.llm, defer_access_updates=True, store=store, async_store=async_store
+        )
+        # Memory extraction runs after the reply has been streamed
+        self.memory_worker = MemoryExtractionWorker(self.llm, self.memory)
         logging.basicConfig(level=logging.DEBUG)
         self.logger = logging.getLogger(__name__)
         
+    def close(self):
+        """Finish background memory work before this manager is dropped"""
+        self.memory_worker.stop(timeout=30)
+        self.memory.store.flush_touches()
+        
     def _create_memory_prompt(self, message: str, response: str) -> str:
         """Creates a prompt for the LLM to analyze conversation for memory storage"""
         system_prompt = """<|im_start|>system
@@ -54,23 +85,7 @@ Assistant: {response}
             info = memory['content'].get('information', '')
             context.append(f"- **{memory_type}**: {info}")
 
-        prompt = f"""<|im_start|>system
-You are a helpful AI assistant with access to conversation memory.
-Format your responses using markdown for better readability:
-
-- Use **bold** for emphasis and important points
-- Use *italics* for names and terms
-- Use `code blocks` for technical terms
-- Use bullet points and numbered lists for organization
-- Use ### for section headers
-- Use > for quotes or highlighting key information
-- Use --- for separating sections
-- Use color formatting like this: <span style='color: blue'>text</span>
-- Use tables for structured information
-- Use proper spacing and line breaks for readability
-
-Previous context:
-{chr(10).join(context)}
+        prompt = SYSTEM_HEADER + f"""{chr(10).join(context)}
 <|im_end|>
 <|im_start|>user
 Respond naturally using the context provided. Use rich markdown formatting for an engaging response.
@@ -84,11 +99,11 @@ Respond naturally using the context provided. Use rich markdown formatting for a
         try:
             self.logger.debug("="*50)
             self.logger.debug("Starting chat interaction")
-            self.logger.debug(f"Raw message: {message}")
+            self.logger.debug("Raw message: %s", message)
             
             # Get relevant memories
-            memories = self.memory.get_relevant_memories(message)
-            self.logger.debug(f"Retrieved {len(memories)} relevant memories")
+            memories = await self.memory.aget_relevant_memories(message)
+            self.logger.debug("Retrieved %s relevant memories", len(memories))
             
             # Create conversation context
             context_prompt = self._get_context_prompt(memories)
@@ -124,43 +139,11 @@ Respond naturally using the context provided. Use rich markdown formatting for a
             if buffer:
                 yield buffer
                 
-            # Process memory after response
-            memory_prompt = f"""<|im_start|>system
-Extract facts about the user from this conversation. Return in JSON format:
-{{
-    "memory_items": [
-        {{
-            "type": "semantic",
-            "entity": "user",
-            "information": "specific fact about user",
-            "confidence": "High",
-            "source": "Direct"
-        }}
-    ]
-}}
-<|im_end|>
-<|im_start|>user
-Previous memories:
-{chr(10).join(m['content'].get('information', '') for m in memories)}
-
-Current conversation:
-User: {message}
-Assistant: {response}
-<|im_end|>
-<|im_start|>assistant"""
-
-            # Process memory
-            memory_response = ""
-            async for token in self.llm.stream_chat([{"role": "user", "content": memory_prompt}]):
-                memory_response += token
-                
-            try:
-                memory_data = json.loads(memory_response)
-                self.logger.debug(f"Parsed memory data: {json.dumps(memory_data, indent=2)}")
-                self.memory.add_memory(memory_data)
-            except json.JSONDecodeError as e:
-                self.logger.error(f"JSON parse error: {str(e)}")
-                self.logger.error(f"Failed response: {memory_response}")
+            # Hand memory extraction to the background worker
+            if not self.memory_worker.submit(message, response, memories):
+                self.logger.warning("Memory extraction skipped for this turn (queue full or worker stopped)")
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Memory worker metrics: %s", self.memory_worker.metrics())
 
         except Exception as e:
             self.logger.error(f"Error in chat: {str(e)}")
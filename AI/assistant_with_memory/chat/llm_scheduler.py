@@ -0,0 +1,88 @@
+from collections import deque
+from typing import AsyncIterator, Dict, List
+import asyncio
+import logging
+import threading
+import time
+
+class ScheduledLLM:
+    """Shares one ChatLLM between every user through a FIFO request scheduler
+
+    Requests are admitted in arrival order, at most max_concurrent at a time
+    (one by default, since a single llama.cpp context cannot interleave
+    generations). Exposes the same invoke/stream_chat surface as ChatLLM, so
+    chat and memory managers can use it unchanged.
+    """
+
+    def __init__(self, llm, max_concurrent: int = 1):
+        self.llm = llm
+        self.max_concurrent = max_concurrent
+        self.logger = logging.getLogger(__name__)
+
+        self._cond = threading.Condition()
+        self._waiting = deque()
+        self._next_ticket = 0
+        self._active = 0
+        self._stats = {"completed": 0, "total_wait_secs": 0.0, "max_wait_secs": 0.0}
+
+    def __getattr__(self, name):
+        # Anything not scheduled (close, model metadata, ...) goes straight through
+        return getattr(self.llm, name)
+
+    def _acquire(self) -> float:
+        """Block until this request reaches the front of the queue; returns the wait"""
+        enqueued = time.monotonic()
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._waiting.append(ticket)
+            while self._waiting[0] != ticket or self._active >= self.max_concurrent:
+                self._cond.wait()
+            self._waiting.popleft()
+            self._active += 1
+            # Let the next request in line re-check capacity
+            self._cond.notify_all()
+
+        waited = time.monotonic() - enqueued
+        with self._cond:
+            self._stats["total_wait_secs"] += waited
+            self._stats["max_wait_secs"] = max(self._stats["max_wait_secs"], waited)
+        return waited
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._stats["completed"] += 1
+            self._cond.notify_all()
+
+    def invoke(self, messages: List[Dict]):
+        waited = self._acquire()
+        if waited > 0.5:
+            self.logger.debug("LLM request waited %.2fs in queue", waited)
+        try:
+            return self.llm.invoke(messages)
+        finally:
+            self._release()
+
+    async def stream_chat(self, messages: List[Dict]) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        waited = await loop.run_in_executor(None, self._acquire)
+        if waited > 0.5:
+            self.logger.debug("LLM stream waited %.2fs in queue", waited)
+        try:
+            async for token in self.llm.stream_chat(messages):
+                yield token
+        finally:
+            self._release()
+
+    def metrics(self) -> Dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queued"] = len(self._waiting)
+            stats["active"] = self._active
+        stats["avg_wait_secs"] = (
+            round(stats["total_wait_secs"] / stats["completed"], 3) if stats["completed"] else 0.0
+        )
+        stats["total_wait_secs"] = round(stats["total_wait_secs"], 3)
+        stats["max_wait_secs"] = round(stats["max_wait_secs"], 3)
+        return stats
@@ -0,0 +1,192 @@
+from typing import Dict, List, Optional
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+import traceback
+from memory.logging_utils import LazyJSON
+
+class MemoryExtractionWorker:
+    """Runs post-response memory extraction on a background thread
+
+    Finished chat turns are submitted to a bounded queue. The worker drains
+    up to max_batch queued turns at a time and extracts memories from all of
+    them with a single LLM prompt, so a burst of messages costs one
+    extraction pass instead of one per turn.
+    """
+
+    def __init__(self, llm, memory, max_queue: int = 32, max_batch: int = 4):
+        self.llm = llm
+        self.memory = memory
+        self.max_batch = max_batch
+        self.logger = logging.getLogger(__name__)
+
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue(maxsize=max_queue)
+        self._stopping = threading.Event()
+        self._submit_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "dropped": 0,
+            "rejected": 0,
+            "batches": 0,
+            "processed_turns": 0,
+            "failed_batches": 0,
+            "last_lag_secs": 0.0,
+            "max_lag_secs": 0.0,
+            "last_extraction_secs": 0.0
+        }
+        self._thread = threading.Thread(target=self._run, name="memory-extraction", daemon=True)
+        self._thread.start()
+
+    def submit(self, message: str, response: str, memories: List[Dict]) -> bool:
+        """Queue a finished turn without blocking; returns False if the queue is full or the worker is stopped
+
+        Called from the chat stream, so a backed-up worker drops the turn
+        (counted in metrics()["dropped"]) rather than delaying the reply.
+        """
+        turn = {
+            "message": message,
+            "response": response,
+            "memories": [m['content'].get('information', '') for m in memories],
+            "enqueued_at": time.monotonic()
+        }
+        # Held across the put so stop() can't slip in between the check and the put
+        with self._submit_lock:
+            if self._stopping.is_set():
+                with self._stats_lock:
+                    self._stats["rejected"] += 1
+                self.logger.warning("Memory extraction worker stopped, rejecting turn")
+                return False
+            try:
+                self._queue.put_nowait(turn)
+            except queue.Full:
+                with self._stats_lock:
+                    self._stats["dropped"] += 1
+                self.logger.warning("Memory extraction queue full, dropping turn")
+                return False
+
+        with self._stats_lock:
+            self._stats["submitted"] += 1
+        return True
+
+    def metrics(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["max_queue"] = self._queue.maxsize
+        stats["avg_batch_size"] = (
+            round(stats["processed_turns"] / stats["batches"], 2) if stats["batches"] else 0.0
+        )
+        return stats
+
+    def stop(self, timeout: Optional[float] = None):
+        """Finish queued work and stop the worker thread; later submits are rejected"""
+        with self._submit_lock:
+            self._stopping.set()
+        try:
+            # Wake an idle worker now; a busy one sees _stopping once the queue is drained
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                turn = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+            if turn is None:
+                return
+
+            # Coalesce whatever else is already waiting
+            batch = [turn]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    extra = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if extra is None:
+                    stop = True
+                    break
+                batch.append(extra)
+
+            self._process(batch)
+            if stop:
+                return
+
+    def _process(self, batch: List[Dict]):
+        started = time.monotonic()
+        lag = started - batch[0]["enqueued_at"]
+        try:
+            prompt = self._create_extraction_prompt(batch)
+            memory_response = asyncio.run(self._collect(prompt))
+
+            try:
+                memory_data = json.loads(memory_response)
+                self.logger.debug("Parsed memory data: %s", LazyJSON(memory_data))
+                self.memory.add_memory(memory_data)
+            except json.JSONDecodeError as e:
+                self.logger.error(f"JSON parse error: {str(e)}")
+                self.logger.error(f"Failed response: {memory_response}")
+                with self._stats_lock:
+                    self._stats["failed_batches"] += 1
+
+        except Exception as e:
+            self.logger.error(f"Error extracting memories: {str(e)}")
+            self.logger.error(f"Traceback: {traceback.format_exc()}")
+            with self._stats_lock:
+                self._stats["failed_batches"] += 1
+        finally:
+            with self._stats_lock:
+                self._stats["batches"] += 1
+                self._stats["processed_turns"] += len(batch)
+                self._stats["last_lag_secs"] = round(lag, 3)
+                self._stats["max_lag_secs"] = round(max(self._stats["max_lag_secs"], lag), 3)
+                self._stats["last_extraction_secs"] = round(time.monotonic() - started, 3)
+            self.logger.debug(
+                f"Memory extraction batch of {len(batch)} done, lag {lag:.2f}s, "
+                f"queue depth {self._queue.qsize()}"
+            )
+
+    async def _collect(self, prompt: str) -> str:
+        response = ""
+        async for token in self.llm.stream_chat([{"role": "user", "content": prompt}]):
+            response += token
+        return response
+
+    @staticmethod
+    def _create_extraction_prompt(batch: List[Dict]) -> str:
+        """Build one extraction prompt covering every turn in the batch"""
+        previous = list(dict.fromkeys(info for turn in batch for info in turn["memories"] if info))
+        conversation = "\n".join(
+            f"User: {turn['message']}\nAssistant: {turn['response']}" for turn in batch
+        )
+        return f"""<|im_start|>system
+Extract facts about the user from this conversation. Return in JSON format:
+{{
+    "memory_items": [
+        {{
+            "type": "semantic",
+            "entity": "user",
+            "information": "specific fact about user",
+            "confidence": "High",
+            "source": "Direct"
+        }}
+    ]
+}}
+<|im_end|>
+<|im_start|>user
+Previous memories:
+{chr(10).join(previous)}
+
+Current conversation:
+{conversation}
+<|im_end|>
+<|im_start|>assistant"""
@@ -0,0 +1,135 @@
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import logging
+import threading
+import time
+
+class PrefixCachedLLM:
+    """Keeps the llama.cpp KV state of a fixed prompt prefix ready for each request
+
+    The chat system header is identical on every turn, so its KV state is
+    evaluated once, saved with Llama.save_state() and restored with
+    load_state() before a request whose prompt starts with it. Generation
+    itself is left to the wrapped ChatLLM with its own prompt format and
+    sampling settings; Llama.generate() then reuses the primed prefix
+    through its own longest-prefix match and only evaluates the memories
+    and the user turn. Restoring matters because other prompts (memory
+    extraction, other users) overwrite the context between chat turns.
+
+    Wraps a ChatLLM-style object exposing invoke/stream_chat. Priming needs
+    the underlying llama_cpp.Llama, passed as model= or found on the wrapped
+    LLM; without one, or with enabled=False, calls pass straight through.
+    Nothing else may use the model between priming and generation, which
+    ScheduledLLM (max_concurrent=1) guarantees.
+    """
+
+    MODEL_ATTRS = ("model", "llm", "llama", "_model")
+
+    def __init__(self, llm, prefix: str = "", model=None, enabled: bool = True):
+        self.llm = llm
+        self.prefix = prefix
+        self.enabled = enabled
+        self.logger = logging.getLogger(__name__)
+
+        self.model = model or self._find_model(llm)
+        if self.model is None:
+            self.logger.warning("No llama.cpp model found on the LLM; prefix caching disabled")
+
+        self._prefix_tokens: Optional[List[int]] = None
+        self._prefix_state = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "prefix_resident": 0,   # context still held the prefix
+            "prefix_restored": 0,   # prefix state loaded from the saved copy
+            "prefix_evaluated": 0,  # prefix evaluated from scratch (first use)
+            "prefix_mismatch": 0,   # prompt did not start with the prefix
+            "restore_secs": 0.0
+        }
+        self._ttft = {"cached": [], "uncached": []}
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    @classmethod
+    def _find_model(cls, llm):
+        for attr in cls.MODEL_ATTRS:
+            candidate = getattr(llm, attr, None) if llm is not None else None
+            if candidate is not None and hasattr(candidate, "save_state") and hasattr(candidate, "load_state"):
+                return candidate
+        return None
+
+    @property
+    def active(self) -> bool:
+        return self.enabled and self.model is not None and bool(self.prefix)
+
+    def _prime(self, messages: List[Dict]) -> bool:
+        """Make the model context hold the prefix KV; returns True if the prompt starts with it"""
+        with self._lock:
+            self._stats["requests"] += 1
+            if not messages or not messages[0]["content"].startswith(self.prefix):
+                self._stats["prefix_mismatch"] += 1
+                return False
+
+            if self._prefix_tokens is None:
+                self._prefix_tokens = self.model.tokenize(self.prefix.encode("utf-8"), add_bos=True, special=True)
+            n = len(self._prefix_tokens)
+
+            if self.model.n_tokens >= n and list(self.model.input_ids[:n]) == self._prefix_tokens:
+                # generate() will reuse it through its own prefix match
+                self._stats["prefix_resident"] += 1
+            elif self._prefix_state is not None:
+                started = time.perf_counter()
+                self.model.load_state(self._prefix_state)
+                self._stats["restore_secs"] += time.perf_counter() - started
+                self._stats["prefix_restored"] += 1
+            else:
+                self.model.reset()
+                self.model.eval(self._prefix_tokens)
+                self._prefix_state = self.model.save_state()
+                self._stats["prefix_evaluated"] += 1
+                self.logger.debug("Saved KV state for %s-token prompt prefix", n)
+            return True
+
+    def _record_ttft(self, cached: bool, seconds: float):
+        with self._stats_lock:
+            samples = self._ttft["cached" if cached else "uncached"]
+            samples.append(seconds)
+            if len(samples) > 1000:
+                del samples[:len(samples) - 1000]
+
+    def invoke(self, messages: List[Dict]):
+        if self.active:
+            self._prime(messages)
+        return self.llm.invoke(messages)
+
+    async def stream_chat(self, messages: List[Dict]) -> AsyncIterator[str]:
+        if not self.active:
+            async for token in self.llm.stream_chat(messages):
+                yield token
+            return
+
+        started = time.perf_counter()
+        # Restoring or evaluating the prefix blocks, so do it on a worker thread
+        cached = await asyncio.get_running_loop().run_in_executor(None, self._prime, messages)
+        first = True
+        async for token in self.llm.stream_chat(messages):
+            if first:
+                self._record_ttft(cached, time.perf_counter() - started)
+                first = False
+            yield token
+
+    def metrics(self) -> Dict:
+        with self._stats_lock:
+            ttft = {key: list(values) for key, values in self._ttft.items()}
+        with self._lock:
+            stats = dict(self._stats)
+        stats["enabled"] = self.active
+        stats["prefix_tokens"] = len(self._prefix_tokens or [])
+        stats["restore_secs"] = round(stats["restore_secs"], 3)
+        for key, values in ttft.items():
+            values.sort()
+            stats[f"ttft_{key}_count"] = len(values)
+            stats[f"ttft_{key}_p50_ms"] = round(values[len(values) // 2] * 1000, 1) if values else None
+        return stats
@@ -0,0 +1,168 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+import logging
+import threading
+import time
+import traceback
+
+class ChatManagerRegistry:
+    """Bounded, thread-safe LRU of per-user chat managers
+
+    Managers are created on first use by factory(user_id) and evicted when
+    the registry exceeds max_size (least recently used first) or when they
+    have been idle longer than idle_timeout seconds. Managers checked out
+    by a request in flight are never evicted; the registry grows past
+    max_size instead until they are returned. on_evict is called with every
+    evicted manager on a background closer thread, so releasing one user's
+    resources never stalls another user's request.
+    """
+
+    def __init__(self, factory: Callable[[str], object], max_size: int = 64,
+                 idle_timeout: Optional[float] = 1800,
+                 on_evict: Optional[Callable[[object], None]] = None):
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.on_evict = on_evict
+        self.logger = logging.getLogger(__name__)
+
+        # user_id -> [manager, last_used, requests_in_flight]
+        self._entries: "OrderedDict[str, List]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._creation_locks: Dict[str, threading.Lock] = {}
+        self._closer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="manager-closer")
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "idle_evictions": 0}
+
+    @contextmanager
+    def checkout(self, user_id: str):
+        """Use the user's manager for one request; it can't be evicted meanwhile"""
+        manager = self.get(user_id, pin=True)
+        try:
+            yield manager
+        finally:
+            with self._lock:
+                entry = self._entries.get(user_id)
+                if entry is not None and entry[0] is manager:
+                    entry[1] = time.monotonic()
+                    entry[2] -= 1
+
+    def _touch(self, user_id: str, entry: List, pin: bool):
+        """Mark an entry used; caller must hold the lock"""
+        entry[1] = time.monotonic()
+        if pin:
+            entry[2] += 1
+        self._entries.move_to_end(user_id)
+        self._stats["hits"] += 1
+
+    def get(self, user_id: str, pin: bool = False):
+        """Return the user's manager, creating it if needed
+
+        With pin=True the caller must give it back through checkout()'s exit.
+        """
+        evicted = []
+        with self._lock:
+            evicted.extend(self._evict_idle())
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._touch(user_id, entry, pin)
+                manager = entry[0]
+            else:
+                manager = None
+                creation_lock = self._creation_locks.setdefault(user_id, threading.Lock())
+        self._release(evicted)
+        if manager is not None:
+            return manager
+        evicted = []
+
+        # Build outside the registry lock so other users aren't blocked, but
+        # only once per user even if several requests race here
+        with creation_lock:
+            with self._lock:
+                entry = self._entries.get(user_id)
+                if entry is not None:
+                    self._touch(user_id, entry, pin)
+                    return entry[0]
+
+            manager = self.factory(user_id)
+
+            with self._lock:
+                self._stats["misses"] += 1
+                self._entries[user_id] = [manager, time.monotonic(), 1 if pin else 0]
+                self._creation_locks.pop(user_id, None)
+                evicted.extend(self._evict_lru())
+        self._release(evicted)
+        return manager
+
+    def _evict_lru(self) -> List:
+        """Pop least recently used idle managers down to max_size; caller must hold the lock"""
+        evicted = []
+        overflow = len(self._entries) - self.max_size
+        for user_id, (manager, _, in_flight) in list(self._entries.items()):
+            if overflow <= 0:
+                break
+            if in_flight:
+                continue
+            del self._entries[user_id]
+            self._stats["evictions"] += 1
+            evicted.append(manager)
+            overflow -= 1
+        if overflow > 0:
+            self.logger.warning(f"Registry over max_size by {overflow}: managers still in use")
+        return evicted
+
+    def _evict_idle(self) -> List:
+        """Pop managers idle past the timeout; caller must hold the lock"""
+        if not self.idle_timeout:
+            return []
+        cutoff = time.monotonic() - self.idle_timeout
+        evicted = []
+        # Entries are kept in last-used order, so idle ones are at the front
+        for user_id, (manager, last_used, in_flight) in list(self._entries.items()):
+            if last_used >= cutoff:
+                break
+            if in_flight:
+                continue
+            del self._entries[user_id]
+            self._stats["idle_evictions"] += 1
+            evicted.append(manager)
+        return evicted
+
+    def _release(self, managers: List):
+        if not self.on_evict:
+            return
+        for manager in managers:
+            self._closer.submit(self._close_evicted, manager)
+
+    def _close_evicted(self, manager):
+        try:
+            self.on_evict(manager)
+        except Exception as e:
+            self.logger.error(f"Error releasing evicted manager: {str(e)}")
+            self.logger.error(traceback.format_exc())
+
+    def shutdown(self):
+        """Wait for evicted managers that are still being closed"""
+        self._closer.shutdown(wait=True)
+
+    def values(self) -> List:
+        with self._lock:
+            return [entry[0] for entry in self._entries.values()]
+
+    def items(self) -> List:
+        with self._lock:
+            return [(user_id, entry[0]) for user_id, entry in self._entries.items()]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        stats["max_size"] = self.max_size
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
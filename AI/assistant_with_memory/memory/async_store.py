@@ -0,0 +1,80 @@
+# memory/async_store.py
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import asyncio
+import functools
+import logging
+from .sqlite_store import SQLiteStore
+
+# SQLiteStore methods that only read; everything else is treated as a write
+READ_METHODS = frozenset({
+    "search_memories",
+    "search_memories_by_vector",
+    "load_all_memories",
+    "load_all_entities",
+    "get_entity",
+    "get_entity_adjacency",
+    "get_entity_neighborhood",
+    "get_neighborhood_memories",
+    "analyze_memory_distribution",
+    "verify_database_integrity",
+    "verify_memory_persistence",
+    "check_memory_retrieval",
+    "verify_memory_storage",
+    "diagnose_memory_issues",
+    "get_gazetteer_terms",
+})
+
+class AsyncSQLiteStore:
+    """Awaitable facade over SQLiteStore for the async chat pipeline
+
+    Exposes the same methods as SQLiteStore, as coroutines. Reads run on a
+    small thread pool (WAL lets them proceed concurrently, each thread with
+    its own pooled connection); writes are serialised on a single writer
+    thread so they never contend with each other for the database lock.
+    The event loop stays free to stream tokens while a query is in flight.
+    """
+
+    def __init__(self, store: Optional[SQLiteStore] = None, max_readers: int = 4):
+        self.store = store or SQLiteStore()
+        self.logger = logging.getLogger(__name__)
+        self._readers = ThreadPoolExecutor(max_workers=max_readers, thread_name_prefix="sqlite-reader")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+
+    def __getattr__(self, name):
+        attr = getattr(self.store, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+        executor = self._readers if name in READ_METHODS else self._writer
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, functools.partial(attr, *args, **kwargs))
+        return call
+
+    async def iter_memories(self, user_id: str, batch_size: int = 500):
+        """Async counterpart of SQLiteStore.iter_memories; fetches one batch per hop"""
+        loop = asyncio.get_running_loop()
+        iterator = self.store.iter_memories(user_id, batch_size=batch_size)
+        sentinel = object()
+        while True:
+            batch = await loop.run_in_executor(
+                self._readers, lambda: [m for _, m in zip(range(batch_size), iterator)] or sentinel
+            )
+            if batch is sentinel:
+                return
+            for memory in batch:
+                yield memory
+
+    async def close(self):
+        """Drain pending writes, flush deferred touches and stop the worker threads"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._writer, self.store.flush_touches)
+        self.shutdown()
+
+    def shutdown(self, wait: bool = True):
+        """Synchronous shutdown for callers outside an event loop"""
+        self._writer.shutdown(wait=wait)
+        self._readers.shutdown(wait=wait)
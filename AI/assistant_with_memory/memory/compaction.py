@@ -0,0 +1,104 @@
+# memory/compaction.py
+
+from typing import Dict, Optional
+import logging
+import threading
+import time
+import traceback
+
+class MemoryCompactor:
+    """Background maintenance for the memory store
+
+    Every interval_secs it decays importance scores, merges duplicate
+    memories and archives deleted or cold ones, so the live memories table
+    stays small. ANALYZE/PRAGMA optimize run every pass; VACUUM runs at most
+    once per vacuum_interval_secs since it rewrites the whole file.
+    """
+
+    def __init__(self, store, interval_secs: float = 3600, vacuum_interval_secs: Optional[float] = 86400,
+                 half_life_days: float = 30.0, access_boost: float = 0.1,
+                 archive_max_importance: float = 0.1, archive_idle_days: float = 90.0,
+                 archive_max_access_count: int = 1):
+        self.store = store
+        self.interval_secs = interval_secs
+        self.vacuum_interval_secs = vacuum_interval_secs
+        self.half_life_days = half_life_days
+        self.access_boost = access_boost
+        self.archive_max_importance = archive_max_importance
+        self.archive_idle_days = archive_idle_days
+        self.archive_max_access_count = archive_max_access_count
+        self.logger = logging.getLogger(__name__)
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._run_lock = threading.Lock()
+        self._last_vacuum = time.monotonic()
+        self._stats = {
+            "runs": 0,
+            "failed_runs": 0,
+            "decayed": 0,
+            "merged": 0,
+            "archived": 0,
+            "vacuums": 0,
+            "last_run_secs": 0.0
+        }
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="memory-compaction", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval_secs):
+            vacuum = bool(self.vacuum_interval_secs) and (
+                time.monotonic() - self._last_vacuum >= self.vacuum_interval_secs
+            )
+            self.run_once(vacuum=vacuum)
+
+    def run_once(self, vacuum: bool = False) -> Dict:
+        """Run one compaction pass and return what it did"""
+        with self._run_lock:
+            started = time.monotonic()
+            result = {"decayed": 0, "merged": 0, "archived": 0, "vacuumed": False}
+            try:
+                result["decayed"] = self.store.apply_importance_decay(
+                    half_life_days=self.half_life_days,
+                    access_boost=self.access_boost
+                )
+                result["merged"] = self.store.merge_duplicate_memories()
+                result["archived"] = self.store.archive_cold_memories(
+                    max_importance=self.archive_max_importance,
+                    min_idle_days=self.archive_idle_days,
+                    max_access_count=self.archive_max_access_count
+                )
+                self.store.optimize_database(vacuum=vacuum)
+                if vacuum:
+                    self._last_vacuum = time.monotonic()
+                    result["vacuumed"] = True
+            except Exception as e:
+                self.logger.error(f"[MEM_COMPACT] Compaction pass failed: {str(e)}")
+                self.logger.error(f"[MEM_COMPACT] Traceback: {traceback.format_exc()}")
+                self._stats["failed_runs"] += 1
+            finally:
+                elapsed = time.monotonic() - started
+                self._stats["runs"] += 1
+                self._stats["decayed"] += result["decayed"]
+                self._stats["merged"] += result["merged"]
+                self._stats["archived"] += result["archived"]
+                self._stats["vacuums"] += int(result["vacuumed"])
+                self._stats["last_run_secs"] = round(elapsed, 3)
+            self.logger.debug("[MEM_COMPACT] Pass done in %.2fs: %s", elapsed, result)
+            return result
+
+    def metrics(self) -> Dict:
+        # Not under _run_lock: a VACUUM pass can hold it for a long time
+        stats = dict(self._stats)
+        stats["running"] = self._run_lock.locked()
+        return stats
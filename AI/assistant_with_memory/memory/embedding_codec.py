@@ -0,0 +1,91 @@
+# memory/embedding_codec.py
+
+"""Versioned binary format for the memories.embedding column
+
+Layout (little endian, 16-byte header so payloads stay aligned):
+
+    magic    3s   b"EMB"
+    version  B    1
+    dtype    B    0 = float32, 1 = float16, 2 = int8 (symmetric scalar quantized)
+    flags    B    reserved, 0
+    dim      I    number of dimensions
+    scale    f    int8 dequantization scale (1.0 for float types)
+    pad      2x
+
+Blobs without the magic prefix are treated as legacy raw float32 vectors.
+"""
+
+from typing import Optional
+import struct
+import numpy as np
+
+MAGIC = b"EMB"
+VERSION = 1
+HEADER = struct.Struct("<3sBBBIf2x")
+HEADER_SIZE = HEADER.size
+
+DTYPE_CODES = {"float32": 0, "float16": 1, "int8": 2}
+CODE_DTYPES = {0: np.float32, 1: np.float16, 2: np.int8}
+
+def encode_embedding(vec, dtype: str = "float32") -> bytes:
+    """Encode a vector with a header, optionally at reduced precision"""
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    arr = np.asarray(vec, dtype=np.float32).reshape(-1)
+    scale = 1.0
+
+    if dtype == "int8":
+        peak = float(np.max(np.abs(arr))) if arr.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        payload = np.clip(np.rint(arr / scale), -127, 127).astype(np.int8)
+    else:
+        payload = arr.astype(CODE_DTYPES[DTYPE_CODES[dtype]])
+
+    return HEADER.pack(MAGIC, VERSION, DTYPE_CODES[dtype], 0, arr.size, scale) + payload.tobytes()
+
+def _parse(blob: bytes):
+    """Return (numpy dtype, dim, scale, payload offset) for a blob"""
+    if len(blob) >= HEADER_SIZE and blob[:3] == MAGIC:
+        _, version, code, _, dim, scale = HEADER.unpack_from(blob)
+        if version != VERSION:
+            raise ValueError(f"Unsupported embedding version: {version}")
+        dtype = CODE_DTYPES.get(code)
+        if dtype is None:
+            raise ValueError(f"Unknown embedding dtype code: {code}")
+        if HEADER_SIZE + dim * np.dtype(dtype).itemsize != len(blob):
+            raise ValueError(f"Embedding blob length {len(blob)} does not match dim {dim}")
+        return dtype, dim, scale, HEADER_SIZE
+
+    # Legacy headerless float32
+    if len(blob) % 4:
+        raise ValueError(f"Legacy embedding blob length {len(blob)} is not a multiple of 4")
+    return np.float32, len(blob) // 4, 1.0, 0
+
+def embedding_dim(blob: bytes) -> int:
+    return _parse(blob)[1]
+
+def embedding_dtype(blob: bytes) -> Optional[str]:
+    """Stored dtype name, or None for legacy headerless blobs"""
+    if len(blob) >= HEADER_SIZE and blob[:3] == MAGIC:
+        return {v: k for k, v in DTYPE_CODES.items()}[HEADER.unpack_from(blob)[2]]
+    return None
+
+def decode_embedding(blob: bytes) -> np.ndarray:
+    """Decode to float32; float32 payloads are a zero-copy read-only view of the blob"""
+    dtype, dim, scale, offset = _parse(blob)
+    raw = np.frombuffer(blob, dtype=dtype, count=dim, offset=offset)
+    if dtype is np.float32:
+        return raw
+    if dtype is np.int8:
+        return raw.astype(np.float32) * np.float32(scale)
+    return raw.astype(np.float32)
+
+def decode_into(blob: bytes, out: np.ndarray) -> None:
+    """Decode directly into a preallocated float32 row (e.g. one row of an index matrix)"""
+    dtype, dim, scale, offset = _parse(blob)
+    if out.shape[0] != dim:
+        raise ValueError(f"Embedding has {dim} dimensions, buffer holds {out.shape[0]}")
+    raw = np.frombuffer(blob, dtype=dtype, count=dim, offset=offset)
+    np.copyto(out, raw, casting="unsafe")
+    if dtype is np.int8:
+        out *= np.float32(scale)
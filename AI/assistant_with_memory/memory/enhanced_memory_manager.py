@@ -5,24 +5,21 @@ from uuid import uuid4
 from datetime import datetime, timezone
 from .memory_types import *
 from .sqlite_store import SQLiteStore
+from .entity_cache import EntityExtractionCache, GazetteerExtractor
+from .logging_utils import configure_memory_logging
 import traceback
 
 class EnhancedMemoryManager:
-    def __init__(self, user_id: str, llm=None):
+    def __init__(self, user_id: str, llm=None, defer_access_updates: bool = False,
+                 store: Optional[SQLiteStore] = None):
         self.user_id = user_id
         self.llm = llm
-        self.store = SQLiteStore()
+        self.store = store or SQLiteStore()
+        self.defer_access_updates = defer_access_updates
+        self.entity_cache = EntityExtractionCache(self.store)
+        self.gazetteer = GazetteerExtractor(self.store, user_id)
+        configure_memory_logging()
         self.logger = logging.getLogger(__name__)
-        
-        # Configure logging
-        if not self.logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter(
-                '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-            )
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-            self.logger.setLevel(logging.DEBUG)
             
     def _create_memory_prompt(self, conversation_history: List[Dict]) -> str:
         """Creates a prompt for the LLM to analyze memory implications"""
@@ -110,13 +107,26 @@ Extract all important information about the user and their characteristics.
             # Simple extraction based on message content
             for message in conversation_history:
                 content = message.get("content", "")
+                
+                # Cached extraction or known entities first
+                cached = self.entity_cache.get(content)
+                if cached is not None:
+                    entities.update(cached)
+                    continue
+                known = self.gazetteer.extract(content)
+                if known:
+                    entities.update(known)
+                    continue
+                    
                 # Extract names, places, etc using the LLM
                 if self.llm:
                     entity_prompt = f"""Extract entity names (people, places, things) from this text. 
                     Return as a comma-separated list:
                     {content}"""
                     response = self.llm.invoke([{"role": "user", "content": entity_prompt}])
-                    entities.update([e.strip() for e in response.split(",")])
+                    extracted = [e.strip() for e in response.split(",") if e.strip()]
+                    self.entity_cache.put(content, extracted)
+                    entities.update(extracted)
                     
         except Exception as e:
             self.logger.error(f"Error extracting entities: {str(e)}")
@@ -146,7 +156,7 @@ Extract all important information about the user and their characteristics.
             # Store new memories and entity updates
             self._store_memory_updates(analysis)
             
-            self.logger.debug(f"Memory processing complete: {analysis.get('reasoning')}")
+            self.logger.debug("Memory processing complete: %s", analysis.get('reasoning'))
             
         except Exception as e:
             self.logger.error(f"Error processing memories: {str(e)}")
@@ -164,18 +174,29 @@ Extract all important information about the user and their characteristics.
                 self.logger.error("Invalid memory analysis format")
                 return
             
-            # Store new memories with better error handling
-            for memory in analysis.get("new_memories", []):
-                try:
-                    # Add metadata
-                    memory["id"] = str(uuid4())
-                    memory["created_at"] = datetime.now(timezone.utc).isoformat()
-                    memory["last_accessed"] = datetime.now(timezone.utc).isoformat()
-                    
-                    self.store.add_memory(self.user_id, memory)
-                except Exception as e:
-                    self.logger.error(f"Error storing individual memory: {str(e)}")
-                    continue
+            # New entity ids should be recognised without an LLM call
+            self.gazetteer.invalidate()
+            
+            # Add metadata
+            now = datetime.now(timezone.utc).isoformat()
+            new_memories = analysis.get("new_memories", [])
+            for memory in new_memories:
+                memory["id"] = str(uuid4())
+                memory["created_at"] = now
+                memory["last_accessed"] = now
+                
+            # Store new memories in one transaction, falling back to
+            # one-by-one inserts so a single bad memory doesn't drop the rest
+            try:
+                self.store.add_memories(self.user_id, new_memories)
+            except Exception as e:
+                self.logger.error(f"Bulk memory insert failed, retrying individually: {str(e)}")
+                for memory in new_memories:
+                    try:
+                        self.store.add_memory(self.user_id, memory)
+                    except Exception as e:
+                        self.logger.error(f"Error storing individual memory: {str(e)}")
+                        continue
                 
         except Exception as e:
             self.logger.error(f"Error storing updates: {str(e)}")
@@ -196,10 +217,16 @@ Extract all important information about the user and their characteristics.
             )
             
             # Update access patterns
+            accessed_at = datetime.now(timezone.utc).isoformat()
             for memory in memories:
-                memory["last_accessed"] = datetime.now(timezone.utc).isoformat()
+                memory["last_accessed"] = accessed_at
                 memory["access_count"] = memory.get("access_count", 0) + 1
-                self.store.update_memory(self.user_id, memory["id"], memory)
+            self.store.touch_memories(
+                self.user_id,
+                [memory["id"] for memory in memories],
+                accessed_at=accessed_at,
+                defer=self.defer_access_updates
+            )
                 
             return memories
             
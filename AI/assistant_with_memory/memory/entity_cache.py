@@ -0,0 +1,124 @@
+# memory/entity_cache.py
+
+from collections import OrderedDict
+from typing import List, Optional
+import hashlib
+import logging
+import re
+import threading
+import time
+
+# Words every conversation mentions; matching them would make the gazetteer always "hit"
+GAZETTEER_STOPWORDS = {"user", "assistant", "the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for"}
+
+def content_hash(text: str) -> str:
+    """Stable cache key for a message, ignoring whitespace differences"""
+    normalized = " ".join((text or "").split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+class EntityExtractionCache:
+    """LRU + TTL cache of LLM entity extractions, persisted in the SQLite store
+
+    Lookups hit an in-process LRU first and fall back to the
+    entity_extraction_cache table, so results survive restarts and are shared
+    by every manager using the same database.
+    """
+
+    def __init__(self, store, max_size: int = 1024, ttl_seconds: float = 7 * 86400,
+                 max_persisted: int = 50000):
+        self.store = store
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.max_persisted = max_persisted
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger(__name__)
+
+    def get(self, text: str) -> Optional[List[str]]:
+        key = content_hash(text)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entities, stored_at = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return list(entities)
+                del self._entries[key]
+
+        entities = self.store.get_cached_entities(key, now - self.ttl_seconds)
+        with self._lock:
+            if entities is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, entities, now)
+        return list(entities)
+
+    def put(self, text: str, entities: List[str]):
+        key = content_hash(text)
+        now = time.time()
+        with self._lock:
+            self._remember(key, entities, now)
+        try:
+            self.store.put_cached_entities(key, entities, self.max_persisted)
+        except Exception as e:
+            # The in-process cache still works; persistence is best effort
+            self.logger.error(f"Error persisting entity cache entry: {str(e)}")
+
+    def _remember(self, key: str, entities: List[str], stored_at: float):
+        self._entries[key] = (list(entities), stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+class GazetteerExtractor:
+    """Regex matcher for entity names the user's store already knows about
+
+    Built from the entities table and the entity ids of stored memories.
+    Retrieval can only ever return memories about known entities, so a
+    gazetteer hit is enough to answer without asking the LLM.
+    """
+
+    def __init__(self, store, user_id: str, refresh_seconds: float = 300):
+        self.store = store
+        self.user_id = user_id
+        self.refresh_seconds = refresh_seconds
+        self._pattern = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = 0.0
+
+    def _get_pattern(self):
+        with self._lock:
+            if self._built_at and time.time() - self._built_at < self.refresh_seconds:
+                return self._pattern
+
+            terms = {
+                term.strip().lower()
+                for term in self.store.get_gazetteer_terms(self.user_id)
+                if term and len(term.strip()) >= 2
+            }
+            terms -= GAZETTEER_STOPWORDS
+            terms.discard(self.user_id.lower())
+
+            if terms:
+                # Longest first so "rosemary smith" wins over "rosemary"
+                alternation = "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True))
+                self._pattern = re.compile(rf"(?<!\w)(?:{alternation})(?!\w)", re.IGNORECASE)
+            else:
+                self._pattern = None
+            self._built_at = time.time()
+            return self._pattern
+
+    def extract(self, text: str) -> List[str]:
+        pattern = self._get_pattern()
+        if pattern is None or not text:
+            return []
+        return list(dict.fromkeys(match.lower() for match in pattern.findall(text)))
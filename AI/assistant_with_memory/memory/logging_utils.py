@@ -0,0 +1,146 @@
+# memory/logging_utils.py
+
+"""Logging setup for the memory subsystem
+
+Configured once per process from the environment:
+
+    MEMORY_LOG_LEVEL        DEBUG/INFO/WARNING/... (default INFO)
+    MEMORY_LOG_MODE         "text" (default) or "perf"
+    MEMORY_LOG_FILE         log path (default logs/memory.log)
+    MEMORY_LOG_MAX_BYTES    rotate after this many bytes (default 10 MB)
+    MEMORY_LOG_BACKUPS      rotated files to keep (default 5)
+    MEMORY_LOG_SAMPLE_RATE  fraction of per-row debug lines to keep (default 1.0)
+
+In perf mode the text log is limited to warnings and every timed operation
+is written as one JSON line ({"op", "ms", "ts", ...}) to MEMORY_PERF_FILE
+(default logs/memory_perf.jsonl).
+
+Expensive debug payloads should be passed as arguments rather than baked
+into f-strings, e.g. ``logger.debug("[DB_SEARCH] %s", LazyJSON(rows))``, so
+they are only serialised when the record is actually emitted.
+"""
+
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+PERF_LOGGER_NAME = "memory.perf"
+
+# Pass as extra= on per-row debug lines so MEMORY_LOG_SAMPLE_RATE applies to them
+SAMPLED = {"sampled": True}
+
+_configured = False
+_configure_lock = threading.Lock()
+_perf_logger = logging.getLogger(PERF_LOGGER_NAME)
+
+class LazyJSON:
+    """Defers json.dumps until the log record is formatted"""
+
+    __slots__ = ("obj", "indent")
+
+    def __init__(self, obj, indent: int = 2):
+        self.obj = obj
+        self.indent = indent
+
+    def __str__(self) -> str:
+        return json.dumps(self.obj, indent=self.indent, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of records marked with extra=SAMPLED"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False) or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+class JSONLineFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg if isinstance(record.msg, dict) else {"msg": record.getMessage()})
+
+def _rotating_handler(path: str, formatter: logging.Formatter) -> RotatingFileHandler:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    handler = RotatingFileHandler(
+        path,
+        maxBytes=int(os.getenv("MEMORY_LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+        backupCount=int(os.getenv("MEMORY_LOG_BACKUPS", "5"))
+    )
+    handler.setFormatter(formatter)
+    return handler
+
+def configure_memory_logging():
+    """Attach handlers to the "memory" logger tree; safe to call repeatedly"""
+    global _configured
+    if _configured:
+        return
+    with _configure_lock:
+        if _configured:
+            return
+
+        log_dir = Path(__file__).parent.parent / "logs"
+        mode = os.getenv("MEMORY_LOG_MODE", "text").lower()
+        level = logging.getLevelName(os.getenv("MEMORY_LOG_LEVEL", "INFO").upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+
+        root = logging.getLogger("memory")
+        root.propagate = False
+        root.setLevel(logging.WARNING if mode == "perf" else level)
+
+        formatter = logging.Formatter(LOG_FORMAT)
+        sampler = SamplingFilter(float(os.getenv("MEMORY_LOG_SAMPLE_RATE", "1.0")))
+        file_handler = _rotating_handler(os.getenv("MEMORY_LOG_FILE", str(log_dir / "memory.log")), formatter)
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        for handler in (file_handler, console_handler):
+            handler.addFilter(sampler)
+            root.addHandler(handler)
+
+        _perf_logger.propagate = False
+        if mode == "perf":
+            _perf_logger.setLevel(logging.INFO)
+            _perf_logger.addHandler(_rotating_handler(
+                os.getenv("MEMORY_PERF_FILE", str(log_dir / "memory_perf.jsonl")),
+                JSONLineFormatter()
+            ))
+        else:
+            _perf_logger.setLevel(logging.CRITICAL + 1)
+
+        _configured = True
+
+def perf_enabled() -> bool:
+    return _perf_logger.isEnabledFor(logging.INFO)
+
+@contextmanager
+def timed(op: str, **fields):
+    """Emit {"op", "ms", ...} to the perf log for the wrapped block (perf mode only)"""
+    if not perf_enabled():
+        yield fields
+        return
+    started = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        fields.update(op=op, ms=round((time.perf_counter() - started) * 1000, 3), ts=time.time())
+        _perf_logger.info(fields)
+
+def timed_method(op: str):
+    """Decorator form of timed() for store and manager methods"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(op):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
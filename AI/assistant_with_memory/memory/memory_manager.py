@@ -1,114 +1,55 @@
 from typing import Dict, List, Optional
 from datetime import datetime, timezone
 from .sqlite_store import SQLiteStore
+from .async_store import AsyncSQLiteStore
+from .entity_cache import EntityExtractionCache, GazetteerExtractor
+from .logging_utils import LazyJSON, SAMPLED, configure_memory_logging, timed, timed_method
 from .memory_types import MemoryAnalysis, MemoryItem, MemoryEntry, parse_memory_response, format_memory_for_storage
 from uuid import uuid4
 import json
 import asyncio
 import traceback
 import logging
-from pathlib import Path
 import re
 
 class MemoryManager:
-    def __init__(self, user_id: str, llm=None):
+    def __init__(self, user_id: str, llm=None, defer_access_updates: bool = False,
+                 store: Optional[SQLiteStore] = None, async_store: Optional[AsyncSQLiteStore] = None):
         self.user_id = user_id
-        self.store = SQLiteStore()
+        # A store may be shared between users; connections are pooled per thread
+        self.store = store or (async_store.store if async_store else SQLiteStore())
+        # Awaitable view of the same store for the async chat path (created on first use)
+        self._async_store = async_store
         self.llm = llm
+        self.defer_access_updates = defer_access_updates
         
-        # Configure logging
-        self.logger = logging.getLogger(__name__)
+        # Entity extraction: cached LLM results, then known-entity matching, then the LLM
+        self.entity_cache = EntityExtractionCache(self.store)
+        self.gazetteer = GazetteerExtractor(self.store, user_id)
         
-        # Reset log file on initialization
-        self._reset_log_file()
+        # Configure logging (shared rotating handler, see logging_utils)
+        configure_memory_logging()
+        self.logger = logging.getLogger(__name__)
         
         # Load existing memories
         self._load_memories()
         
-    def _reset_log_file(self):
-        """Reset log file to prevent overwhelming logs"""
-        try:
-            # Get log file path
-            log_dir = Path(__file__).parent.parent / "logs"
-            log_dir.mkdir(exist_ok=True)
-            log_file = log_dir / f"memory_manager_{datetime.now().strftime('%Y%m%d')}.log"
-            
-            # Clear existing handlers
-            if self.logger.handlers:
-                for handler in self.logger.handlers:
-                    self.logger.removeHandler(handler)
-                    
-            # Create fresh file handler with empty log
-            with open(log_file, 'w') as f:
-                f.write(f"# Log file reset on {datetime.now().isoformat()}\n")
-                
-            # Setup new handler
-            file_handler = logging.FileHandler(log_file)
-            console_handler = logging.StreamHandler()
-            
-            formatter = logging.Formatter(
-                '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-            )
-            
-            file_handler.setFormatter(formatter)
-            console_handler.setFormatter(formatter)
-            
-            self.logger.addHandler(file_handler)
-            self.logger.addHandler(console_handler)
-            self.logger.setLevel(logging.DEBUG)
-            
-            self.logger.debug(f"Log file reset: {log_file}")
-            
-        except Exception as e:
-            print(f"Error resetting log file: {str(e)}")
-
     def _load_memories(self):
-        """Load existing memories from the database"""
+        """Summarise existing memories with SQL aggregates instead of loading every row"""
         self.logger.debug("="*50)
-        self.logger.debug("[MEM_LOAD] Starting memory load operation")
+        self.logger.debug("[MEM_LOAD] Starting memory distribution summary")
         try:
-            self.logger.debug("[MEM_LOAD] Requesting memories from SQLite store")
-            memories = self.store.load_all_memories(self.user_id)
-            self.logger.debug(f"[MEM_LOAD] Retrieved {len(memories)} memories from store")
-            
-            # Analyze memory types
-            memory_types = {}
-            entity_counts = {}
-            importance_levels = {"low": 0, "medium": 0, "high": 0}
-            
-            for memory in memories:
-                # Track memory types
-                mem_type = memory.get("memory_type", "unknown")
-                memory_types[mem_type] = memory_types.get(mem_type, 0) + 1
+            stats = self.store.analyze_memory_distribution(self.user_id)
+            if "error" in stats:
+                return
                 
-                # Track entities
-                entity = memory.get("entity_id")
-                if entity:
-                    entity_counts[entity] = entity_counts.get(entity, 0) + 1
-                    
-                # Track importance
-                importance = memory.get("importance_score", 0)
-                if importance >= 0.8:
-                    importance_levels["high"] += 1
-                elif importance >= 0.4:
-                    importance_levels["medium"] += 1
-                else:
-                    importance_levels["low"] += 1
-                    
-                self.logger.debug(f"[MEM_LOAD] Memory {memory['id']}:")
-                self.logger.debug(f"[MEM_LOAD] - Type: {mem_type}")
-                self.logger.debug(f"[MEM_LOAD] - Entity: {entity}")
-                self.logger.debug(f"[MEM_LOAD] - Content: {json.dumps(memory.get('content', {}), indent=2)}")
-                self.logger.debug(f"[MEM_LOAD] - Importance: {importance}")
-                self.logger.debug(f"[MEM_LOAD] - Created: {memory.get('created_at')}")
-                
-            self.logger.debug("[MEM_LOAD] Memory distribution analysis:")
-            self.logger.debug(f"[MEM_LOAD] Memory types: {json.dumps(memory_types, indent=2)}")
-            self.logger.debug(f"[MEM_LOAD] Entity counts: {json.dumps(entity_counts, indent=2)}")
-            self.logger.debug(f"[MEM_LOAD] Importance levels: {json.dumps(importance_levels, indent=2)}")
+            self.logger.debug("[MEM_LOAD] Total memories: %s", stats['total_memories'])
+            self.logger.debug("[MEM_LOAD] Memory types: %s", LazyJSON(stats['by_type']))
+            self.logger.debug("[MEM_LOAD] Distinct entities: %s", len(stats['by_entity']))
+            self.logger.debug("[MEM_LOAD] Importance levels: %s", LazyJSON(stats['by_importance']))
             
         except Exception as e:
-            self.logger.error("[MEM_LOAD] Error loading memories")
+            self.logger.error("[MEM_LOAD] Error summarising memories")
             self.logger.error(f"[MEM_LOAD] Error: {str(e)}")
             self.logger.error(f"[MEM_LOAD] Traceback: {traceback.format_exc()}")
         finally:
@@ -119,39 +60,92 @@ class MemoryManager:
         """Add a new memory with proper format transformation"""
         try:
             self.logger.debug("Adding new memory")
-            self.logger.debug(f"Raw memory data: {memory_data}")
+            self.logger.debug("Raw memory data: %s", memory_data)
             
             # Parse memory data using pydantic models
             memory_analysis = parse_memory_response(json.dumps(memory_data))
-            self.logger.debug(f"Parsed memory analysis: {memory_analysis.dict()}")
+            self.logger.debug("Parsed memory analysis: %s", memory_analysis)
             
-            # Store each memory item
+            # Format every memory item, then store them in one transaction
+            memory_entries = []
             for item in memory_analysis.memory_items:
                 memory_id = str(uuid4())
                 memory_entry = format_memory_for_storage(item, memory_id)
-                self.logger.debug(f"Formatted memory entry: {memory_entry.dict()}")
-                
-                # Store in database
-                self.store.add_memory(self.user_id, memory_entry.dict())
+                self.logger.debug("Formatted memory entry: %s", memory_entry)
+                memory_entries.append(memory_entry.dict())
                 
-            self.logger.debug(f"Added {len(memory_analysis.memory_items)} memories")
+            memory_ids = self.store.add_memories(self.user_id, memory_entries)
+            self.logger.debug("Added %s memories", len(memory_ids))
+            
+            # New entity ids should be recognised without an LLM call
+            self.gazetteer.invalidate()
                 
         except Exception as e:
             self.logger.error(f"Error adding memory: {str(e)}")
             self.logger.error(f"Memory data: {memory_data}")
             self.logger.error(f"Traceback: {traceback.format_exc()}")
 
+    @property
+    def async_store(self) -> AsyncSQLiteStore:
+        if self._async_store is None:
+            self._async_store = AsyncSQLiteStore(self.store)
+        return self._async_store
+
+    def _mark_accessed(self, memories: List[Dict]) -> str:
+        """Bump access fields on retrieved memories in place; returns the access time"""
+        accessed_at = datetime.now(timezone.utc).isoformat()
+        for memory in memories:
+            memory["last_accessed"] = accessed_at
+            memory["access_count"] = memory.get("access_count", 0) + 1
+        return accessed_at
+
+    async def aget_relevant_memories(self, context: str, k: int = 5) -> List[Dict]:
+        """Async get_relevant_memories; database and LLM work run off the event loop"""
+        try:
+            with timed("retrieve_async"):
+                self.logger.debug("[MEMORY_RETRIEVAL] Async retrieval, max results: %s", k)
+                loop = asyncio.get_running_loop()
+            
+                # Entity extraction may fall back to a blocking LLM call
+                entity_ids = await loop.run_in_executor(
+                    None, self._extract_entity_mentions, [{"content": context}]
+                )
+                self.logger.debug("[MEMORY_RETRIEVAL] Extracted entity IDs: %s", entity_ids)
+            
+                memories = await self.async_store.search_memories(
+                    self.user_id,
+                    entity_ids=entity_ids,
+                    max_results=k
+                )
+                self.logger.debug("[MEMORY_RETRIEVAL] Found %s memories", len(memories))
+            
+                accessed_at = self._mark_accessed(memories)
+                await self.async_store.touch_memories(
+                    self.user_id,
+                    [memory["id"] for memory in memories],
+                    accessed_at=accessed_at,
+                    defer=self.defer_access_updates
+                )
+                return memories
+            
+        except Exception as e:
+            self.logger.error("[MEMORY_RETRIEVAL] Error getting memories")
+            self.logger.error(f"[MEMORY_RETRIEVAL] Error: {str(e)}")
+            self.logger.error(f"[MEMORY_RETRIEVAL] Traceback: {traceback.format_exc()}")
+            return []
+
+    @timed_method("retrieve")
     def get_relevant_memories(self, context: str, k: int = 5) -> List[Dict]:
         """Get relevant memories using Tree of Thoughts"""
         try:
             self.logger.debug("="*50)
             self.logger.debug("[MEMORY_RETRIEVAL] Starting memory retrieval")
-            self.logger.debug(f"[MEMORY_RETRIEVAL] Context: {context}")
-            self.logger.debug(f"[MEMORY_RETRIEVAL] Max results: {k}")
+            self.logger.debug("[MEMORY_RETRIEVAL] Context: %s", context)
+            self.logger.debug("[MEMORY_RETRIEVAL] Max results: %s", k)
             
             # Extract potential entity mentions from context
             entity_ids = self._extract_entity_mentions([{"content": context}])
-            self.logger.debug(f"[MEMORY_RETRIEVAL] Extracted entity IDs: {entity_ids}")
+            self.logger.debug("[MEMORY_RETRIEVAL] Extracted entity IDs: %s", entity_ids)
             
             # Search memories
             self.logger.debug("[MEMORY_RETRIEVAL] Searching memories in database")
@@ -160,18 +154,20 @@ class MemoryManager:
                 entity_ids=entity_ids,
                 max_results=k
             )
-            self.logger.debug(f"[MEMORY_RETRIEVAL] Found {len(memories)} memories")
+            self.logger.debug("[MEMORY_RETRIEVAL] Found %s memories", len(memories))
             
             # Update access patterns
             self.logger.debug("[MEMORY_RETRIEVAL] Updating access patterns")
-            for memory in memories:
-                self.logger.debug(f"[MEMORY_RETRIEVAL] Updating memory: {memory['id']}")
-                memory["last_accessed"] = datetime.now(timezone.utc).isoformat()
-                memory["access_count"] = memory.get("access_count", 0) + 1
-                self.store.update_memory(self.user_id, memory["id"], memory)
+            accessed_at = self._mark_accessed(memories)
+            self.store.touch_memories(
+                self.user_id,
+                [memory["id"] for memory in memories],
+                accessed_at=accessed_at,
+                defer=self.defer_access_updates
+            )
                 
             self.logger.debug("[MEMORY_RETRIEVAL] Memory retrieval complete")
-            self.logger.debug(f"[MEMORY_RETRIEVAL] Retrieved memories: {json.dumps(memories, indent=2)}")
+            self.logger.debug("[MEMORY_RETRIEVAL] Retrieved memories: %s", LazyJSON(memories), extra=SAMPLED)
             self.logger.debug("="*50)
             return memories
             
@@ -189,7 +185,14 @@ class MemoryManager:
             for message in conversation_history:
                 content = message.get("content", "")
                 
-                if self.llm:
+                extracted = self.entity_cache.get(content)
+                cached = extracted is not None
+                if not cached:
+                    extracted = self.gazetteer.extract(content)
+                    if extracted:
+                        self.logger.debug("Gazetteer matched entities: %s", extracted)
+                    
+                if not cached and not extracted and self.llm:
                     # Direct, focused prompt
                     prompt = f"""<|im_start|>system
 Extract entities from text. Return only comma-separated list.
@@ -209,14 +212,17 @@ Text: {content}
                     response = self.llm.invoke([{"role": "system", "content": prompt}])
                     
                     if response and isinstance(response, str):
-                        # Process entities
-                        extracted = [e.strip().lower() for e in response.split(",")]
-                        for entity in extracted:
-                            if self._is_valid_entity(entity):
-                                entities.add(entity)
-                                # Add associated numbers
-                                numbers = re.findall(r'\d+', entity)
-                                entities.update(numbers)
+                        extracted = [e.strip() for e in response.split(",") if e.strip()]
+                        self.entity_cache.put(content, extracted)
+                        
+                # Process entities
+                for entity in extracted:
+                    entity = entity.lower()
+                    if self._is_valid_entity(entity):
+                        entities.add(entity)
+                        # Add associated numbers
+                        numbers = re.findall(r'\d+', entity)
+                        entities.update(numbers)
             
             # Add core entities
             entities.update([self.user_id, "user", "assistant"])
@@ -28,6 +28,7 @@ class MemoryEntry(BaseModel):
     last_accessed: str = Field(description="ISO format timestamp of last access")
     access_count: int = Field(default=0, description="Number of times accessed")
     associations: List[str] = Field(default_factory=list, description="IDs of related memories")
+    embedding: Optional[List[float]] = Field(default=None, description="Embedding vector for similarity search")
 
     class Config:
         json_encoders = {
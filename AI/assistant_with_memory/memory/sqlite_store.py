@@ -1,7 +1,8 @@
 # memory/sqlite_store.py
 
 import sqlite3
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional
 from datetime import datetime, timezone, timedelta
 import json
 import numpy as np
@@ -9,33 +10,152 @@ import traceback
 import logging
 from pathlib import Path
 import os
+import math
+import threading
 import time
+import weakref
+from .vector_index import VectorIndex
+from . import embedding_codec
+from .logging_utils import LazyJSON, SAMPLED, configure_memory_logging, timed_method
+
+# Connection tuning applied to every pooled connection
+SQLITE_BUSY_TIMEOUT_MS = 5000
+SQLITE_CACHE_SIZE_KB = 16384      # 16MB page cache per connection
+SQLITE_MMAP_SIZE = 268435456      # 256MB memory-mapped I/O
+SQLITE_CACHED_STATEMENTS = 256    # Prepared statement cache per connection
+
+# Deferred access-pattern updates are flushed at most this often
+TOUCH_FLUSH_INTERVAL_SECS = 1.0
+# Entities whose typed adjacency is kept in memory
+ENTITY_ADJACENCY_CACHE_SIZE = 4096
+
+def _memory_decay(base_importance, last_accessed, access_count, now_ts, half_life_secs, access_boost):
+    """SQL function: time-decayed importance, boosted by how often a memory is used"""
+    if base_importance is None:
+        return None
+    try:
+        accessed = datetime.fromisoformat(last_accessed)
+        if accessed.tzinfo is None:
+            accessed = accessed.replace(tzinfo=timezone.utc)
+        age = max(0.0, now_ts - accessed.timestamp())
+    except (TypeError, ValueError):
+        age = 0.0
+    decayed = base_importance * 0.5 ** (age / half_life_secs)
+    return min(1.0, decayed * (1.0 + access_boost * math.log1p(access_count or 0)))
+
+class _ThreadSentinel:
+    """Held only in a thread's local storage, so it is collected when the thread exits"""
+
+def _release_connection(connections: list, lock: threading.Lock, conn: sqlite3.Connection):
+    """Finalizer for a pooled connection whose thread has exited"""
+    with lock:
+        if conn not in connections:
+            return  # already closed by close()
+        connections.remove(conn)
+    conn.close()
 
 class SQLiteStore:
-    def __init__(self, db_str = None):
-        """Initialize SQLite store with schema for memories and entities"""
+    def __init__(self, db_str = None, verify_writes: bool = False, embedding_dtype: str = "float32"):
+        """Initialize SQLite store with schema for memories and entities
+
+        Connections are long-lived and pooled per thread; set verify_writes
+        to re-read rows after inserts and updates for debugging.
+        embedding_dtype selects how new embeddings are stored
+        (float32, float16 or int8).
+        """
+        if embedding_dtype not in embedding_codec.DTYPE_CODES:
+            raise ValueError(f"Unsupported embedding dtype: {embedding_dtype}")
         if db_str is None:
             db_path = Path(__file__).parent.parent / "memory_store" / "memory.db"
             db_path.parent.mkdir(exist_ok=True)
+        else:
+            db_path = Path(db_str)
             
         self.db_path = str(db_path)
+        self.verify_writes = verify_writes
+        self.embedding_dtype = embedding_dtype
+        configure_memory_logging()
         self.logger = logging.getLogger(__name__)
-        if not self.logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter(
-                '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-            )
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-            self.logger.setLevel(logging.DEBUG)
+            
+        # Per-thread connection pool
+        self._local = threading.local()
+        self._connections = []
+        self._pool_lock = threading.Lock()
+        
+        # Per-user embedding matrices, built lazily on first vector search
+        self._vector_indexes: Dict[str, VectorIndex] = {}
+        self._vector_lock = threading.Lock()
+        
+        # Deferred access bookkeeping: {user_id: {memory_id: (count, last_accessed)}}
+        self._pending_touches: Dict[str, Dict[str, tuple]] = {}
+        self._touch_lock = threading.Lock()
+        self._touch_wakeup = threading.Event()
+        self._touch_flusher: Optional[threading.Thread] = None
+        
+        # Entity graph: (user_id, entity_id) -> {"out": {type: [ids]}, "in": {type: [ids]}}
+        self._adjacency: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._adjacency_lock = threading.Lock()
+        self._adjacency_generation = 0  # bumped on every invalidation
             
         self._init_db()
         
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's pooled connection, opening it on first use
+
+        Use as ``with self._connect() as conn:`` - the connection context
+        manager commits or rolls back the transaction but leaves the
+        connection open for reuse.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+            
+        # Only this thread uses it, but close() and the thread-exit finalizer
+        # may close it from another one
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+            cached_statements=SQLITE_CACHED_STATEMENTS,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.create_function("memory_decay", 6, _memory_decay, deterministic=True)
+        
+        self._local.conn = conn
+        # The sentinel dies with the thread's locals, which closes and unlists the connection
+        self._local.sentinel = _ThreadSentinel()
+        weakref.finalize(self._local.sentinel, _release_connection, self._connections, self._pool_lock, conn)
+        with self._pool_lock:
+            self._connections.append(conn)
+        self.logger.debug("Opened pooled connection for thread %s", threading.get_ident())
+        return conn
+        
+    def pool_size(self) -> int:
+        """Number of open pooled connections (one per live thread that used the store)"""
+        with self._pool_lock:
+            return len(self._connections)
+        
+    def close(self):
+        """Flush deferred writes and close every pooled connection"""
+        self.flush_touches()
+        with self._pool_lock:
+            connections = list(self._connections)
+            self._connections.clear()
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+        
     def _init_db(self):
         """Initialize database with proper schema for memory storage"""
-        with sqlite3.connect(self.db_path) as conn:
-            # Enable foreign keys
-            conn.execute("PRAGMA foreign_keys = ON")
+        with self._connect() as conn:
+            # Foreign keys, WAL and cache pragmas are applied in _connect()
             
             # Create memories table
             conn.execute("""
@@ -93,45 +213,193 @@ class SQLiteStore:
                 )
             """)
             
+            # Migration: importance before decay, so decay is recomputed rather than compounded
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(memories)")}
+            if "base_importance" not in columns:
+                conn.execute("ALTER TABLE memories ADD COLUMN base_importance REAL")
+                conn.execute("UPDATE memories SET base_importance = importance_score")
+            
+            # Create archive table for cold and merged memories
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS memories_archive (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    memory_type TEXT NOT NULL,
+                    entity_id TEXT,
+                    content TEXT NOT NULL,
+                    confidence REAL,
+                    importance_score REAL,
+                    base_importance REAL,
+                    source TEXT,
+                    created_at TEXT NOT NULL,
+                    last_accessed TEXT NOT NULL,
+                    access_count INTEGER DEFAULT 0,
+                    embedding BLOB,
+                    archived_at TEXT NOT NULL,
+                    archive_reason TEXT NOT NULL
+                )
+            """)
+            
+            # Create entity extraction cache table (keyed by message content hash)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entity_extraction_cache (
+                    content_hash TEXT PRIMARY KEY,
+                    entities TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            
             # Create indices for performance
             conn.execute("CREATE INDEX IF NOT EXISTS idx_memories_user ON memories(user_id)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_memories_type ON memories(memory_type)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_memories_entity ON memories(entity_id)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_memories_importance ON memories(importance_score)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_memories_user_created ON memories(user_id, created_at)")
+            # Hot queries only ever look at live rows
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_memories_live
+                ON memories(user_id, importance_score DESC, last_accessed DESC)
+                WHERE marked_for_deletion = 0
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_archive_user ON memories_archive(user_id)")
+            # The primary key covers outgoing edges; these cover typed and incoming traversal
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_entity_rel_type
+                ON entity_relationships(entity_id, relationship_type, related_entity_id)
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_entity_rel_related
+                ON entity_relationships(related_entity_id, relationship_type, entity_id)
+            """)
             conn.execute("CREATE INDEX IF NOT EXISTS idx_entities_user ON entities(user_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entity_cache_last_used ON entity_extraction_cache(last_used)")
             
-            # Enable WAL mode for better concurrent access
-            conn.execute("PRAGMA journal_mode=WAL")
-            conn.execute("PRAGMA synchronous=NORMAL")
-            conn.execute("PRAGMA cache_size=-2000")  # 2MB cache
+            # Full-text index over memory content and entity ids
+            self._fts_enabled = self._init_fts(conn)
             
             conn.commit()
             
             self.logger.debug("Database initialized with correct schema")
             
+    def _init_fts(self, conn: sqlite3.Connection) -> bool:
+        """Create the FTS5 index and its sync triggers, backfilling existing rows
+
+        memories_fts is an external-content table keyed on memories.rowid, so
+        it must be rebuilt after a VACUUM (which may renumber rowids).
+        Returns False when the SQLite build lacks FTS5; search_memories then
+        falls back to LIKE scans.
+        """
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'memories_fts'"
+            ).fetchone()
+            
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(
+                    content,
+                    entity_id,
+                    content='memories',
+                    content_rowid='rowid',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+            
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS memories_fts_ai AFTER INSERT ON memories BEGIN
+                    INSERT INTO memories_fts(rowid, content, entity_id)
+                    VALUES (new.rowid, new.content, new.entity_id);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS memories_fts_ad AFTER DELETE ON memories BEGIN
+                    INSERT INTO memories_fts(memories_fts, rowid, content, entity_id)
+                    VALUES ('delete', old.rowid, old.content, old.entity_id);
+                END
+            """)
+            # Only text changes touch the index; access bookkeeping updates skip it
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS memories_fts_au AFTER UPDATE OF content, entity_id ON memories BEGIN
+                    INSERT INTO memories_fts(memories_fts, rowid, content, entity_id)
+                    VALUES ('delete', old.rowid, old.content, old.entity_id);
+                    INSERT INTO memories_fts(rowid, content, entity_id)
+                    VALUES (new.rowid, new.content, new.entity_id);
+                END
+            """)
+            
+            if not exists:
+                # Migration: index memories written before FTS was introduced
+                self.logger.debug("[DB_INIT] Backfilling memories_fts from existing memories")
+                conn.execute("INSERT INTO memories_fts(memories_fts) VALUES ('rebuild')")
+                
+            return True
+            
+        except sqlite3.OperationalError as e:
+            self.logger.warning(f"[DB_INIT] FTS5 unavailable, falling back to LIKE search: {str(e)}")
+            return False
+
+    def rebuild_fts_index(self):
+        """Rebuild memories_fts from the memories table"""
+        if not self._fts_enabled:
+            return
+        with self._connect() as conn:
+            conn.execute("INSERT INTO memories_fts(memories_fts) VALUES ('rebuild')")
+        self.logger.debug("[DB_FTS] Full-text index rebuilt")
+
+    @staticmethod
+    def _build_fts_query(terms: List[str]) -> Optional[str]:
+        """Turn entity terms into an FTS5 MATCH expression of OR'd prefix phrases"""
+        phrases = []
+        for term in terms:
+            term = (term or "").strip()
+            if not any(c.isalnum() for c in term):
+                continue
+            phrases.append('"' + term.replace('"', '""') + '"*')
+        return " OR ".join(phrases) if phrases else None
+
+    def iter_memories(self, user_id: str, batch_size: int = 500) -> Iterator[Dict]:
+        """Yield a user's live memories newest first, fetching batch_size rows at a time
+
+        Uses keyset pagination on (created_at, id), so each batch is an index
+        range scan and no more than one batch is held in memory.
+        """
+        last_key = None
+        while True:
+            query = """
+                SELECT m.*, (
+                    SELECT GROUP_CONCAT(ma.associated_memory_id)
+                    FROM memory_associations ma
+                    WHERE ma.memory_id = m.id
+                ) as associations
+                FROM memories m
+                WHERE m.user_id = ? AND m.marked_for_deletion = 0
+            """
+            params = [user_id]
+            if last_key is not None:
+                query += " AND (m.created_at < ? OR (m.created_at = ? AND m.id < ?))"
+                params.extend([last_key[0], last_key[0], last_key[1]])
+            query += " ORDER BY m.created_at DESC, m.id DESC LIMIT ?"
+            params.append(batch_size)
+            
+            with self._connect() as conn:
+                rows = conn.execute(query, params).fetchall()
+                
+            for row in rows:
+                memory = self._row_to_dict(row)
+                if row["associations"]:
+                    memory["associations"] = row["associations"].split(",")
+                yield memory
+                
+            if len(rows) < batch_size:
+                return
+            last_key = (rows[-1]["created_at"], rows[-1]["id"])
+
     def load_all_memories(self, user_id: str) -> List[Dict]:
         """Load all memories for a user"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.execute("""
-                    SELECT m.*, GROUP_CONCAT(ma.associated_memory_id) as associations
-                    FROM memories m
-                    LEFT JOIN memory_associations ma ON m.id = ma.memory_id
-                    WHERE m.user_id = ? AND m.marked_for_deletion = 0
-                    GROUP BY m.id
-                    ORDER BY m.created_at DESC
-                """, (user_id,))
-                
-                memories = []
-                for row in cursor:
-                    memory = self._row_to_dict(row)
-                    if row["associations"]:
-                        memory["associations"] = row["associations"].split(",")
-                    memories.append(memory)
-                    
-                self.logger.debug(f"Loaded {len(memories)} memories for user {user_id}")
-                return memories
+            memories = list(self.iter_memories(user_id))
+            self.logger.debug("Loaded %s memories for user %s", len(memories), user_id)
+            return memories
                 
         except Exception as e:
             self.logger.error(f"Error loading memories: {str(e)}")
@@ -141,38 +409,35 @@ class SQLiteStore:
     def load_all_entities(self, user_id: str) -> List[Dict]:
         """Load all entities for a user"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
+            with self._connect() as conn:
                 cursor = conn.execute("""
-                    SELECT e.*, GROUP_CONCAT(er.relationship_type || ':' || er.related_entity_id) as relationships
+                    SELECT e.*, er.relationship_type, er.related_entity_id
                     FROM entities e
                     LEFT JOIN entity_relationships er ON e.id = er.entity_id
                     WHERE e.user_id = ?
-                    GROUP BY e.id
+                    ORDER BY e.id
                 """, (user_id,))
                 
                 entities = []
+                entity = None
                 for row in cursor:
-                    entity = {
-                        "id": row["id"],
-                        "name": row["name"],
-                        "type": row["type"],
-                        "attributes": json.loads(row["attributes"]),
-                        "first_seen": row["first_seen"],
-                        "last_seen": row["last_seen"],
-                        "relationships": {}
-                    }
-                    
-                    if row["relationships"]:
-                        for rel in row["relationships"].split(","):
-                            rel_type, rel_id = rel.split(":")
-                            if rel_type not in entity["relationships"]:
-                                entity["relationships"][rel_type] = []
-                            entity["relationships"][rel_type].append(rel_id)
-                            
-                    entities.append(entity)
+                    if entity is None or entity["id"] != row["id"]:
+                        entity = {
+                            "id": row["id"],
+                            "name": row["name"],
+                            "type": row["type"],
+                            "attributes": json.loads(row["attributes"]),
+                            "first_seen": row["first_seen"],
+                            "last_seen": row["last_seen"],
+                            "relationships": {}
+                        }
+                        entities.append(entity)
+                    if row["relationship_type"] is not None:
+                        entity["relationships"].setdefault(row["relationship_type"], []).append(
+                            row["related_entity_id"]
+                        )
                     
-                self.logger.debug(f"Loaded {len(entities)} entities for user {user_id}")
+                self.logger.debug("Loaded %s entities for user %s", len(entities), user_id)
                 return entities
                 
         except Exception as e:
@@ -182,19 +447,25 @@ class SQLiteStore:
 
     def add_memory(self, user_id: str, memory_entry: Dict):
         """Add a new memory entry to the database"""
-        try:
-            self.logger.debug(f"Adding memory to SQLite DB at {self.db_path}")
-            self.logger.debug(f"Memory entry: {json.dumps(memory_entry, indent=2)}")
+        self.logger.debug("Adding memory to SQLite DB at %s", self.db_path)
+        self.logger.debug("Memory entry: %s", LazyJSON(self._loggable(memory_entry)), extra=SAMPLED)
+        self.add_memories(user_id, [memory_entry])
+
+    @timed_method("insert")
+    def add_memories(self, user_id: str, memory_entries: List[Dict]) -> List[str]:
+        """Insert memories and their associations in a single transaction
+
+        Returns the inserted memory ids in input order.
+        """
+        if not memory_entries:
+            return []
             
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO memories 
-                    (id, user_id, memory_type, entity_id, content, confidence,
-                    importance_score, source, created_at, last_accessed, access_count,
-                    marked_for_deletion, processed)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, 0)
-                """, (
+        try:
+            memory_rows = []
+            association_rows = []
+            for memory_entry in memory_entries:
+                embedding = memory_entry.get("embedding")
+                memory_rows.append((
                     memory_entry["id"],
                     user_id,
                     memory_entry.get("memory_type", "semantic").lower(),
@@ -205,31 +476,50 @@ class SQLiteStore:
                     memory_entry.get("source", "direct"),
                     memory_entry.get("created_at"),
                     memory_entry.get("last_accessed"),
-                    memory_entry.get("access_count", 0)
+                    memory_entry.get("access_count", 0),
+                    self._encode_embedding(embedding) if embedding is not None else None,
+                    memory_entry.get("importance_score", 0.0)
                 ))
+                for assoc_id in memory_entry.get("associations") or []:
+                    association_rows.append((memory_entry["id"], assoc_id))
+                    
+            with self._connect() as conn:
+                conn.executemany("""
+                    INSERT INTO memories 
+                    (id, user_id, memory_type, entity_id, content, confidence,
+                    importance_score, source, created_at, last_accessed, access_count,
+                    embedding, base_importance, marked_for_deletion, processed)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, 0)
+                """, memory_rows)
                 
                 # Add associations if any
-                if memory_entry.get("associations"):
-                    for assoc_id in memory_entry["associations"]:
-                        cursor.execute("""
-                            INSERT OR IGNORE INTO memory_associations
-                            (memory_id, associated_memory_id)
-                            VALUES (?, ?)
-                        """, (memory_entry["id"], assoc_id))
-                        
-                self.logger.debug(f"Memory added with ID: {memory_entry['id']}")
-                self.logger.debug(f"Row count: {cursor.rowcount}")
-                
-            # Verify the memory was written
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM memories WHERE id = ?", (memory_entry["id"],))
-                result = cursor.fetchone()
-                self.logger.debug(f"Verification read: {result}")
+                if association_rows:
+                    conn.executemany("""
+                        INSERT OR IGNORE INTO memory_associations
+                        (memory_id, associated_memory_id)
+                        VALUES (?, ?)
+                    """, association_rows)
+                    
+                memory_ids = [row[0] for row in memory_rows]
+                self.logger.debug("Added %s memories, %s associations", len(memory_ids), len(association_rows))
+                
+                # Optionally verify the memories were written
+                if self.verify_writes:
+                    found = conn.execute(
+                        f"SELECT COUNT(*) FROM memories WHERE id IN ({','.join('?' * len(memory_ids))})",
+                        memory_ids
+                    ).fetchone()[0]
+                    self.logger.debug("Verification read: %s/%s memories present", found, len(memory_ids))
+                    
+            for memory_entry in memory_entries:
+                if memory_entry.get("embedding") is not None:
+                    self._index_embedding(user_id, memory_entry["id"], memory_entry["embedding"])
+                    
+            return memory_ids
                 
         except Exception as e:
-            self.logger.error(f"Error adding memory: {str(e)}")
-            self.logger.error(f"Memory entry: {memory_entry}")
+            self.logger.error(f"Error adding memories: {str(e)}")
+            self.logger.error(f"Memory ids: {[entry.get('id') for entry in memory_entries]}")
             self.logger.error(f"Traceback: {traceback.format_exc()}")
             raise
 
@@ -253,6 +543,7 @@ class SQLiteStore:
             
         return memory_dict
   
+    @timed_method("search")
     def search_memories(
         self,
         user_id: str,
@@ -264,9 +555,37 @@ class SQLiteStore:
             self.logger.debug("="*50)
             self.logger.debug("[DB_SEARCH] Starting memory search")
             
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                
+            match = self._build_fts_query(entity_ids) if entity_ids and self._fts_enabled else None
+            
+            with self._connect() as conn:
+                if match:
+                    # Ranked full-text search: bm25 first (entity_id weighted higher),
+                    # then importance and recency as tie-breakers
+                    query = """
+                        SELECT m.*, GROUP_CONCAT(ma.associated_memory_id) as associations
+                        FROM (
+                            SELECT rowid, rank
+                            FROM memories_fts
+                            WHERE memories_fts MATCH ? AND rank MATCH 'bm25(1.0, 2.0)'
+                        ) hits
+                        JOIN memories m ON m.rowid = hits.rowid
+                        LEFT JOIN memory_associations ma ON m.id = ma.memory_id
+                        WHERE m.user_id = ?
+                        AND m.marked_for_deletion = 0
+                        GROUP BY m.id
+                        ORDER BY hits.rank, m.importance_score DESC, m.last_accessed DESC
+                        LIMIT ?
+                    """
+                    params = [match, user_id, max_results]
+                    
+                    self.logger.debug("[DB_SEARCH] FTS match: %s", match, extra=SAMPLED)
+                    
+                    cursor = conn.execute(query, params)
+                    results = [self._row_to_dict(row) for row in cursor]
+                    
+                    self.logger.debug("[DB_SEARCH] Found %s results", len(results))
+                    return results
+                    
                 # Base query with content search
                 query = """
                     SELECT DISTINCT m.*, GROUP_CONCAT(ma.associated_memory_id) as associations
@@ -298,13 +617,13 @@ class SQLiteStore:
                 """
                 params.append(max_results)
                 
-                self.logger.debug(f"[DB_SEARCH] Query: {query}")
-                self.logger.debug(f"[DB_SEARCH] Params: {params}")
+                self.logger.debug("[DB_SEARCH] Query: %s", query, extra=SAMPLED)
+                self.logger.debug("[DB_SEARCH] Params: %s", params, extra=SAMPLED)
                 
                 cursor = conn.execute(query, params)
                 results = [self._row_to_dict(row) for row in cursor]
                 
-                self.logger.debug(f"[DB_SEARCH] Found {len(results)} results")
+                self.logger.debug("[DB_SEARCH] Found %s results", len(results))
                 return results
                 
         except Exception as e:
@@ -325,7 +644,7 @@ class SQLiteStore:
                 "errors": []
             }
             
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 # Check if database is locked
                 self.logger.debug("[DB_VERIFY] Checking database lock status")
                 cursor = conn.execute("PRAGMA busy_timeout")
@@ -346,7 +665,7 @@ class SQLiteStore:
                         "columns": [col[1] for col in columns],
                         "row_count": conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
                     }
-                    self.logger.debug(f"[DB_VERIFY] Table {table}: {json.dumps(results['tables'][table], indent=2)}")
+                    self.logger.debug("[DB_VERIFY] Table %s: %s", table, LazyJSON(results['tables'][table]))
                 
                 # Check indices
                 self.logger.debug("[DB_VERIFY] Checking indices")
@@ -356,7 +675,7 @@ class SQLiteStore:
                         "table": idx[2],
                         "sql": idx[4]
                     }
-                    self.logger.debug(f"[DB_VERIFY] Index {idx[1]}: {json.dumps(results['indices'][idx[1]], indent=2)}")
+                    self.logger.debug("[DB_VERIFY] Index %s: %s", idx[1], LazyJSON(results['indices'][idx[1]]))
                 
                 # Verify foreign key constraints
                 self.logger.debug("[DB_VERIFY] Checking foreign key constraints")
@@ -367,7 +686,7 @@ class SQLiteStore:
                     self.logger.error(f"[DB_VERIFY] Foreign key violations: {fk_violations}")
                     
             self.logger.debug("[DB_VERIFY] Database verification complete")
-            self.logger.debug(f"[DB_VERIFY] Results: {json.dumps(results, indent=2)}")
+            self.logger.debug("[DB_VERIFY] Results: %s", LazyJSON(results))
             return results
             
         except Exception as e:
@@ -380,13 +699,14 @@ class SQLiteStore:
         try:
             self.logger.debug("="*50)
             self.logger.debug("[MEM_ANALYZE] Starting memory distribution analysis")
-            self.logger.debug(f"[MEM_ANALYZE] User ID: {user_id}")
+            self.logger.debug("[MEM_ANALYZE] User ID: %s", user_id)
             
             stats = {
                 "total_memories": 0,
                 "by_type": {},
                 "by_confidence": {},
                 "by_source": {},
+                "by_entity": {},
                 "by_importance": {
                     "high": 0,    # 0.8-1.0
                     "medium": 0,  # 0.4-0.7
@@ -399,13 +719,11 @@ class SQLiteStore:
                 }
             }
             
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                
+            with self._connect() as conn:
                 # Get total count
                 cursor = conn.execute("SELECT COUNT(*) FROM memories WHERE user_id = ?", (user_id,))
                 stats["total_memories"] = cursor.fetchone()[0]
-                self.logger.debug(f"[MEM_ANALYZE] Total memories: {stats['total_memories']}")
+                self.logger.debug("[MEM_ANALYZE] Total memories: %s", stats['total_memories'])
                 
                 # Analyze by type
                 cursor = conn.execute("""
@@ -416,7 +734,7 @@ class SQLiteStore:
                 """, (user_id,))
                 for row in cursor:
                     stats["by_type"][row["memory_type"]] = row["count"]
-                self.logger.debug(f"[MEM_ANALYZE] Distribution by type: {stats['by_type']}")
+                self.logger.debug("[MEM_ANALYZE] Distribution by type: %s", stats['by_type'])
                 
                 # Analyze by confidence
                 cursor = conn.execute("""
@@ -427,19 +745,43 @@ class SQLiteStore:
                 """, (user_id,))
                 for row in cursor:
                     stats["by_confidence"][str(row["confidence"])] = row["count"]
-                self.logger.debug(f"[MEM_ANALYZE] Distribution by confidence: {stats['by_confidence']}")
+                self.logger.debug("[MEM_ANALYZE] Distribution by confidence: %s", stats['by_confidence'])
                 
-                # Analyze importance scores
-                cursor = conn.execute("SELECT importance_score FROM memories WHERE user_id = ?", (user_id,))
+                # Analyze by source
+                cursor = conn.execute("""
+                    SELECT source, COUNT(*) as count 
+                    FROM memories 
+                    WHERE user_id = ? 
+                    GROUP BY source
+                """, (user_id,))
                 for row in cursor:
-                    score = row["importance_score"]
-                    if score >= 0.8:
-                        stats["by_importance"]["high"] += 1
-                    elif score >= 0.4:
-                        stats["by_importance"]["medium"] += 1
-                    else:
-                        stats["by_importance"]["low"] += 1
-                self.logger.debug(f"[MEM_ANALYZE] Distribution by importance: {stats['by_importance']}")
+                    stats["by_source"][str(row["source"])] = row["count"]
+                self.logger.debug("[MEM_ANALYZE] Distribution by source: %s", stats['by_source'])
+                
+                # Analyze by entity
+                cursor = conn.execute("""
+                    SELECT entity_id, COUNT(*) as count 
+                    FROM memories 
+                    WHERE user_id = ? AND entity_id IS NOT NULL
+                    GROUP BY entity_id
+                """, (user_id,))
+                for row in cursor:
+                    stats["by_entity"][row["entity_id"]] = row["count"]
+                self.logger.debug("[MEM_ANALYZE] Distinct entities: %s", len(stats['by_entity']))
+                
+                # Analyze importance scores
+                row = conn.execute("""
+                    SELECT
+                        COUNT(*) FILTER (WHERE importance_score >= 0.8) as high,
+                        COUNT(*) FILTER (WHERE importance_score >= 0.4 AND importance_score < 0.8) as medium,
+                        COUNT(*) FILTER (WHERE importance_score < 0.4 OR importance_score IS NULL) as low
+                    FROM memories
+                    WHERE user_id = ?
+                """, (user_id,)).fetchone()
+                stats["by_importance"]["high"] = row["high"]
+                stats["by_importance"]["medium"] = row["medium"]
+                stats["by_importance"]["low"] = row["low"]
+                self.logger.debug("[MEM_ANALYZE] Distribution by importance: %s", stats['by_importance'])
                 
                 # Analyze access patterns
                 now = datetime.now(timezone.utc)
@@ -458,7 +800,7 @@ class SQLiteStore:
                 stats["access_patterns"]["recently_accessed"] = row["recent"]
                 stats["access_patterns"]["frequently_accessed"] = row["frequent"]
                 
-                self.logger.debug(f"[MEM_ANALYZE] Access patterns: {stats['access_patterns']}")
+                self.logger.debug("[MEM_ANALYZE] Access patterns: %s", stats['access_patterns'])
                 
             return stats
             
@@ -472,7 +814,7 @@ class SQLiteStore:
         try:
             self.logger.debug("="*50)
             self.logger.debug("[MEM_VERIFY] Starting memory persistence verification")
-            self.logger.debug(f"[MEM_VERIFY] Memory ID: {memory_id}")
+            self.logger.debug("[MEM_VERIFY] Memory ID: %s", memory_id)
             
             results = {
                 "exists": False,
@@ -482,9 +824,7 @@ class SQLiteStore:
                 "issues": []
             }
             
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                
+            with self._connect() as conn:
                 # Check main memory entry
                 cursor = conn.execute("""
                     SELECT * FROM memories WHERE id = ?
@@ -495,7 +835,7 @@ class SQLiteStore:
                     results["exists"] = True
                     memory_dict = self._row_to_dict(row)
                     results["data"] = memory_dict
-                    self.logger.debug(f"[MEM_VERIFY] Memory found: {json.dumps(memory_dict, indent=2)}")
+                    self.logger.debug("[MEM_VERIFY] Memory found: %s", LazyJSON(memory_dict))
                     
                     # Verify content JSON
                     try:
@@ -514,7 +854,7 @@ class SQLiteStore:
                         WHERE memory_id = ?
                     """, (memory_id,))
                     results["associations"] = [row[0] for row in cursor]
-                    self.logger.debug(f"[MEM_VERIFY] Found {len(results['associations'])} associations")
+                    self.logger.debug("[MEM_VERIFY] Found %s associations", len(results['associations']))
                     
                     # Verify required fields
                     required_fields = ["memory_type", "content", "confidence", "created_at"]
@@ -526,7 +866,7 @@ class SQLiteStore:
                 else:
                     self.logger.warning(f"[MEM_VERIFY] Memory {memory_id} not found")
                     
-            self.logger.debug(f"[MEM_VERIFY] Verification results: {json.dumps(results, indent=2)}")
+            self.logger.debug("[MEM_VERIFY] Verification results: %s", LazyJSON(results))
             return results
             
         except Exception as e:
@@ -539,8 +879,8 @@ class SQLiteStore:
         try:
             self.logger.debug("="*50)
             self.logger.debug("[MEM_CHECK] Starting memory retrieval check")
-            self.logger.debug(f"[MEM_CHECK] User ID: {user_id}")
-            self.logger.debug(f"[MEM_CHECK] Query params: {query_params}")
+            self.logger.debug("[MEM_CHECK] User ID: %s", user_id)
+            self.logger.debug("[MEM_CHECK] Query params: %s", query_params)
             
             results = {
                 "queries": {},
@@ -548,9 +888,7 @@ class SQLiteStore:
                 "issues": []
             }
             
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                
+            with self._connect() as conn:
                 # Test entity-based retrieval
                 start_time = time.time()
                 if query_params.get("entity_ids"):
@@ -591,9 +929,9 @@ class SQLiteStore:
                     plan = cursor.fetchall()
                     if not any("USING INDEX" in str(row) for row in plan):
                         results["issues"].append(f"Index not used for {query_type} query")
-                    self.logger.debug(f"[MEM_CHECK] Query plan for {query_type}: {plan}")
+                    self.logger.debug("[MEM_CHECK] Query plan for %s: %s", query_type, plan)
                 
-            self.logger.debug(f"[MEM_CHECK] Check results: {json.dumps(results, indent=2)}")
+            self.logger.debug("[MEM_CHECK] Check results: %s", LazyJSON(results))
             return results
             
         except Exception as e:
@@ -606,7 +944,7 @@ class SQLiteStore:
         try:
             self.logger.debug("="*50)
             self.logger.debug("[MEM_DIAG] Starting memory system diagnostics")
-            self.logger.debug(f"[MEM_DIAG] User ID: {user_id}")
+            self.logger.debug("[MEM_DIAG] User ID: %s", user_id)
             
             diagnostics = {
                 "database": {},
@@ -642,7 +980,7 @@ class SQLiteStore:
                 diagnostics["issues"].extend(retrieval_test["issues"])
                 
             # Check for common issues
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 # Check for orphaned associations
                 cursor = conn.execute("""
                     SELECT COUNT(*) FROM memory_associations ma 
@@ -665,7 +1003,7 @@ class SQLiteStore:
                 if duplicates:
                     diagnostics["issues"].append(f"Found {len(duplicates)} duplicate memories")
                     
-            self.logger.debug(f"[MEM_DIAG] Diagnostic results: {json.dumps(diagnostics, indent=2)}")
+            self.logger.debug("[MEM_DIAG] Diagnostic results: %s", LazyJSON(diagnostics))
             return diagnostics
             
         except Exception as e:
@@ -673,17 +1011,18 @@ class SQLiteStore:
             self.logger.error(f"[MEM_DIAG] Traceback: {traceback.format_exc()}")
             return {"error": str(e)}
 
+    @timed_method("update")
     def update_memory(self, user_id: str, memory_id: str, memory_data: Dict):
         """Update an existing memory entry"""
         try:
             self.logger.debug("="*50)
             self.logger.debug("[MEM_UPDATE] Starting memory update")
-            self.logger.debug(f"[MEM_UPDATE] User ID: {user_id}")
-            self.logger.debug(f"[MEM_UPDATE] Memory ID: {memory_id}")
-            self.logger.debug(f"[MEM_UPDATE] Update data: {json.dumps(memory_data, indent=2)}")
+            self.logger.debug("[MEM_UPDATE] User ID: %s", user_id)
+            self.logger.debug("[MEM_UPDATE] Memory ID: %s", memory_id)
+            self.logger.debug("[MEM_UPDATE] Update data: %s", LazyJSON(self._loggable(memory_data)), extra=SAMPLED)
             
             # First verify memory exists and belongs to user
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.execute(
                     "SELECT * FROM memories WHERE id = ? AND user_id = ?", 
                     (memory_id, user_id)
@@ -696,8 +1035,6 @@ class SQLiteStore:
                     self.logger.error(f"[MEM_UPDATE] User ID: {user_id}")
                     raise ValueError("Memory not found or unauthorized")
                     
-                self.logger.debug("[MEM_UPDATE] Found existing memory:")
-                self.logger.debug(f"[MEM_UPDATE] Existing data: {existing}")
                 
                 # Prepare update data
                 update_fields = []
@@ -705,27 +1042,38 @@ class SQLiteStore:
                 
                 if "content" in memory_data:
                     self.logger.debug("[MEM_UPDATE] Updating content field")
-                    self.logger.debug(f"[MEM_UPDATE] New content: {json.dumps(memory_data['content'], indent=2)}")
+                    self.logger.debug("[MEM_UPDATE] New content: %s", LazyJSON(memory_data['content']), extra=SAMPLED)
                     update_fields.append("content = ?")
                     update_values.append(json.dumps(memory_data["content"]))
                     
                 if "last_accessed" in memory_data:
                     self.logger.debug("[MEM_UPDATE] Updating last_accessed field")
-                    self.logger.debug(f"[MEM_UPDATE] New last_accessed: {memory_data['last_accessed']}")
+                    self.logger.debug("[MEM_UPDATE] New last_accessed: %s", memory_data['last_accessed'])
                     update_fields.append("last_accessed = ?")
                     update_values.append(memory_data["last_accessed"])
                     
                 if "access_count" in memory_data:
                     self.logger.debug("[MEM_UPDATE] Updating access_count field")
-                    self.logger.debug(f"[MEM_UPDATE] New access_count: {memory_data['access_count']}")
+                    self.logger.debug("[MEM_UPDATE] New access_count: %s", memory_data['access_count'])
                     update_fields.append("access_count = ?")
                     update_values.append(memory_data["access_count"])
                     
                 if "importance_score" in memory_data:
                     self.logger.debug("[MEM_UPDATE] Updating importance_score field")
-                    self.logger.debug(f"[MEM_UPDATE] New importance_score: {memory_data['importance_score']}")
+                    self.logger.debug("[MEM_UPDATE] New importance_score: %s", memory_data['importance_score'])
                     update_fields.append("importance_score = ?")
                     update_values.append(memory_data["importance_score"])
+                    # An explicit score becomes the new baseline for decay
+                    update_fields.append("base_importance = ?")
+                    update_values.append(memory_data["importance_score"])
+                    
+                if "embedding" in memory_data:
+                    self.logger.debug("[MEM_UPDATE] Updating embedding field")
+                    update_fields.append("embedding = ?")
+                    update_values.append(
+                        self._encode_embedding(memory_data["embedding"])
+                        if memory_data["embedding"] is not None else None
+                    )
                     
                 # Execute update
                 if update_fields:
@@ -737,17 +1085,24 @@ class SQLiteStore:
                     update_values.extend([memory_id, user_id])
                     
                     self.logger.debug("[MEM_UPDATE] Executing update query:")
-                    self.logger.debug(f"[MEM_UPDATE] Query: {query}")
-                    self.logger.debug(f"[MEM_UPDATE] Values: {update_values}")
+                    self.logger.debug("[MEM_UPDATE] Query: %s", query)
+                    self.logger.debug("[MEM_UPDATE] Values: %s", update_values)
                     
                     cursor.execute(query, update_values)
-                    self.logger.debug(f"[MEM_UPDATE] Rows affected: {cursor.rowcount}")
+                    self.logger.debug("[MEM_UPDATE] Rows affected: %s", cursor.rowcount)
                     
-                    # Verify update
-                    cursor.execute("SELECT * FROM memories WHERE id = ?", (memory_id,))
-                    updated = cursor.fetchone()
-                    self.logger.debug("[MEM_UPDATE] Verification after update:")
-                    self.logger.debug(f"[MEM_UPDATE] Updated data: {updated}")
+                    # Optionally verify update
+                    if self.verify_writes:
+                        cursor.execute("SELECT * FROM memories WHERE id = ?", (memory_id,))
+                        updated = cursor.fetchone()
+                        self.logger.debug("[MEM_UPDATE] Verification after update:")
+                        self.logger.debug("[MEM_UPDATE] Updated data: %s", dict(updated) if updated else None)
+                    
+            if "embedding" in memory_data:
+                if memory_data["embedding"] is not None:
+                    self._index_embedding(user_id, memory_id, memory_data["embedding"])
+                else:
+                    self._unindex_embedding(user_id, memory_id)
                     
             self.logger.debug("[MEM_UPDATE] Memory update complete")
             self.logger.debug("="*50)
@@ -764,27 +1119,21 @@ class SQLiteStore:
         try:
             self.logger.debug("="*50)
             self.logger.debug("[ENTITY_GET] Starting entity retrieval")
-            self.logger.debug(f"[ENTITY_GET] User ID: {user_id}")
-            self.logger.debug(f"[ENTITY_GET] Entity ID: {entity_id}")
+            self.logger.debug("[ENTITY_GET] User ID: %s", user_id)
+            self.logger.debug("[ENTITY_GET] Entity ID: %s", entity_id)
             
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                
+            with self._connect() as conn:
                 # Get entity data
                 self.logger.debug("[ENTITY_GET] Executing entity query")
-                cursor = conn.execute("""
-                    SELECT e.*, GROUP_CONCAT(er.relationship_type || ':' || er.related_entity_id) as relationships
-                    FROM entities e
-                    LEFT JOIN entity_relationships er ON e.id = er.entity_id
-                    WHERE e.id = ? AND e.user_id = ?
-                    GROUP BY e.id
-                """, (entity_id, user_id))
+                cursor = conn.execute(
+                    "SELECT * FROM entities WHERE id = ? AND user_id = ?",
+                    (entity_id, user_id)
+                )
                 
                 row = cursor.fetchone()
                 
                 if row:
                     self.logger.debug("[ENTITY_GET] Entity found")
-                    self.logger.debug(f"[ENTITY_GET] Raw data: {dict(row)}")
                     
                     # Build entity dictionary
                     entity = {
@@ -794,21 +1143,11 @@ class SQLiteStore:
                         "attributes": json.loads(row["attributes"]),
                         "first_seen": row["first_seen"],
                         "last_seen": row["last_seen"],
-                        "relationships": {}
+                        "relationships": self.get_entity_adjacency(user_id, entity_id)["out"]
                     }
                     
-                    # Process relationships
-                    if row["relationships"]:
-                        self.logger.debug("[ENTITY_GET] Processing relationships")
-                        for rel in row["relationships"].split(","):
-                            rel_type, rel_id = rel.split(":")
-                            if rel_type not in entity["relationships"]:
-                                entity["relationships"][rel_type] = []
-                            entity["relationships"][rel_type].append(rel_id)
-                            self.logger.debug(f"[ENTITY_GET] Added relationship: {rel_type} -> {rel_id}")
-                    
                     self.logger.debug("[ENTITY_GET] Final entity data:")
-                    self.logger.debug(f"[ENTITY_GET] {json.dumps(entity, indent=2)}")
+                    self.logger.debug("[ENTITY_GET] %s", LazyJSON(entity))
                     return entity
                 else:
                     self.logger.debug("[ENTITY_GET] Entity not found")
@@ -825,10 +1164,10 @@ class SQLiteStore:
         try:
             self.logger.debug("="*50)
             self.logger.debug("[ENTITY_UPDATE] Starting entity update")
-            self.logger.debug(f"[ENTITY_UPDATE] User ID: {user_id}")
-            self.logger.debug(f"[ENTITY_UPDATE] Entity data: {json.dumps(entity_data, indent=2)}")
+            self.logger.debug("[ENTITY_UPDATE] User ID: %s", user_id)
+            self.logger.debug("[ENTITY_UPDATE] Entity data: %s", LazyJSON(entity_data))
             
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 # Verify entity exists
                 cursor = conn.execute(
                     "SELECT * FROM entities WHERE id = ? AND user_id = ?",
@@ -840,8 +1179,6 @@ class SQLiteStore:
                     self.logger.error("[ENTITY_UPDATE] Entity not found or unauthorized")
                     raise ValueError("Entity not found or unauthorized")
                     
-                self.logger.debug("[ENTITY_UPDATE] Found existing entity:")
-                self.logger.debug(f"[ENTITY_UPDATE] Existing data: {existing}")
                 
                 # Update entity
                 self.logger.debug("[ENTITY_UPDATE] Updating entity data")
@@ -858,12 +1195,21 @@ class SQLiteStore:
                     user_id
                 ))
                 
-                self.logger.debug(f"[ENTITY_UPDATE] Entity rows updated: {cursor.rowcount}")
+                self.logger.debug("[ENTITY_UPDATE] Entity rows updated: %s", cursor.rowcount)
                 
                 # Update relationships
                 if "relationships" in entity_data:
                     self.logger.debug("[ENTITY_UPDATE] Updating relationships")
                     
+                    # Old and new neighbours' incoming edges change too
+                    stale = {entity_data["id"]}
+                    stale.update(row[0] for row in cursor.execute(
+                        "SELECT related_entity_id FROM entity_relationships WHERE entity_id = ?",
+                        (entity_data["id"],)
+                    ))
+                    for related_ids in entity_data["relationships"].values():
+                        stale.update(related_ids)
+                    
                     # Remove old relationships
                     cursor.execute(
                         "DELETE FROM entity_relationships WHERE entity_id = ?",
@@ -873,24 +1219,28 @@ class SQLiteStore:
                     
                     # Add new relationships
                     for rel_type, related_ids in entity_data["relationships"].items():
-                        self.logger.debug(f"[ENTITY_UPDATE] Adding relationships of type: {rel_type}")
+                        self.logger.debug("[ENTITY_UPDATE] Adding relationships of type: %s", rel_type, extra=SAMPLED)
                         for related_id in related_ids:
                             cursor.execute("""
                                 INSERT INTO entity_relationships
                                 (entity_id, related_entity_id, relationship_type)
                                 VALUES (?, ?, ?)
                             """, (entity_data["id"], related_id, rel_type))
-                            self.logger.debug(f"[ENTITY_UPDATE] Added relationship: {rel_type} -> {related_id}")
+                            self.logger.debug("[ENTITY_UPDATE] Added relationship: %s -> %s", rel_type, related_id)
                             
-                # Verify update
-                cursor.execute(
-                    "SELECT * FROM entities WHERE id = ?",
-                    (entity_data["id"],)
-                )
-                updated = cursor.fetchone()
-                self.logger.debug("[ENTITY_UPDATE] Verification after update:")
-                self.logger.debug(f"[ENTITY_UPDATE] Updated data: {updated}")
+                # Optionally verify update
+                if self.verify_writes:
+                    cursor.execute(
+                        "SELECT * FROM entities WHERE id = ?",
+                        (entity_data["id"],)
+                    )
+                    updated = cursor.fetchone()
+                    self.logger.debug("[ENTITY_UPDATE] Verification after update:")
+                    self.logger.debug("[ENTITY_UPDATE] Updated data: %s", dict(updated) if updated else None)
                 
+            if "relationships" in entity_data:
+                self._invalidate_adjacency(user_id, stale)
+            
             self.logger.debug("[ENTITY_UPDATE] Entity update complete")
             self.logger.debug("="*50)
             
@@ -900,39 +1250,658 @@ class SQLiteStore:
             self.logger.error(f"[ENTITY_UPDATE] Traceback: {traceback.format_exc()}")
             raise
 
+    def get_entity_adjacency(self, user_id: str, entity_id: str) -> Dict[str, Dict[str, List[str]]]:
+        """Typed adjacency of one entity: {"out": {type: [ids]}, "in": {type: [ids]}}
+
+        Served from an in-process LRU; update_entity invalidates the entity
+        and every neighbour whose edges it touched. Callers get their own
+        copy and may modify it.
+        """
+        key = (user_id, entity_id)
+        with self._adjacency_lock:
+            cached = self._adjacency.get(key)
+            if cached is not None:
+                self._adjacency.move_to_end(key)
+                return self._copy_adjacency(cached)
+            generation = self._adjacency_generation
+        
+        adjacency = {"out": {}, "in": {}}
+        with self._connect() as conn:
+            rows = conn.execute("""
+                SELECT 'out' as direction, relationship_type, related_entity_id as other
+                FROM entity_relationships WHERE entity_id = ?
+                UNION ALL
+                SELECT 'in', relationship_type, entity_id
+                FROM entity_relationships WHERE related_entity_id = ?
+            """, (entity_id, entity_id)).fetchall()
+        for row in rows:
+            adjacency[row["direction"]].setdefault(row["relationship_type"], []).append(row["other"])
+        
+        with self._adjacency_lock:
+            # An invalidation during the SELECT may mean these edges are already stale
+            if generation == self._adjacency_generation:
+                self._adjacency[key] = adjacency
+                while len(self._adjacency) > ENTITY_ADJACENCY_CACHE_SIZE:
+                    self._adjacency.popitem(last=False)
+        return self._copy_adjacency(adjacency)
+
+    @staticmethod
+    def _copy_adjacency(adjacency: Dict) -> Dict:
+        return {
+            direction: {rel_type: list(ids) for rel_type, ids in by_type.items()}
+            for direction, by_type in adjacency.items()
+        }
+
+    def _invalidate_adjacency(self, user_id: str, entity_ids):
+        with self._adjacency_lock:
+            self._adjacency_generation += 1
+            for entity_id in entity_ids:
+                self._adjacency.pop((user_id, entity_id), None)
+
+    @staticmethod
+    def _entity_walk_sql(max_hops: int, relationship_types: Optional[List[str]], both_directions: bool):
+        """Recursive CTEs "walk(entity_id, depth)" and "reach(entity_id, depth)" from one start entity
+
+        walk is breadth-first with UNION, so each entity appears at most once
+        per depth; the work is bounded by max_hops * edges rather than by the
+        number of paths. reach keeps each entity's shortest distance. Returns
+        (sql, params, edge): params are the start id, max_hops and type
+        filter, and edge is a join condition (with its own type filter,
+        taking the same type params) between entity_relationships "er", a
+        parent "p" and a child "r", for recovering how an entity was reached.
+        """
+        if both_directions:
+            join = "er.entity_id = w.entity_id OR er.related_entity_id = w.entity_id"
+            next_id = "CASE WHEN er.entity_id = w.entity_id THEN er.related_entity_id ELSE er.entity_id END"
+            edge = """((er.entity_id = p.entity_id AND er.related_entity_id = r.entity_id)
+                    OR (er.related_entity_id = p.entity_id AND er.entity_id = r.entity_id))"""
+        else:
+            join = "er.entity_id = w.entity_id"
+            next_id = "er.related_entity_id"
+            edge = "er.entity_id = p.entity_id AND er.related_entity_id = r.entity_id"
+        
+        type_filter = ""
+        type_params: List = []
+        if relationship_types:
+            type_filter = f"AND er.relationship_type IN ({','.join('?' * len(relationship_types))})"
+            type_params = list(relationship_types)
+        
+        sql = f"""
+            WITH RECURSIVE walk(entity_id, depth) AS (
+                SELECT ?, 0
+                UNION
+                SELECT {next_id}, w.depth + 1
+                FROM walk w
+                JOIN entity_relationships er ON {join}
+                WHERE w.depth < ?
+                {type_filter}
+            ), reach AS (
+                SELECT entity_id, MIN(depth) as depth FROM walk GROUP BY entity_id
+            )
+        """
+        return sql, type_params, f"{edge} {type_filter}"
+
+    def get_entity_neighborhood(
+        self,
+        user_id: str,
+        entity_id: str,
+        max_hops: int = 2,
+        relationship_types: Optional[List[str]] = None,
+        both_directions: bool = True
+    ) -> List[Dict]:
+        """Entities within max_hops of entity_id, nearest first, in one query
+
+        Each result carries its hop distance plus the relationship type and
+        parent entity of the shortest path that reached it.
+        """
+        try:
+            walk, type_params, edge = self._entity_walk_sql(max_hops, relationship_types, both_directions)
+            with self._connect() as conn:
+                # A parent one hop closer is always there; MIN(parent) picks one, and via comes from its row
+                rows = conn.execute(walk + f"""
+                    SELECT e.id, e.name, e.type, r.depth, er.relationship_type as via, MIN(p.entity_id) as parent
+                    FROM reach r
+                    JOIN entities e ON e.id = r.entity_id AND e.user_id = ?
+                    JOIN reach p ON p.depth = r.depth - 1
+                    JOIN entity_relationships er ON {edge}
+                    WHERE r.depth > 0
+                    GROUP BY e.id
+                    ORDER BY r.depth, e.name
+                """, [entity_id, max_hops] + type_params + [user_id] + type_params).fetchall()
+            
+            neighborhood = [dict(row) for row in rows]
+            self.logger.debug("[ENTITY_GRAPH] %s entities within %s hops of %s", len(neighborhood), max_hops, entity_id)
+            return neighborhood
+            
+        except Exception as e:
+            self.logger.error(f"[ENTITY_GRAPH] Error walking entity graph: {str(e)}")
+            self.logger.error(f"[ENTITY_GRAPH] Traceback: {traceback.format_exc()}")
+            return []
+
+    def get_neighborhood_memories(
+        self,
+        user_id: str,
+        entity_id: str,
+        max_hops: int = 1,
+        max_results: int = 10,
+        relationship_types: Optional[List[str]] = None,
+        both_directions: bool = True
+    ) -> List[Dict]:
+        """Memories about an entity and the entities around it, in one query
+
+        Memories reference entities by id or by name. Results are ordered by
+        hop distance, then importance and recency, and carry "hop" and
+        "via_entity".
+        """
+        try:
+            walk, type_params, _ = self._entity_walk_sql(max_hops, relationship_types, both_directions)
+            with self._connect() as conn:
+                rows = conn.execute(walk + """
+                    , keys AS (
+                        SELECT r.entity_id as entity_key, r.entity_id as via_entity, r.depth FROM reach r
+                        UNION
+                        SELECT e.name, e.id, r.depth
+                        FROM reach r JOIN entities e ON e.id = r.entity_id AND e.user_id = ?
+                    )
+                    SELECT m.*, MIN(k.depth) as hop, k.via_entity
+                    FROM keys k
+                    JOIN memories m ON m.entity_id = k.entity_key
+                    WHERE m.user_id = ? AND m.marked_for_deletion = 0
+                    GROUP BY m.id
+                    ORDER BY hop, m.importance_score DESC, m.last_accessed DESC
+                    LIMIT ?
+                """, [entity_id, max_hops] + type_params + [user_id, user_id, max_results]).fetchall()
+            
+            memories = []
+            for row in rows:
+                memory = self._row_to_dict(row)
+                memory["hop"] = row["hop"]
+                memory["via_entity"] = row["via_entity"]
+                memories.append(memory)
+            self.logger.debug("[ENTITY_GRAPH] %s memories within %s hops of %s", len(memories), max_hops, entity_id)
+            return memories
+            
+        except Exception as e:
+            self.logger.error(f"[ENTITY_GRAPH] Error loading neighborhood memories: {str(e)}")
+            self.logger.error(f"[ENTITY_GRAPH] Traceback: {traceback.format_exc()}")
+            return []
+
+    def touch_memories(
+        self,
+        user_id: str,
+        memory_ids: List[str],
+        accessed_at: Optional[str] = None,
+        defer: bool = False
+    ) -> int:
+        """Record an access for each memory in one transaction
+
+        Bumps access_count and sets last_accessed. With defer=True the
+        update is queued and written by a background flusher instead, so the
+        caller never waits on the database.
+        """
+        if not memory_ids:
+            return 0
+        accessed_at = accessed_at or datetime.now(timezone.utc).isoformat()
+        
+        if defer:
+            with self._touch_lock:
+                pending = self._pending_touches.setdefault(user_id, {})
+                for memory_id in memory_ids:
+                    count, _ = pending.get(memory_id, (0, None))
+                    pending[memory_id] = (count + 1, accessed_at)
+            self._ensure_touch_flusher()
+            self._touch_wakeup.set()
+            return len(memory_ids)
+            
+        counts = {}
+        for memory_id in memory_ids:
+            counts[memory_id] = counts.get(memory_id, 0) + 1
+        return self._apply_touches(
+            user_id,
+            {memory_id: (count, accessed_at) for memory_id, count in counts.items()}
+        )
+
+    @timed_method("touch")
+    def _apply_touches(self, user_id: str, touches: Dict[str, tuple]) -> int:
+        try:
+            with self._connect() as conn:
+                cursor = conn.executemany("""
+                    UPDATE memories
+                    SET last_accessed = ?, access_count = access_count + ?
+                    WHERE id = ? AND user_id = ?
+                """, [
+                    (accessed_at, count, memory_id, user_id)
+                    for memory_id, (count, accessed_at) in touches.items()
+                ])
+                self.logger.debug("[MEM_TOUCH] Updated access for %s memories", cursor.rowcount)
+                return cursor.rowcount
+                
+        except Exception as e:
+            self.logger.error(f"[MEM_TOUCH] Error updating access patterns: {str(e)}")
+            self.logger.error(f"[MEM_TOUCH] Traceback: {traceback.format_exc()}")
+            raise
+
+    def flush_touches(self) -> int:
+        """Write all deferred access updates now"""
+        with self._touch_lock:
+            pending, self._pending_touches = self._pending_touches, {}
+            
+        flushed = 0
+        for user_id, touches in pending.items():
+            try:
+                flushed += self._apply_touches(user_id, touches)
+            except Exception:
+                # Already logged; dropping access stats is preferable to crashing the flusher
+                continue
+        return flushed
+
+    def _ensure_touch_flusher(self):
+        if self._touch_flusher is not None and self._touch_flusher.is_alive():
+            return
+        with self._touch_lock:
+            if self._touch_flusher is not None and self._touch_flusher.is_alive():
+                return
+            self._touch_flusher = threading.Thread(
+                target=self._touch_flush_loop,
+                name="sqlite-touch-flusher",
+                daemon=True
+            )
+            self._touch_flusher.start()
+
+    def _touch_flush_loop(self):
+        while True:
+            self._touch_wakeup.wait()
+            self._touch_wakeup.clear()
+            # Let a burst of retrievals coalesce into one transaction
+            time.sleep(TOUCH_FLUSH_INTERVAL_SECS)
+            self.flush_touches()
+
+    def get_cached_entities(self, content_hash: str, min_created_at: float) -> Optional[List[str]]:
+        """Return a persisted entity extraction newer than min_created_at"""
+        try:
+            with self._connect() as conn:
+                row = conn.execute("""
+                    SELECT entities FROM entity_extraction_cache
+                    WHERE content_hash = ? AND created_at >= ?
+                """, (content_hash, min_created_at)).fetchone()
+                if row is None:
+                    return None
+                conn.execute(
+                    "UPDATE entity_extraction_cache SET last_used = ? WHERE content_hash = ?",
+                    (time.time(), content_hash)
+                )
+                return json.loads(row["entities"])
+                
+        except Exception as e:
+            self.logger.error(f"[ENTITY_CACHE] Error reading cache: {str(e)}")
+            return None
+
+    def put_cached_entities(self, content_hash: str, entities: List[str], max_entries: int):
+        """Persist an entity extraction, evicting least recently used rows past max_entries"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO entity_extraction_cache
+                (content_hash, entities, created_at, last_used)
+                VALUES (?, ?, ?, ?)
+            """, (content_hash, json.dumps(entities), now, now))
+            conn.execute("""
+                DELETE FROM entity_extraction_cache WHERE content_hash IN (
+                    SELECT content_hash FROM entity_extraction_cache
+                    ORDER BY last_used DESC
+                    LIMIT -1 OFFSET ?
+                )
+            """, (max_entries,))
+
+    def get_gazetteer_terms(self, user_id: str) -> List[str]:
+        """Known entity names and memory entity ids for a user"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute("""
+                    SELECT name FROM entities WHERE user_id = ?
+                    UNION
+                    SELECT DISTINCT entity_id FROM memories
+                    WHERE user_id = ? AND marked_for_deletion = 0 AND entity_id IS NOT NULL
+                """, (user_id, user_id))
+                return [row[0] for row in cursor]
+                
+        except Exception as e:
+            self.logger.error(f"[ENTITY_CACHE] Error loading gazetteer terms: {str(e)}")
+            return []
+
+    def delete_memory(self, user_id: str, memory_id: str) -> bool:
+        """Soft-delete a memory by marking it for deletion"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute("""
+                    UPDATE memories SET marked_for_deletion = 1
+                    WHERE id = ? AND user_id = ?
+                """, (memory_id, user_id))
+                deleted = cursor.rowcount > 0
+                
+            self._unindex_embedding(user_id, memory_id)
+            self.logger.debug("[MEM_DELETE] Memory %s marked for deletion: %s", memory_id, deleted)
+            return deleted
+            
+        except Exception as e:
+            self.logger.error(f"[MEM_DELETE] Error deleting memory: {str(e)}")
+            self.logger.error(f"[MEM_DELETE] Traceback: {traceback.format_exc()}")
+            raise
+
+    @timed_method("vector_search")
+    def search_memories_by_vector(self, user_id: str, query_vec, k: int = 10) -> List[Dict]:
+        """Return the k memories whose embeddings are most cosine-similar to query_vec"""
+        try:
+            self.logger.debug("[VEC_SEARCH] Starting vector search")
+            index = self._get_vector_index(user_id)
+            hits = index.search(query_vec, k)
+            self.logger.debug("[VEC_SEARCH] Index size: %s, hits: %s", len(index), len(hits))
+            if not hits:
+                return []
+                
+            scores = dict(hits)
+            with self._connect() as conn:
+                cursor = conn.execute(f"""
+                    SELECT * FROM memories
+                    WHERE user_id = ? AND marked_for_deletion = 0
+                    AND id IN ({','.join('?' * len(hits))})
+                """, [user_id] + [memory_id for memory_id, _ in hits])
+                results = []
+                for row in cursor:
+                    memory = self._row_to_dict(row)
+                    memory["similarity"] = scores[row["id"]]
+                    results.append(memory)
+                    
+            results.sort(key=lambda m: m["similarity"], reverse=True)
+            return results
+            
+        except Exception as e:
+            self.logger.error(f"[VEC_SEARCH] Error: {str(e)}")
+            self.logger.error(traceback.format_exc())
+            return []
+
+    def _get_vector_index(self, user_id: str) -> VectorIndex:
+        """Return the user's embedding index, loading it from the database on first use"""
+        with self._vector_lock:
+            index = self._vector_indexes.get(user_id)
+            if index is not None:
+                return index
+                
+            with self._connect() as conn:
+                rows = conn.execute("""
+                    SELECT id, embedding FROM memories
+                    WHERE user_id = ? AND marked_for_deletion = 0 AND embedding IS NOT NULL
+                """, (user_id,)).fetchall()
+            index = VectorIndex.from_blobs([(row[0], row[1]) for row in rows])
+                
+            self._vector_indexes[user_id] = index
+            if index.skipped:
+                self.logger.warning(
+                    f"[VEC_INDEX] Left {index.skipped} embeddings out of the {index.dim}-dim index "
+                    f"for user {user_id} (undecodable or a different dimension)"
+                )
+            self.logger.debug("[VEC_INDEX] Loaded %s embeddings for user %s", len(index), user_id)
+            return index
+
+    def _index_embedding(self, user_id: str, memory_id: str, embedding):
+        """Keep an already-loaded vector index in sync after a write"""
+        with self._vector_lock:
+            index = self._vector_indexes.get(user_id)
+        if index is not None:
+            try:
+                index.upsert(memory_id, embedding)
+            except ValueError as e:
+                # Stored anyway; it just can't take part in vector search
+                index.remove(memory_id)
+                self.logger.warning(f"[VEC_INDEX] Not indexing memory {memory_id}: {str(e)}")
+
+    def _unindex_embedding(self, user_id: str, memory_id: str):
+        with self._vector_lock:
+            index = self._vector_indexes.get(user_id)
+        if index is not None:
+            index.remove(memory_id)
+
+    def _encode_embedding(self, embedding) -> bytes:
+        """Encode an embedding vector in the store's configured format"""
+        return embedding_codec.encode_embedding(embedding, self.embedding_dtype)
+
+    def _decode_embedding_array(self, blob: bytes) -> np.ndarray:
+        """Decode an embedding blob to a float32 array without per-value logging"""
+        return embedding_codec.decode_embedding(blob)
+
+    def migrate_embeddings(self, target_dtype: Optional[str] = None, batch_size: int = 1000) -> Dict:
+        """Rewrite stored embeddings (including legacy headerless blobs) in target_dtype"""
+        target_dtype = target_dtype or self.embedding_dtype
+        if target_dtype not in embedding_codec.DTYPE_CODES:
+            raise ValueError(f"Unsupported embedding dtype: {target_dtype}")
+            
+        stats = {"scanned": 0, "rewritten": 0, "failed": 0, "bytes_before": 0, "bytes_after": 0}
+        last_rowid = 0
+        while True:
+            with self._connect() as conn:
+                rows = conn.execute("""
+                    SELECT rowid, embedding FROM memories
+                    WHERE embedding IS NOT NULL AND rowid > ?
+                    ORDER BY rowid
+                    LIMIT ?
+                """, (last_rowid, batch_size)).fetchall()
+                if not rows:
+                    break
+                    
+                updates = []
+                for rowid, blob in rows:
+                    stats["scanned"] += 1
+                    stats["bytes_before"] += len(blob)
+                    if embedding_codec.embedding_dtype(blob) == target_dtype:
+                        stats["bytes_after"] += len(blob)
+                        continue
+                    try:
+                        encoded = embedding_codec.encode_embedding(
+                            embedding_codec.decode_embedding(blob), target_dtype
+                        )
+                    except ValueError as e:
+                        self.logger.error(f"[EMBED_MIGRATE] Skipping row {rowid}: {str(e)}")
+                        stats["failed"] += 1
+                        stats["bytes_after"] += len(blob)
+                        continue
+                    updates.append((encoded, rowid))
+                    stats["bytes_after"] += len(encoded)
+                    
+                conn.executemany("UPDATE memories SET embedding = ? WHERE rowid = ?", updates)
+                stats["rewritten"] += len(updates)
+                last_rowid = rows[-1][0]
+                
+        # Cached matrices were built from the old blobs
+        with self._vector_lock:
+            self._vector_indexes.clear()
+            
+        self.logger.info(f"[EMBED_MIGRATE] Migration to {target_dtype} complete: {stats}")
+        return stats
+
+    @staticmethod
+    def _loggable(data: Dict) -> Dict:
+        """Drop embedding vectors from a dict before logging it"""
+        return {key: value for key, value in data.items() if key != "embedding"}
+
     def _decode_embedding(self, blob: bytes) -> List[float]:
         """Decode embedding blob from database"""
         try:
-            self.logger.debug("="*50)
-            self.logger.debug("[EMBED_DECODE] Starting embedding decode")
-            self.logger.debug(f"[EMBED_DECODE] Blob size: {len(blob)} bytes")
-            
-            # Convert blob to numpy array
-            self.logger.debug("[EMBED_DECODE] Converting blob to numpy array")
-            arr = np.frombuffer(blob, dtype=np.float32)
-            self.logger.debug(f"[EMBED_DECODE] Array shape: {arr.shape}")
-            self.logger.debug(f"[EMBED_DECODE] Array dtype: {arr.dtype}")
-            
-            # Convert to list
-            result = arr.tolist()
-            self.logger.debug(f"[EMBED_DECODE] Decoded {len(result)} dimensions")
-            self.logger.debug(f"[EMBED_DECODE] First 5 values: {result[:5]}")
-            self.logger.debug(f"[EMBED_DECODE] Last 5 values: {result[-5:]}")
-            
-            self.logger.debug("[EMBED_DECODE] Embedding decode complete")
-            self.logger.debug("="*50)
-            return result
-            
+            return embedding_codec.decode_embedding(blob).tolist()
         except Exception as e:
             self.logger.error(f"[EMBED_DECODE] Error decoding embedding: {str(e)}")
             self.logger.error(f"[EMBED_DECODE] Blob size: {len(blob)}")
             self.logger.error(f"[EMBED_DECODE] Traceback: {traceback.format_exc()}")
             raise
   
+    def apply_importance_decay(self, half_life_days: float = 30.0, access_boost: float = 0.1) -> int:
+        """Recompute importance_score for live memories from base_importance
+
+        importance = base * 0.5^(days since last access / half_life)
+                     * (1 + access_boost * ln(1 + access_count)), capped at 1.0
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute("""
+                    UPDATE memories
+                    SET importance_score = memory_decay(
+                        COALESCE(base_importance, importance_score),
+                        last_accessed, access_count, ?, ?, ?
+                    )
+                    WHERE marked_for_deletion = 0
+                """, (time.time(), half_life_days * 86400.0, access_boost))
+                self.logger.debug("[MEM_COMPACT] Decayed importance for %s memories", cursor.rowcount)
+                return cursor.rowcount
+                
+        except Exception as e:
+            self.logger.error(f"[MEM_COMPACT] Error applying decay: {str(e)}")
+            self.logger.error(f"[MEM_COMPACT] Traceback: {traceback.format_exc()}")
+            raise
+
+    def merge_duplicate_memories(self) -> int:
+        """Fold near-duplicate memories into one survivor and mark the rest for deletion
+
+        Memories are duplicates when user, type, entity and the normalised
+        information text match (the same rows diagnose_memory_issues reports,
+        plus case and whitespace variants). The survivor is the most important
+        copy; it inherits the summed access counts, the latest access time
+        and every association.
+        """
+        try:
+            merged = 0
+            with self._connect() as conn:
+                groups = conn.execute("""
+                    SELECT GROUP_CONCAT(id, char(31)) as ids
+                    FROM memories
+                    WHERE marked_for_deletion = 0
+                    GROUP BY user_id, memory_type, lower(COALESCE(entity_id, '')),
+                        lower(trim(COALESCE(json_extract(content, '$.information'), content)))
+                    HAVING COUNT(*) > 1
+                """).fetchall()
+                
+                for group in groups:
+                    ids = group["ids"].split(chr(31))
+                    placeholders = ','.join('?' * len(ids))
+                    rows = conn.execute(f"""
+                        SELECT id, access_count, last_accessed FROM memories
+                        WHERE id IN ({placeholders})
+                        ORDER BY importance_score DESC, access_count DESC, created_at ASC
+                    """, ids).fetchall()
+                    keeper = rows[0]["id"]
+                    duplicates = [row["id"] for row in rows[1:]]
+                    dup_placeholders = ','.join('?' * len(duplicates))
+                    
+                    conn.execute("""
+                        UPDATE memories SET access_count = ?, last_accessed = ?
+                        WHERE id = ?
+                    """, (
+                        sum(row["access_count"] or 0 for row in rows),
+                        max(row["last_accessed"] for row in rows),
+                        keeper
+                    ))
+                    # Re-point associations from the duplicates to the survivor
+                    conn.execute(f"""
+                        INSERT OR IGNORE INTO memory_associations (memory_id, associated_memory_id)
+                        SELECT ?, associated_memory_id FROM memory_associations
+                        WHERE memory_id IN ({dup_placeholders}) AND associated_memory_id != ?
+                    """, [keeper] + duplicates + [keeper])
+                    conn.execute(f"""
+                        INSERT OR IGNORE INTO memory_associations (memory_id, associated_memory_id)
+                        SELECT memory_id, ? FROM memory_associations
+                        WHERE associated_memory_id IN ({dup_placeholders}) AND memory_id != ?
+                    """, [keeper] + duplicates + [keeper])
+                    conn.execute(f"""
+                        UPDATE memories SET marked_for_deletion = 1
+                        WHERE id IN ({dup_placeholders})
+                    """, duplicates)
+                    merged += len(duplicates)
+                    
+            if merged:
+                self._reset_vector_indexes()
+            self.logger.debug("[MEM_COMPACT] Merged %s duplicate memories", merged)
+            return merged
+            
+        except Exception as e:
+            self.logger.error(f"[MEM_COMPACT] Error merging duplicates: {str(e)}")
+            self.logger.error(f"[MEM_COMPACT] Traceback: {traceback.format_exc()}")
+            raise
+
+    def archive_cold_memories(
+        self,
+        max_importance: float = 0.1,
+        min_idle_days: float = 90.0,
+        max_access_count: int = 1
+    ) -> int:
+        """Move deleted and cold memories into memories_archive
+
+        Cold means low importance, not accessed for min_idle_days and rarely
+        used. Archived rows leave the memories table (and so the FTS and
+        vector indexes) entirely.
+        """
+        try:
+            idle_cutoff = (datetime.now(timezone.utc) - timedelta(days=min_idle_days)).isoformat()
+            archived_at = datetime.now(timezone.utc).isoformat()
+            with self._connect() as conn:
+                conn.execute("DROP TABLE IF EXISTS temp.archive_ids")
+                conn.execute("""
+                    CREATE TEMP TABLE archive_ids AS
+                    SELECT id, CASE WHEN marked_for_deletion = 1 THEN 'deleted' ELSE 'cold' END as reason
+                    FROM memories
+                    WHERE marked_for_deletion = 1
+                    OR (importance_score <= ? AND last_accessed < ? AND access_count <= ?)
+                """, (max_importance, idle_cutoff, max_access_count))
+                
+                conn.execute("""
+                    INSERT OR REPLACE INTO memories_archive
+                    (id, user_id, memory_type, entity_id, content, confidence, importance_score,
+                    base_importance, source, created_at, last_accessed, access_count, embedding,
+                    archived_at, archive_reason)
+                    SELECT m.id, m.user_id, m.memory_type, m.entity_id, m.content, m.confidence,
+                        m.importance_score, m.base_importance, m.source, m.created_at,
+                        m.last_accessed, m.access_count, m.embedding, ?, a.reason
+                    FROM memories m JOIN archive_ids a ON a.id = m.id
+                """, (archived_at,))
+                conn.execute("""
+                    DELETE FROM memory_associations
+                    WHERE memory_id IN (SELECT id FROM archive_ids)
+                    OR associated_memory_id IN (SELECT id FROM archive_ids)
+                """)
+                cursor = conn.execute("DELETE FROM memories WHERE id IN (SELECT id FROM archive_ids)")
+                archived = cursor.rowcount
+                conn.execute("DROP TABLE temp.archive_ids")
+                
+            if archived:
+                self._reset_vector_indexes()
+            self.logger.debug("[MEM_COMPACT] Archived %s memories", archived)
+            return archived
+            
+        except Exception as e:
+            self.logger.error(f"[MEM_COMPACT] Error archiving memories: {str(e)}")
+            self.logger.error(f"[MEM_COMPACT] Traceback: {traceback.format_exc()}")
+            raise
+
+    def optimize_database(self, vacuum: bool = False):
+        """Refresh planner statistics, merge FTS segments and optionally VACUUM"""
+        with self._connect() as conn:
+            conn.execute("ANALYZE")
+            conn.execute("PRAGMA optimize")
+            if self._fts_enabled:
+                conn.execute("INSERT INTO memories_fts(memories_fts) VALUES ('optimize')")
+        if vacuum:
+            with self._connect() as conn:
+                conn.execute("VACUUM")
+            # VACUUM may renumber rowids, which the FTS index is keyed on
+            self.rebuild_fts_index()
+        self.logger.debug("[MEM_COMPACT] Database optimized (vacuum=%s)", vacuum)
+
+    def _reset_vector_indexes(self):
+        """Drop cached embedding matrices; they reload lazily on next vector search"""
+        with self._vector_lock:
+            self._vector_indexes.clear()
+
     def verify_memory_storage(self, memory_id: str) -> bool:
         """Verify a memory was properly stored"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.execute(
                     "SELECT * FROM memories WHERE id = ?",
                     (memory_id,)
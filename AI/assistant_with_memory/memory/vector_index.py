@@ -0,0 +1,145 @@
+# memory/vector_index.py
+
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import threading
+import numpy as np
+from .embedding_codec import decode_into, embedding_dim
+
+class VectorIndex:
+    """In-memory cosine similarity index over one user's memory embeddings
+
+    Rows are stored L2-normalised in a single float32 matrix so a query is
+    one matrix-vector product followed by an argpartition top-k.
+    """
+
+    def __init__(self, dim: Optional[int] = None, initial_capacity: int = 256):
+        self.dim = dim
+        self._capacity = initial_capacity
+        self._matrix = None if dim is None else np.zeros((initial_capacity, dim), dtype=np.float32)
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self.skipped = 0  # blobs left out by from_blobs
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, memory_id: str) -> bool:
+        return memory_id in self._rows
+
+    @staticmethod
+    def _normalize(vec) -> np.ndarray:
+        arr = np.asarray(vec, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(arr)
+        if norm > 0:
+            arr = arr / norm
+        return arr
+
+    def _ensure_capacity(self, size: int):
+        """Grow the backing matrix geometrically so appends stay amortised O(d)"""
+        if self._matrix is None:
+            self._capacity = max(self._capacity, size)
+            self._matrix = np.zeros((self._capacity, self.dim), dtype=np.float32)
+            return
+        if size <= self._capacity:
+            return
+        while self._capacity < size:
+            self._capacity *= 2
+        grown = np.zeros((self._capacity, self.dim), dtype=np.float32)
+        grown[:len(self._ids)] = self._matrix[:len(self._ids)]
+        self._matrix = grown
+
+    def upsert(self, memory_id: str, vec):
+        """Insert or replace the embedding for a memory"""
+        arr = self._normalize(vec)
+        with self._lock:
+            if self.dim is None:
+                self.dim = arr.shape[0]
+            if arr.shape[0] != self.dim:
+                raise ValueError(f"Embedding has {arr.shape[0]} dimensions, index expects {self.dim}")
+
+            row = self._rows.get(memory_id)
+            if row is None:
+                row = len(self._ids)
+                self._ensure_capacity(row + 1)
+                self._ids.append(memory_id)
+                self._rows[memory_id] = row
+            self._matrix[row] = arr
+
+    @classmethod
+    def from_blobs(cls, rows: List[Tuple[str, bytes]], dim: Optional[int] = None) -> "VectorIndex":
+        """Build an index straight from encoded embedding blobs
+
+        Every blob is decoded into its row of one preallocated matrix, then all
+        rows are normalised in a single vectorised pass. Blobs that cannot be
+        decoded, or whose dimension differs from dim (default: the most common
+        one), are left out and counted in index.skipped.
+        """
+        parsed = []
+        skipped = 0
+        for memory_id, blob in rows:
+            try:
+                blob_dim = embedding_dim(blob)
+            except ValueError:
+                skipped += 1
+                continue
+            if blob_dim > 0:
+                parsed.append((memory_id, blob, blob_dim))
+            else:
+                skipped += 1
+
+        if dim is None and parsed:
+            dim = Counter(blob_dim for _, _, blob_dim in parsed).most_common(1)[0][0]
+        index = cls(dim=dim, initial_capacity=max(len(parsed), 1))
+        index.skipped = skipped
+        if not parsed:
+            return index
+
+        matrix = index._matrix
+        count = 0
+        for memory_id, blob, blob_dim in parsed:
+            if blob_dim != dim:
+                index.skipped += 1
+                continue
+            decode_into(blob, matrix[count])
+            index._ids.append(memory_id)
+            index._rows[memory_id] = count
+            count += 1
+
+        norms = np.linalg.norm(matrix[:count], axis=1, keepdims=True)
+        np.divide(matrix[:count], norms, out=matrix[:count], where=norms > 0)
+        return index
+
+    def remove(self, memory_id: str) -> bool:
+        """Remove a memory, moving the last row into its slot"""
+        with self._lock:
+            row = self._rows.pop(memory_id, None)
+            if row is None:
+                return False
+            last = len(self._ids) - 1
+            if row != last:
+                moved_id = self._ids[last]
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved_id
+                self._rows[moved_id] = row
+            self._ids.pop()
+            return True
+
+    def search(self, query_vec, k: int = 10) -> List[Tuple[str, float]]:
+        """Return up to k (memory_id, cosine similarity) pairs, best first"""
+        with self._lock:
+            n = len(self._ids)
+            if n == 0 or k <= 0:
+                return []
+            query = self._normalize(query_vec)
+            if query.shape[0] != self.dim:
+                raise ValueError(f"Query has {query.shape[0]} dimensions, index expects {self.dim}")
+
+            scores = self._matrix[:n] @ query
+            if k < n:
+                top = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top = np.arange(n)
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[i], float(scores[i])) for i in top]
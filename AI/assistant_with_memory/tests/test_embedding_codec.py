@@ -0,0 +1,62 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from memory import embedding_codec
+from memory.embedding_codec import (
+    HEADER_SIZE, decode_embedding, decode_into, embedding_dim, embedding_dtype, encode_embedding
+)
+
+VECTOR = np.random.default_rng(0).standard_normal(384).astype(np.float32)
+
+@pytest.mark.parametrize("dtype, itemsize, atol", [
+    ("float32", 4, 0.0),
+    ("float16", 2, 1e-2),
+    ("int8", 1, float(np.max(np.abs(VECTOR))) / 127)
+])
+def test_round_trip(dtype, itemsize, atol):
+    blob = encode_embedding(VECTOR, dtype)
+    assert len(blob) == HEADER_SIZE + VECTOR.size * itemsize
+    assert embedding_dtype(blob) == dtype
+    assert embedding_dim(blob) == VECTOR.size
+    decoded = decode_embedding(blob)
+    assert decoded.dtype == np.float32
+    np.testing.assert_allclose(decoded, VECTOR, rtol=0, atol=atol)
+
+def test_float32_decode_is_exact():
+    assert np.array_equal(decode_embedding(encode_embedding(VECTOR)), VECTOR)
+
+def test_legacy_headerless_blob_decodes_as_float32():
+    blob = VECTOR.tobytes()
+    assert embedding_dtype(blob) is None
+    assert embedding_dim(blob) == VECTOR.size
+    assert np.array_equal(decode_embedding(blob), VECTOR)
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_decode_into_matches_decode(dtype):
+    blob = encode_embedding(VECTOR, dtype)
+    out = np.empty(VECTOR.size, dtype=np.float32)
+    decode_into(blob, out)
+    assert np.array_equal(out, decode_embedding(blob))
+
+def test_zero_vector_int8():
+    decoded = decode_embedding(encode_embedding(np.zeros(8), "int8"))
+    assert not decoded.any()
+
+@pytest.mark.parametrize("blob", [
+    encode_embedding(VECTOR)[:-1],   # truncated payload
+    b"\x00" * 7,                     # legacy length not a multiple of 4
+    embedding_codec.HEADER.pack(b"EMB", 9, 0, 0, 1, 1.0) + b"\x00" * 4,  # unknown version
+    embedding_codec.HEADER.pack(b"EMB", 1, 7, 0, 1, 1.0) + b"\x00" * 4   # unknown dtype
+])
+def test_malformed_blobs_raise_value_error(blob):
+    with pytest.raises(ValueError):
+        decode_embedding(blob)
+
+def test_unsupported_dtype_is_rejected():
+    with pytest.raises(ValueError):
+        encode_embedding(VECTOR, "bfloat16")
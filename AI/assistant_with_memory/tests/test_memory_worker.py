@@ -0,0 +1,65 @@
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chat.memory_worker import MemoryExtractionWorker
+
+class BlockingLLM:
+    """Extraction LLM that holds the worker until released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.prompts = []
+
+    async def stream_chat(self, messages):
+        self.prompts.append(messages[0]["content"])
+        self.started.set()
+        self.release.wait(5)
+        yield json.dumps({"memory_items": []})
+
+class RecordingMemory:
+    def __init__(self):
+        self.added = []
+
+    def add_memory(self, data):
+        self.added.append(data)
+
+def test_submit_does_not_block_when_the_queue_is_full():
+    llm = BlockingLLM()
+    worker = MemoryExtractionWorker(llm, RecordingMemory(), max_queue=2, max_batch=4)
+    try:
+        assert worker.submit("first", "reply", [])
+        assert llm.started.wait(5)
+        assert worker.submit("second", "reply", [])
+        assert worker.submit("third", "reply", [])
+
+        started = time.monotonic()
+        assert not worker.submit("fourth", "reply", [])
+        assert time.monotonic() - started < 0.05
+        assert worker.metrics()["dropped"] == 1
+    finally:
+        llm.release.set()
+        worker.stop(timeout=5)
+
+def test_queued_turns_are_batched_and_stop_rejects_new_work():
+    llm = BlockingLLM()
+    memory = RecordingMemory()
+    worker = MemoryExtractionWorker(llm, memory, max_queue=8, max_batch=4)
+    worker.submit("first", "reply", [])
+    assert llm.started.wait(5)
+    for i in range(3):
+        worker.submit(f"queued {i}", "reply", [])
+    llm.release.set()
+    worker.stop(timeout=5)
+
+    metrics = worker.metrics()
+    assert metrics["batches"] == 2 and metrics["processed_turns"] == 4
+    assert "queued 2" in llm.prompts[1]
+    assert len(memory.added) == 2
+    assert not worker.submit("late", "reply", [])
+    assert worker.metrics()["rejected"] == 1
@@ -0,0 +1,153 @@
+import os
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("MEMORY_LOG_LEVEL", "WARNING")
+
+from memory.embedding_codec import embedding_dtype
+from memory.sqlite_store import SQLiteStore
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteStore(str(tmp_path / "memory.db"))
+    yield store
+    store.close()
+
+def run_in_threads(func, count):
+    for _ in range(count):
+        thread = threading.Thread(target=func)
+        thread.start()
+        thread.join()
+
+def test_connection_is_reused_within_a_thread(store):
+    assert store._connect() is store._connect()
+    assert store.pool_size() == 1
+
+def test_exited_threads_release_their_connections(store):
+    run_in_threads(lambda: store.load_all_memories("alice"), 50)
+    assert store.pool_size() == 1  # only the thread that created the store
+
+def test_close_closes_connections_of_live_threads(store):
+    opened = threading.Event()
+    done = threading.Event()
+
+    def worker():
+        store.load_all_memories("alice")
+        opened.set()
+        done.wait(5)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    assert opened.wait(5)
+    assert store.pool_size() == 2
+    store.close()
+    assert store.pool_size() == 0
+    done.set()
+    thread.join()
+    assert store.pool_size() == 0
+
+def test_store_is_usable_after_close(store):
+    store.close()
+    assert store.load_all_memories("alice") == []
+    assert store.pool_size() == 1
+
+def memory(memory_id, embedding=None, **fields):
+    entry = {
+        "id": memory_id,
+        "memory_type": "semantic",
+        "content": {"information": f"fact {memory_id}"},
+        "created_at": "2026-01-01T00:00:00",
+        "last_accessed": "2026-01-01T00:00:00",
+        "importance_score": 0.5,
+        "embedding": embedding
+    }
+    entry.update(fields)
+    return entry
+
+def axis(i, dim=4):
+    vec = [0.0] * dim
+    vec[i] = 1.0
+    return vec
+
+def test_vector_search_survives_corrupt_and_mismatched_rows(store):
+    store.add_memories("alice", [memory(f"m{i}", axis(i)) for i in range(4)])
+    with store._connect() as conn:
+        conn.execute("UPDATE memories SET embedding = ? WHERE id = 'm0'", (b"\x00" * 5,))
+    store.add_memory("alice", memory("short", [1.0, 0.0, 0.0]))
+    hits = store.search_memories_by_vector("alice", axis(1), k=1)
+    assert [hit["id"] for hit in hits] == ["m1"]
+    assert store._get_vector_index("alice").skipped == 2
+
+def test_vector_search_orders_top_k_by_similarity(store):
+    store.add_memories("alice", [
+        memory("exact", [1.0, 0.0, 0.0, 0.0]),
+        memory("close", [0.9, 0.1, 0.0, 0.0]),
+        memory("far", [0.0, 0.0, 1.0, 0.0]),
+        memory("opposite", [-1.0, 0.0, 0.0, 0.0])
+    ])
+    store.add_memory("bob", memory("other_user", [1.0, 0.0, 0.0, 0.0]))
+    hits = store.search_memories_by_vector("alice", axis(0), k=3)
+    assert [hit["id"] for hit in hits] == ["exact", "close", "far"]
+    assert hits[0]["similarity"] == pytest.approx(1.0)
+    assert hits[0]["similarity"] >= hits[1]["similarity"] >= hits[2]["similarity"]
+
+def test_vector_index_follows_add_update_and_delete(store):
+    store.add_memories("alice", [memory("a", axis(0)), memory("b", axis(1))])
+    assert store.search_memories_by_vector("alice", axis(0), k=1)[0]["id"] == "a"
+
+    store.add_memory("alice", memory("c", axis(2)))
+    assert store.search_memories_by_vector("alice", axis(2), k=1)[0]["id"] == "c"
+
+    store.update_memory("alice", "b", {"embedding": axis(0)})
+    assert {hit["id"] for hit in store.search_memories_by_vector("alice", axis(0), k=2)} == {"a", "b"}
+
+    assert store.delete_memory("alice", "a")
+    assert [hit["id"] for hit in store.search_memories_by_vector("alice", axis(0), k=1)] == ["b"]
+
+    store.update_memory("alice", "b", {"embedding": None})
+    assert store.search_memories_by_vector("alice", axis(0), k=3)[0]["id"] == "c"
+
+def test_vector_index_loaded_from_disk_matches_live_index(store, tmp_path):
+    store.add_memories("alice", [memory(f"m{i}", axis(i)) for i in range(4)])
+    live = [hit["id"] for hit in store.search_memories_by_vector("alice", [0.5, 1.0, 0.0, 0.0], k=2)]
+    reopened = SQLiteStore(store.db_path)
+    try:
+        assert [hit["id"] for hit in reopened.search_memories_by_vector("alice", [0.5, 1.0, 0.0, 0.0], k=2)] == live
+    finally:
+        reopened.close()
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_embeddings_round_trip_through_the_store(tmp_path, dtype):
+    store = SQLiteStore(str(tmp_path / "memory.db"), embedding_dtype=dtype)
+    try:
+        embedding = [0.25, -0.5, 1.0, 0.0]
+        store.add_memory("alice", memory("m", embedding))
+        loaded = store.load_all_memories("alice")[0]["embedding"]
+        assert loaded == pytest.approx(embedding, abs=0.01)
+    finally:
+        store.close()
+
+def test_legacy_headerless_embeddings_are_read_and_migrated(store):
+    store.add_memory("alice", memory("legacy", axis(0)))
+    with store._connect() as conn:
+        conn.execute("UPDATE memories SET embedding = ?", (np.array(axis(1), dtype=np.float32).tobytes(),))
+    assert store.load_all_memories("alice")[0]["embedding"] == axis(1)
+
+    stats = store.migrate_embeddings("float16")
+    assert stats["rewritten"] == 1 and stats["failed"] == 0
+    with store._connect() as conn:
+        assert embedding_dtype(conn.execute("SELECT embedding FROM memories").fetchone()[0]) == "float16"
+    assert store.load_all_memories("alice")[0]["embedding"] == axis(1)
+
+def test_full_text_search_matches_entity_terms(store):
+    store.add_memories("alice", [
+        memory("cat", content={"information": "has a cat named Tahiri"}),
+        memory("rust", content={"information": "is learning rust"})
+    ])
+    assert [m["id"] for m in store.search_memories("alice", ["Tahiri"])] == ["cat"]
+    assert store.search_memories("bob", ["Tahiri"]) == []
@@ -0,0 +1,67 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from memory.embedding_codec import encode_embedding
+from memory.vector_index import VectorIndex
+
+def unit(i, dim=4):
+    vec = np.zeros(dim, dtype=np.float32)
+    vec[i] = 1.0
+    return vec
+
+def test_search_returns_best_matches_first():
+    index = VectorIndex()
+    for i in range(4):
+        index.upsert(f"m{i}", unit(i))
+    index.upsert("mix", np.array([1.0, 1.0, 0.0, 0.0]))
+    hits = index.search(unit(0), k=2)
+    assert [memory_id for memory_id, _ in hits] == ["m0", "mix"]
+    assert hits[0][1] == pytest.approx(1.0)
+    assert hits[1][1] == pytest.approx(1 / np.sqrt(2))
+
+def test_remove_keeps_other_rows_searchable():
+    index = VectorIndex()
+    for i in range(3):
+        index.upsert(f"m{i}", unit(i))
+    assert index.remove("m0")
+    assert not index.remove("m0")
+    assert "m0" not in index and len(index) == 2
+    assert index.search(unit(2), k=1)[0][0] == "m2"
+
+def test_from_blobs_uses_the_most_common_dimension():
+    rows = [("stale", encode_embedding(np.ones(3)))]
+    rows += [(f"m{i}", encode_embedding(unit(i))) for i in range(4)]
+    index = VectorIndex.from_blobs(rows)
+    assert index.dim == 4
+    assert len(index) == 4 and "stale" not in index
+    assert index.skipped == 1
+    assert index.search(unit(1), k=1)[0][0] == "m1"
+
+def test_from_blobs_skips_corrupt_blobs():
+    rows = [
+        ("truncated", encode_embedding(unit(0))[:-3]),
+        ("odd_legacy", b"\x00" * 7),
+        ("empty", b""),
+        ("ok", encode_embedding(unit(2))),
+        ("legacy", unit(3).tobytes())
+    ]
+    index = VectorIndex.from_blobs(rows)
+    assert sorted(index._ids) == ["legacy", "ok"]
+    assert index.skipped == 3
+
+def test_from_blobs_with_only_corrupt_blobs_is_empty_but_usable():
+    index = VectorIndex.from_blobs([("bad", b"\x00" * 5)])
+    assert len(index) == 0 and index.skipped == 1
+    assert index.search(unit(0), k=3) == []
+    index.upsert("m0", unit(0))
+    assert index.search(unit(0), k=1)[0][0] == "m0"
+
+def test_from_blobs_honours_an_explicit_dimension():
+    rows = [("a", encode_embedding(np.ones(3))), ("b", encode_embedding(np.ones(3))), ("c", encode_embedding(unit(0)))]
+    index = VectorIndex.from_blobs(rows, dim=4)
+    assert index._ids == ["c"] and index.skipped == 2
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Rewrite every stored embedding in the versioned codec format
+
+Usage:
+    python tools/migrate_embeddings.py --dtype float16
+    python tools/migrate_embeddings.py --db memory_store/memory.db --dtype int8
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from memory.sqlite_store import SQLiteStore
+from memory.embedding_codec import DTYPE_CODES
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="Database path (defaults to memory_store/memory.db)")
+    parser.add_argument("--dtype", choices=sorted(DTYPE_CODES), default="float32",
+                        help="Target storage precision")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--vacuum", action="store_true", help="Reclaim freed space afterwards")
+    args = parser.parse_args()
+
+    store = SQLiteStore(args.db, embedding_dtype=args.dtype)
+    stats = store.migrate_embeddings(args.dtype, batch_size=args.batch_size)
+    if args.vacuum:
+        store.optimize_database(vacuum=True)
+    store.close()
+    print(json.dumps(stats, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,8 @@ import json
 import logging
 import os
 import re
+import random
 import subprocess
-import time
-import torch
-from diffusers import FluxPipeline
 from flask import (
     Flask,
     jsonify,
@@ -17,7 +15,7 @@ from flask import (
     Response,
     request
 )
-from PIL import Image
+from jobs import ImageCache, ImageJobQueue
 
 # Set environment variable for Hugging Face transfer
 os.environ['HF_HUB_ENABLE_HF_TRANSFER'] = '1'
@@ -26,29 +24,21 @@ os.environ['HF_HUB_ENABLE_HF_TRANSFER'] = '1'
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Check if model is downloaded and download if missing
 MODEL_ID = os.getenv("MODEL_ID", "black-forest-labs/FLUX.1-schnell")
 MODEL_CACHE_DIR = os.path.expanduser("~/.cache/huggingface/hub")
 MODEL_PATH = os.path.join(MODEL_CACHE_DIR, "models--" + MODEL_ID.replace("/", "--"))
 
-if not os.path.exists(MODEL_PATH):
-    logger.info("Model not found. Downloading FLUX model...")
-    try:
-        subprocess.run("huggingface-cli download 'black-forest-labs/FLUX.1-schnell'", shell=True, check=True)
-        logger.info("Model downloaded successfully!")
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error downloading model: {str(e)}")
-        raise
-
 app = Flask(__name__)
 
 OUTPUT_DIR = "output"
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(OUTPUT_DIR, "cache"))
+IMAGE_CACHE_MAX_MB = int(os.getenv("IMAGE_CACHE_MAX_MB", "1024"))  # 0 = unbounded
+MAX_SEED = 2**31 - 1  # the largest seed the form accepts
 
 # Create output directory if it doesn't exist
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-# Global variable to track progress
-generation_progress = 0
+# Only the job queue's worker thread touches the pipeline
 pipe = None
 
 def sanitize_filename(prompt):
@@ -66,23 +56,42 @@ def sanitize_filename(prompt):
     
     return filename + ".png"
 
-def generate_image(prompt, width, height, steps, guidance_scale=0.0, sequence_length=256, seed=-1, save_image=True):
+def load_pipeline():
+    """Download the model if missing and build the FLUX pipeline."""
+    import torch
+    from diffusers import FluxPipeline
+
+    # Check if model is downloaded and download if missing
+    if not os.path.exists(MODEL_PATH):
+        logger.info("Model not found. Downloading FLUX model...")
+        try:
+            subprocess.run("huggingface-cli download 'black-forest-labs/FLUX.1-schnell'", shell=True, check=True)
+            logger.info("Model downloaded successfully!")
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Error downloading model: {str(e)}")
+            raise
+
+    logger.info("Initializing FLUX pipeline...")
+    pipeline = FluxPipeline.from_pretrained(
+        MODEL_ID,
+        torch_dtype=torch.bfloat16,
+        use_fast=True
+    )
+    pipeline.enable_sequential_cpu_offload()
+    pipeline.enable_attention_slicing(1)
+    torch.cuda.empty_cache()
+    logger.info("Pipeline initialized successfully")
+    return pipeline
+
+def generate_image(prompt, width, height, steps, guidance_scale=0.0, sequence_length=256, seed=-1, on_progress=None):
+    """Run the pipeline and return the image as PNG bytes."""
     try:
-        global generation_progress, pipe
-        generation_progress = 0
-        
+        import torch
+        global pipe
+
         # Initialize model if needed
         if pipe is None:
-            logger.info("Initializing FLUX pipeline...")
-            pipe = FluxPipeline.from_pretrained(
-                MODEL_ID,
-                torch_dtype=torch.bfloat16,
-                use_fast=True
-            )
-            pipe.enable_sequential_cpu_offload()
-            pipe.enable_attention_slicing(1)
-            torch.cuda.empty_cache()
-            logger.info("Pipeline initialized successfully")
+            pipe = load_pipeline()
         
         # Generate the image
         logger.info("Starting image generation process...")
@@ -95,8 +104,8 @@ def generate_image(prompt, width, height, steps, guidance_scale=0.0, sequence_le
 
         with torch.inference_mode():
             def callback_fn(pipe, i, t, latents):
-                global generation_progress
-                generation_progress = int(((i + 1) / steps) * 100)
+                if on_progress:
+                    on_progress(int(((i + 1) / steps) * 100))
                 logger.info(f"Step {i + 1}/{steps} - Using guidance_scale={guidance_scale}")
                 return latents
 
@@ -110,30 +119,25 @@ def generate_image(prompt, width, height, steps, guidance_scale=0.0, sequence_le
                 "callback_on_step_end": callback_fn,
                 "callback_on_step_end_tensor_inputs": ["latents"]
             }
+            # A fixed seed makes the output reproducible, which is what lets the cache reuse it
+            if seed >= 0:
+                generation_params["generator"] = torch.Generator(device="cpu").manual_seed(seed)
             
             # Log the exact parameters being sent to FLUX
             logger.info("=" * 50)
             logger.info("FLUX PARAMETERS:")
             for key, value in generation_params.items():
-                if key != "callback_on_step_end" and key != "callback_on_step_end_tensor_inputs":
+                if key not in ("callback_on_step_end", "callback_on_step_end_tensor_inputs", "generator"):
                     logger.info(f"{key}: {value} (type: {type(value)})")
+            logger.info(f"seed: {seed}")
             logger.info("=" * 50)
             
             image = pipe(**generation_params).images[0]
             logger.info("Image generation completed successfully")
         
-        # Save if requested
-        if save_image:
-            filename = f"{sanitize_filename(prompt)}.png"
-            output_path = os.path.join(OUTPUT_DIR, filename)
-            image.save(output_path)
-        
-        # Convert to base64
         buffered = io.BytesIO()
         image.save(buffered, format="PNG")
-        image_data = base64.b64encode(buffered.getvalue()).decode()
-        
-        return image_data
+        return buffered.getvalue()
             
     except Exception as e:
         logger.error("=" * 50)
@@ -144,6 +148,37 @@ def generate_image(prompt, width, height, steps, guidance_scale=0.0, sequence_le
         logger.error("=" * 50)
         raise Exception(f"Error generating image: {str(e)}")
 
+def render_job(params, on_progress):
+    return generate_image(
+        params['prompt'],
+        params['width'],
+        params['height'],
+        params['steps'],
+        params['guidance_scale'],
+        sequence_length=params['sequence_length'],
+        seed=params['seed'],
+        on_progress=on_progress
+    )
+
+image_cache = ImageCache(IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_MB * 2**20 or None)
+jobs = ImageJobQueue(render_job, image_cache)
+
+def job_result(job):
+    """JSON response for a finished job."""
+    png = jobs.result(job)
+    if png is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Image is no longer in the cache, please generate it again'
+        }), 410
+    return jsonify({
+        'status': 'success',
+        'job_id': job.id,
+        'image': base64.b64encode(png).decode(),
+        'cached': job.cached,
+        'seed': job.params['seed']
+    })
+
 @app.route('/')
 def index():
     logger.info("Serving index page")
@@ -168,6 +203,10 @@ def generate():
         guidance_scale = min(max(0.0, float(data.get('guidance_scale', 0.8))), 1.5)
         seed = int(data.get('seed', -1))
         save_image = data.get('save_image', False)
+
+        # Pick the random seed here, so every job is fully determined by its parameters
+        if seed < 0:
+            seed = random.randint(0, MAX_SEED)
         
         logger.info("Parsed parameters:")
         logger.info(f"  Prompt: '{prompt}'")
@@ -179,22 +218,30 @@ def generate():
         logger.info(f"  Save Image: {save_image}")
         logger.info("-" * 50)
         
-        image_data = generate_image(
-            prompt, 
-            width, 
-            height, 
-            steps, 
-            guidance_scale,
-            sequence_length=256,
-            seed=seed,
-            save_image=save_image
-        )
-        
-        logger.info("Sending successful response")
+        params = {
+            'model': MODEL_ID,
+            'prompt': prompt.strip(),
+            'width': width,
+            'height': height,
+            'steps': steps,
+            'guidance_scale': guidance_scale,
+            'sequence_length': 256,
+            'seed': seed
+        }
+        save_path = os.path.join(OUTPUT_DIR, f"{sanitize_filename(prompt)}.png") if save_image else None
+        job = jobs.submit(params, save_path=save_path)
+
+        if job.status == 'done':
+            logger.info(f"Serving job {job.id} from the image cache")
+            return job_result(job)
+
+        logger.info(f"Queued job {job.id}")
         return jsonify({
-            'status': 'success',
-            'image': image_data
-        })
+            'status': 'queued',
+            'job_id': job.id,
+            'seed': seed,
+            'position': jobs.position(job)
+        }), 202
         
     except Exception as e:
         logger.error("=" * 50)
@@ -208,19 +255,39 @@ def generate():
             'message': str(e)
         }), 500
 
-@app.route('/progress')
-def progress():
+@app.route('/progress/<job_id>')
+def progress(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown job'}), 404
+
     def generate():
-        last_progress = -1
         while True:
-            if generation_progress != last_progress:
-                last_progress = generation_progress
-                yield f"data: {json.dumps({'percent': generation_progress})}\n\n"
-            time.sleep(0.1)
-            if generation_progress >= 100:
+            version = job.version
+            state = job.to_dict()
+            state['position'] = jobs.position(job)
+            yield f"data: {json.dumps(state)}\n\n"
+            if job.finished:
                 break
+            # Wake on the next step, or after a second to refresh the queue position
+            job.wait_for_change(version, timeout=1.0)
     return Response(generate(), mimetype='text/event-stream')
 
+@app.route('/result/<job_id>')
+def result(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown job'}), 404
+    if job.status == 'error':
+        return jsonify({'status': 'error', 'message': job.error}), 500
+    if job.status != 'done':
+        return jsonify({'status': job.status, 'job_id': job.id, 'percent': job.progress}), 202
+    return job_result(job)
+
+@app.route('/jobs/stats')
+def job_stats():
+    return jsonify(jobs.stats())
+
 if __name__ == '__main__':
     logger.info("Starting Flask application...")
     os.environ['PYTORCH_CUDA_ALLOC_CONF'] = 'expandable_segments:True'
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+
+"""Generation job queue and content-addressed PNG cache for the FLUX image creator."""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+def cache_key(params):
+    """SHA-256 of the canonical JSON of everything that determines the image."""
+    canonical = json.dumps(params, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class ImageCache:
+    """PNG files on disk, named by the hash of the parameters that produced them.
+
+    With max_bytes set, the least recently used files are deleted once the
+    cache grows past it. Reads refresh a file's mtime, so the order survives
+    a restart.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._sizes = OrderedDict()  # key -> bytes, least recently used first
+        self._total = 0
+        self._evicted = 0
+        self._load_index()
+
+    def _load_index(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.png'):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, name[:-len('.png')], st.st_size))
+        with self._lock:
+            for _, key, size in sorted(entries):
+                self._sizes[key] = size
+                self._total += size
+            self._evict()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.png")
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                png = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self._total -= self._sizes.pop(key, 0)
+            return None
+        with self._lock:
+            if key in self._sizes:
+                self._sizes.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return png
+
+    def put(self, key, png):
+        # Write to a temp file and rename, so readers never see a partial PNG
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp', delete=False) as f:
+            f.write(png)
+        os.replace(f.name, path)
+        with self._lock:
+            self._total -= self._sizes.pop(key, 0)
+            self._sizes[key] = len(png)
+            self._total += len(png)
+            self._evict()
+
+    def _evict(self):
+        """Delete least recently used files until under max_bytes; caller holds the lock."""
+        # The newest file always stays, even if it alone is over the limit
+        while self.max_bytes is not None and self._total > self.max_bytes and len(self._sizes) > 1:
+            key, size = self._sizes.popitem(last=False)
+            self._total -= size
+            self._evicted += 1
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+            logger.info(f"Evicted {key[:12]} from the image cache ({size} bytes)")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cache_files': len(self._sizes),
+                'cache_bytes': self._total,
+                'cache_max_bytes': self.max_bytes,
+                'cache_evicted': self._evicted
+            }
+
+class ImageJob:
+    """One generation request; its progress is private to the job."""
+
+    def __init__(self, params, key):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.key = key
+        self.status = 'queued'  # queued -> running -> done | error
+        self.progress = 0
+        self.error = None
+        self.cached = False
+        self.save_paths = []
+        self.created_at = time.time()
+        self.finished_at = None
+        self._changed = threading.Condition()
+        self._version = 0
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'error')
+
+    @property
+    def version(self):
+        with self._changed:
+            return self._version
+
+    def update(self, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self._version += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, version, timeout=None):
+        """Block until the job changes after version (or timeout); returns the current version."""
+        with self._changed:
+            self._changed.wait_for(lambda: self._version != version, timeout)
+            return self._version
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'percent': self.progress,
+            'error': self.error,
+            'cached': self.cached,
+            'seed': self.params.get('seed')
+        }
+
+class ImageJobQueue:
+    """Runs generation jobs one at a time on a single worker thread.
+
+    render(params, on_progress) must return PNG bytes; it is the only code
+    that touches the pipeline, so requests can no longer race on it. A job
+    whose parameters are already in the cache finishes immediately, and an
+    identical job that is still queued or running is shared rather than
+    rendered twice.
+    """
+
+    def __init__(self, render, cache, keep_finished=100):
+        self.render = render
+        self.cache = cache
+        self.keep_finished = keep_finished
+        self._cond = threading.Condition()
+        self._jobs = OrderedDict()  # job_id -> ImageJob, oldest first
+        self._queue = deque()
+        self._inflight = {}         # cache key -> queued or running job
+        self._stats = {'submitted': 0, 'cache_hits': 0, 'deduplicated': 0, 'rendered': 0, 'failed': 0}
+        self._worker = threading.Thread(target=self._run, name='image-jobs', daemon=True)
+        self._worker.start()
+
+    def submit(self, params, save_path=None):
+        key = cache_key(params)
+        with self._cond:
+            self._stats['submitted'] += 1
+            job = self._inflight.get(key)
+            if job is not None:
+                self._stats['deduplicated'] += 1
+                if save_path:
+                    job.save_paths.append(save_path)
+                return job
+
+            job = ImageJob(params, key)
+            if save_path:
+                job.save_paths.append(save_path)
+            self._jobs[job.id] = job
+            png = self.cache.get(key)
+            if png is not None:
+                self._stats['cache_hits'] += 1
+                logger.info(f"Image cache hit for job {job.id} ({key[:12]})")
+                self._save_copies(job, png)
+                job.update(status='done', progress=100, cached=True, finished_at=time.time())
+                self._prune()
+                return job
+
+            self._inflight[key] = job
+            self._queue.append(job)
+            self._cond.notify_all()
+            return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def position(self, job):
+        """1-based place of the job in the queue (1 runs next); 0 once it is running or finished."""
+        with self._cond:
+            try:
+                return self._queue.index(job) + 1
+            except ValueError:
+                return 0
+
+    def result(self, job):
+        """PNG bytes of a finished job, or None."""
+        if job.status != 'done':
+            return None
+        return self.cache.get(job.key)
+
+    def _save_copies(self, job, png):
+        for path in job.save_paths:
+            try:
+                with open(path, 'wb') as f:
+                    f.write(png)
+            except OSError as e:
+                logger.error(f"Could not save image to {path}: {str(e)}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue)
+                job = self._queue.popleft()
+            job.update(status='running')
+            try:
+                png = self.render(job.params, lambda percent: job.update(progress=percent))
+                self.cache.put(job.key, png)
+                self._save_copies(job, png)
+                with self._cond:
+                    self._stats['rendered'] += 1
+                job.update(status='done', progress=100, finished_at=time.time())
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {str(e)}", exc_info=True)
+                with self._cond:
+                    self._stats['failed'] += 1
+                job.update(status='error', error=str(e), finished_at=time.time())
+            finally:
+                with self._cond:
+                    self._inflight.pop(job.key, None)
+                    self._prune()
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond keep_finished; caller holds the lock."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['queued'] = len(self._queue)
+            stats['tracked_jobs'] = len(self._jobs)
+        stats.update(self.cache.stats())
+        return stats
@@ -187,20 +187,6 @@ document.addEventListener('DOMContentLoaded', function() {
         console.log('Sending request with data:', requestData);
 
         try {
-            // Set up Server-Sent Events connection
-            const eventSource = new EventSource('/progress');
-            
-            eventSource.onmessage = function(event) {
-                const progress = JSON.parse(event.data);
-                const percent = progress.percent;
-                progressBar.style.width = `${percent}%`;
-                progressText.textContent = `Generating... ${percent}%`;
-            };
-            
-            eventSource.onerror = function() {
-                eventSource.close();
-            };
-
             const response = await fetch('/generate', {
                 method: 'POST',
                 headers: {
@@ -210,13 +196,20 @@ document.addEventListener('DOMContentLoaded', function() {
             });
 
             console.log('Received response:', response);
-            const data = await response.json();
+            let data = await response.json();
             console.log('Response data:', data);
 
+            // Anything not served from the cache is a queued job: follow it, then fetch the image
+            if (data.status === 'queued') {
+                await followJob(data.job_id);
+                const result = await fetch(`/result/${data.job_id}`);
+                data = await result.json();
+            }
+
             if (data.status === 'success') {
                 generatedImage.src = `data:image/png;base64,${data.image}`;
                 progressBar.style.width = '100%';
-                progressText.textContent = 'Generation Complete!';
+                progressText.textContent = data.cached ? 'Loaded from cache!' : 'Generation Complete!';
                 generatedImage.style.display = 'block';
                 loading.style.display = 'none';
             } else {
@@ -229,10 +222,36 @@ document.addEventListener('DOMContentLoaded', function() {
             loading.style.display = 'none';
         } finally {
             generateBtn.disabled = false;
-            eventSource.close();
         }
     });
 
+    // Stream a job's progress until it finishes
+    function followJob(jobId) {
+        return new Promise((resolve, reject) => {
+            const eventSource = new EventSource(`/progress/${jobId}`);
+
+            eventSource.onmessage = function(event) {
+                const job = JSON.parse(event.data);
+                const percent = job.percent;
+                progressBar.style.width = `${percent}%`;
+                if (job.status === 'queued') {
+                    progressText.textContent = `Queued (position ${job.position})`;
+                } else {
+                    progressText.textContent = `Generating... ${percent}%`;
+                }
+                if (job.status === 'done' || job.status === 'error') {
+                    eventSource.close();
+                    resolve(job);
+                }
+            };
+
+            eventSource.onerror = function() {
+                eventSource.close();
+                reject(new Error('Lost connection to the progress stream'));
+            };
+        });
+    }
+
     function showError(message) {
         console.error('Error:', message);
         error.textContent = message;
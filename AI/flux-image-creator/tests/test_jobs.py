@@ -0,0 +1,128 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from jobs import ImageCache, ImageJobQueue, cache_key
+
+TIMEOUT = 5
+
+def params(prompt='a red fox', seed=1):
+    return {'prompt': prompt, 'width': 64, 'height': 64, 'steps': 4,
+            'guidance_scale': 0.0, 'sequence_length': 256, 'seed': seed}
+
+def wait_finished(job):
+    version = job.version
+    while not job.finished:
+        new_version = job.wait_for_change(version, timeout=TIMEOUT)
+        assert new_version != version, f"job stuck in {job.status}"
+        version = new_version
+    return job
+
+class StubRender:
+    """Stands in for the pipeline: reports progress, then blocks until released."""
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.fail = None
+
+    def __call__(self, params, on_progress):
+        self.calls.append(params)
+        on_progress(50)
+        self.started.set()
+        assert self.release.wait(TIMEOUT)
+        if self.fail:
+            raise RuntimeError(self.fail)
+        return f"png:{params['prompt']}:{params['seed']}".encode()
+
+@pytest.fixture
+def render():
+    return StubRender()
+
+@pytest.fixture
+def queue(render, tmp_path):
+    return ImageJobQueue(render, ImageCache(str(tmp_path / 'cache')))
+
+def test_cache_key_ignores_dict_order():
+    assert cache_key({'a': 1, 'b': 2}) == cache_key({'b': 2, 'a': 1})
+    assert cache_key(params(seed=1)) != cache_key(params(seed=2))
+
+def test_job_renders_and_reports_progress(queue, render):
+    job = queue.submit(params())
+    assert render.started.wait(TIMEOUT)
+    assert job.status == 'running' and job.progress == 50
+    assert job.to_dict()['percent'] == 50
+    render.release.set()
+    wait_finished(job)
+    assert job.status == 'done' and job.progress == 100 and not job.cached
+    assert queue.result(job) == b"png:a red fox:1"
+    assert queue.stats()['rendered'] == 1
+
+def test_identical_jobs_in_flight_are_shared(queue, render):
+    first = queue.submit(params())
+    second = queue.submit(params())
+    other = queue.submit(params(seed=2))
+    assert second is first
+    assert other is not first
+    assert queue.position(other) in (1, 2)
+    render.release.set()
+    wait_finished(first)
+    wait_finished(other)
+    assert len(render.calls) == 2
+    assert queue.stats()['deduplicated'] == 1
+
+def test_position_counts_from_one_and_is_zero_once_running(queue, render):
+    running = queue.submit(params(seed=1))
+    assert render.started.wait(TIMEOUT)
+    queued = [queue.submit(params(seed=seed)) for seed in (2, 3)]
+    assert queue.position(running) == 0
+    assert [queue.position(job) for job in queued] == [1, 2]
+    render.release.set()
+    for job in queued:
+        wait_finished(job)
+    assert queue.position(queued[-1]) == 0
+
+def test_repeated_job_is_a_cache_hit(queue, render, tmp_path):
+    render.release.set()
+    wait_finished(queue.submit(params()))
+    save_path = tmp_path / 'copy.png'
+    job = queue.submit(params(), save_path=str(save_path))
+    assert job.status == 'done' and job.cached
+    assert len(render.calls) == 1
+    assert queue.result(job) == save_path.read_bytes() == b"png:a red fox:1"
+    assert queue.stats()['cache_hits'] == 1
+
+def test_render_error_fails_the_job_and_is_not_cached(queue, render):
+    render.fail = 'out of memory'
+    render.release.set()
+    job = wait_finished(queue.submit(params()))
+    assert job.status == 'error' and job.error == 'out of memory'
+    assert queue.result(job) is None
+    assert queue.stats()['failed'] == 1
+
+    render.fail = None
+    retry = wait_finished(queue.submit(params()))
+    assert retry is not job and retry.status == 'done' and not retry.cached
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ImageCache(str(tmp_path), max_bytes=25)
+    for key in ('aa1', 'bb2', 'cc3'):
+        cache.put(key, b'x' * 10)
+    assert cache.get('aa1') is None
+    assert cache.get('bb2') == b'x' * 10  # now the most recently used
+    cache.put('dd4', b'x' * 10)
+    assert cache.get('cc3') is None
+    assert cache.get('bb2') is not None and cache.get('dd4') is not None
+    assert cache.stats()['cache_evicted'] == 2
+    assert cache.stats()['cache_bytes'] == 20
+
+def test_cache_size_limit_applies_to_existing_files(tmp_path):
+    ImageCache(str(tmp_path)).put('aa1', b'x' * 10)
+    ImageCache(str(tmp_path)).put('bb2', b'x' * 10)
+    cache = ImageCache(str(tmp_path), max_bytes=15)
+    assert cache.stats()['cache_files'] == 1